@@ -0,0 +1,95 @@
+"""
+Cold-start benchmark: how long `import clx` takes and what it drags in.
+
+Each statement runs in a fresh interpreter under `python -X importtime`. The
+median cumulative time of the `clx` import is reported, and the run fails if
+a heavy dependency (requests, asyncio, SQL engines, ...) is loaded eagerly or
+the time exceeds `--max-ms`.
+
+Usage:
+    python3 benchmarks/importtime.py
+    python3 benchmarks/importtime.py --repeat 20 --max-ms 50 --output startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = (
+    "import clx",
+    "from clx import clx_query",
+    "from clx import clx_summarize",
+    "import clx.adapters",
+)
+HEAVY_MODULES = ("requests", "urllib3", "asyncio", "httpx", "duckdb", "pyspark", "pandas")
+
+
+def measure(statement: str) -> Tuple[float, Set[str]]:
+    """Run `statement` in a fresh interpreter; return (ms spent importing clx, packages loaded)."""
+    paths = [ROOT, os.environ.get("PYTHONPATH", "")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in paths if p))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:") :].split("|")
+        name = raw_name.strip()
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        modules.add(name.split(".")[0])
+        # Top-level rows (no nesting indent) under clx; lazy attribute access imports
+        # submodules after `clx` itself has finished, so they appear as separate rows.
+        if raw_name[1:2] != " " and name.split(".")[0] == "clx":
+            total_us += int(cumulative)
+    return total_us / 1000.0, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure clx import time.")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per statement.")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median exceeds this.")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    results: List[Dict[str, object]] = []
+    failed = False
+    for statement in STATEMENTS:
+        timings = []
+        loaded: Set[str] = set()
+        for _ in range(max(1, args.repeat)):
+            ms, modules = measure(statement)
+            timings.append(ms)
+            loaded |= modules
+        heavy = sorted(set(HEAVY_MODULES) & loaded)
+        median = statistics.median(timings)
+        too_slow = args.max_ms is not None and median > args.max_ms
+        failed = failed or bool(heavy) or too_slow
+        results.append({"statement": statement, "median_ms": median, "heavy_modules": heavy})
+        flags = (f"  HEAVY={','.join(heavy)}" if heavy else "") + ("  SLOW" if too_slow else "")
+        print(f"{statement:32} median={median:7.2f}ms  min={min(timings):7.2f}ms{flags}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"python": sys.version.split()[0], "results": results}, handle, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
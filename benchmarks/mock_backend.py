@@ -0,0 +1,282 @@
+"""
+Local stand-in backend for benchmarks and manual smoke tests.
+
+Implements the clx HTTP contract with configurable latency, jitter and errors:
+    POST /v1/query                          {"model", "prompt", "params", "metadata"} or
+                                            {"messages": [...], ...} -> {"output": ...}
+    POST /pods/{pod}/actors/{actor}/run     same as /v1/query
+    POST /v1/query:batch                    {"items": [...]} -> {"outputs": [...]}
+    GET  /v1/capabilities                   {"batch": true}
+Requests with `"stream": true` are answered as server-sent events. Gzipped
+request bodies (`Content-Encoding: gzip`) are accepted.
+
+Usage:
+    python3 benchmarks/mock_backend.py --port 8787 --latency 0.02 --jitter 0.005
+    CLX_BACKEND_URL=http://127.0.0.1:8787 python3 demo_backend_call.py "What is 2+2?"
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+_POD_ROUTE = re.compile(r"^/pods/[^/]+/actors/[^/]+/run$")
+_LABELS = re.compile(r"^Labels: (.+)$", re.MULTILINE)
+_PACK_ITEMS = re.compile(r"^Item \d+:$", re.MULTILINE)
+
+
+@dataclass
+class MockConfig:
+    """
+    Args:
+        latency: Mean seconds added before each response.
+        jitter: Standard deviation of the added latency.
+        error_rate: Fraction of requests answered with `error_status`.
+        error_status: Status used for injected errors.
+        retry_after: Optional `Retry-After` seconds sent with injected errors.
+        batch: Advertise and serve `/v1/query:batch`.
+        stream_chunks: Number of SSE events per streamed response.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: Optional[float] = None
+    batch: bool = True
+    stream_chunks: int = 8
+
+
+def respond(payload: Dict[str, Any]) -> str:
+    """Return a deterministic answer shaped like what the task helpers expect."""
+    prompt = payload.get("prompt")
+    if prompt is None:
+        messages = payload.get("messages") or [{}]
+        prompt = messages[-1].get("content", "")
+    prompt = str(prompt)
+    if "each item number" in prompt:
+        return json.dumps(_respond_packed(prompt))
+    labels = _LABELS.search(prompt)
+    if labels:
+        return json.dumps(labels.group(1).split(", ")[0])
+    if "similarity score" in prompt:
+        return json.dumps({"score": 0.5, "justification": "mock"})
+    if "JSON" in prompt:
+        return json.dumps({"text": prompt[-40:]})
+    return f"echo:{prompt[:200]}"
+
+
+def _respond_packed(prompt: str) -> Dict[str, Any]:
+    """Answer a packed task prompt: one answer per numbered item."""
+    items = _PACK_ITEMS.split(prompt)[1:]
+    labels = _LABELS.search(prompt)
+    answers: Dict[str, Any] = {}
+    for number, item in enumerate(items, 1):
+        if labels:
+            answers[str(number)] = labels.group(1).split(", ")[0]
+        elif "similarity score" in prompt:
+            answers[str(number)] = {"score": 0.5, "justification": "mock"}
+        else:
+            answers[str(number)] = {"text": item.strip()[-40:]}
+    return answers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "MockBackend"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _delay_or_fail(self) -> bool:
+        config = self.server.config
+        self.server.count_request()
+        if config.latency or config.jitter:
+            time.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+        if config.error_rate and random.random() < config.error_rate:
+            headers = {}
+            if config.retry_after is not None:
+                headers["Retry-After"] = str(config.retry_after)
+            self._send_json(config.error_status, {"error": "injected"}, headers)
+            return True
+        return False
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path == "/v1/capabilities" and self.server.config.batch:
+            self._send_json(200, {"batch": True})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            payload = json.loads(body or b"{}")
+        except (ValueError, OSError):
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/v1/query:batch" and self.server.config.batch:
+            if not self._delay_or_fail():
+                outputs = [{"output": respond(item)} for item in payload.get("items", [])]
+                self._send_json(200, {"outputs": outputs})
+            return
+        if self.path != "/v1/query" and not _POD_ROUTE.match(self.path):
+            self._send_json(404, {"error": "not found"})
+            return
+        if self._delay_or_fail():
+            return
+        if payload.get("stream"):
+            self._stream(respond(payload))
+        else:
+            self._send_json(200, {"output": respond(payload)})
+
+    def _stream(self, output: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = max(1, -(-len(output) // self.server.config.stream_chunks))
+        events = [output[i : i + step] for i in range(0, len(output), step)]
+        for event in [json.dumps({"delta": e}) for e in events] + ["[DONE]"]:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockBackend(ThreadingHTTPServer):
+    """Threaded mock server; `url` is its base URL and `requests` counts handled calls."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        config: Optional[MockConfig] = None,
+        counter: Any = None,
+    ):
+        super().__init__(address, _Handler)
+        self.config = config or MockConfig()
+        self._counter = counter if counter is not None else multiprocessing.Value("q", 0)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self._counter.value
+
+    def count_request(self) -> None:
+        with self._counter.get_lock():
+            self._counter.value += 1
+
+    def start(self) -> "MockBackend":
+        """Serve from a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, name="clx-mock", daemon=True).start()
+        return self
+
+    def __enter__(self) -> "MockBackend":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class BackendProcess:
+    """
+    `MockBackend` running in a child process, so its request handling does not
+    compete with the code under test for the GIL. Same `url`/`requests` API.
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        context = multiprocessing.get_context("spawn")
+        self._counter = context.Value("q", 0)
+        ready = context.Queue()
+        self._process = context.Process(
+            target=_serve_child,
+            args=(config or MockConfig(), self._counter, ready),
+            name="clx-mock",
+            daemon=True,
+        )
+        self._process.start()
+        self.url: str = ready.get(timeout=30)
+
+    @property
+    def requests(self) -> int:
+        return self._counter.value
+
+    def __enter__(self) -> "BackendProcess":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._process.terminate()
+        self._process.join(timeout=5)
+
+
+def _serve_child(config: MockConfig, counter: Any, ready: Any) -> None:
+    server = MockBackend(config=config, counter=counter)
+    ready.put(server.url)
+    server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock clx backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean added latency (s).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency std deviation (s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of errors.")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, help="Retry-After sent with errors.")
+    parser.add_argument("--no-batch", action="store_true", help="Do not serve the bulk route.")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        batch=not args.no_batch,
+    )
+    server = MockBackend((args.host, args.port), config)
+    print(f"Mock clx backend listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Throughput and latency benchmarks for clx against the local mock backend.
+
+Each case reports rows/sec and p50/p99 per-call latency. Results are written
+as JSON so runs from different releases can be compared.
+
+Usage:
+    python3 benchmarks/run.py --rows 100,1000 --output bench.json
+    python3 benchmarks/run.py --suite cache --suite adapters --latency 0.005
+    python3 benchmarks/run.py --compare bench-0.6.0.json --tolerance 0.15
+
+Suites: query, tasks, cache, adapters (sqlite always; duckdb and spark when installed).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clx  # noqa: E402
+from clx import Cache, clx_query, clx_query_many  # noqa: E402
+from clx.adapters import sqlite as sqlite_adapter  # noqa: E402
+
+from mock_backend import BackendProcess, MockBackend, MockConfig  # noqa: E402
+
+SUITES = ("query", "tasks", "cache", "adapters")
+_FILLER = "The quick brown fox jumps over the lazy dog. " * 4
+
+
+@dataclass
+class Result:
+    suite: str
+    name: str
+    rows: int
+    concurrency: int
+    seconds: float
+    throughput: float
+    p50_ms: Optional[float]
+    p99_ms: Optional[float]
+    errors: int
+    backend_requests: int
+    skipped: Optional[str] = None
+
+
+@dataclass
+class Context:
+    url: str
+    server: Union[BackendProcess, MockBackend]
+    concurrency: int
+    workdir: str
+
+
+def _percentile(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index] * 1000
+
+
+def prompts(rows: int) -> List[str]:
+    return [f"Document {i}: {_FILLER}" for i in range(rows)]
+
+
+def measure(
+    ctx: Context,
+    suite: str,
+    name: str,
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    concurrency: int = 1,
+) -> Result:
+    """Call `fn(item)` for every item (on `concurrency` threads) and time each call."""
+    latencies: List[float] = []
+    errors = 0
+
+    def _timed(item: Any) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            fn(item)
+        except Exception:  # noqa: BLE001 - counted, not raised
+            return time.perf_counter() - started, False
+        return time.perf_counter() - started, True
+
+    before = ctx.server.requests
+    started = time.perf_counter()
+    if concurrency == 1:
+        collected = [_timed(item) for item in items]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            collected = list(pool.map(_timed, items))
+    seconds = time.perf_counter() - started
+    for latency, ok in collected:
+        latencies.append(latency)
+        errors += not ok
+    return Result(
+        suite=suite,
+        name=name,
+        rows=len(items),
+        concurrency=concurrency,
+        seconds=seconds,
+        throughput=len(items) / seconds if seconds else 0.0,
+        p50_ms=_percentile(latencies, 0.5),
+        p99_ms=_percentile(latencies, 0.99),
+        errors=errors,
+        backend_requests=ctx.server.requests - before,
+    )
+
+
+def measure_bulk(ctx: Context, suite: str, name: str, rows: int, run: Callable[[], Any]) -> Result:
+    """Time one call that processes `rows` rows at once (no per-row latency)."""
+    before = ctx.server.requests
+    started = time.perf_counter()
+    errors = 0
+    try:
+        outputs = run()
+        if isinstance(outputs, list):
+            errors = sum(isinstance(value, Exception) for value in outputs)
+    except Exception:  # noqa: BLE001 - recorded as a failed case
+        errors = rows
+    seconds = time.perf_counter() - started
+    return Result(
+        suite=suite,
+        name=name,
+        rows=rows,
+        concurrency=ctx.concurrency,
+        seconds=seconds,
+        throughput=rows / seconds if seconds else 0.0,
+        p50_ms=None,
+        p99_ms=None,
+        errors=errors,
+        backend_requests=ctx.server.requests - before,
+    )
+
+
+def skipped(suite: str, name: str, rows: int, reason: str) -> Result:
+    return Result(suite, name, rows, 0, 0.0, 0.0, None, None, 0, 0, skipped=reason)
+
+
+def _cache(ctx: Context, label: str, **kwargs: Any) -> Cache:
+    path = os.path.join(ctx.workdir, f"{label}-{time.monotonic_ns()}.db")
+    return Cache(path, **kwargs)
+
+
+def suite_query(ctx: Context, rows: int) -> Iterator[Result]:
+    items = prompts(rows)
+    url = ctx.url
+    c = ctx.concurrency
+
+    yield measure(ctx, "query", "clx_query", lambda p: clx_query("m", p, backend_url=url), items)
+    yield measure(
+        ctx, "query", "clx_query", lambda p: clx_query("m", p, backend_url=url), items, c
+    )
+    yield measure(
+        ctx,
+        "query",
+        "clx_query[pod_actor]",
+        lambda p: clx_query(
+            "m", p, backend_url=url, pod_name="pod", actor_id="actor", use_messages_payload=True
+        ),
+        items,
+        c,
+    )
+    yield measure_bulk(
+        ctx,
+        "query",
+        "clx_query_many",
+        rows,
+        lambda: clx_query_many("m", items, backend_url=url, max_concurrency=c),
+    )
+
+
+def suite_tasks(ctx: Context, rows: int) -> Iterator[Result]:
+    items = prompts(rows)
+    url = ctx.url
+    helpers: Dict[str, Callable[[str], Any]] = {
+        "clx_summarize": lambda t: clx.clx_summarize("m", t, backend_url=url),
+        "clx_translate": lambda t: clx.clx_translate("m", t, "French", backend_url=url),
+        "clx_classify": lambda t: clx.clx_classify("m", t, ["news", "sports"], backend_url=url),
+        "clx_extract": lambda t: clx.clx_extract("m", t, {"title": "string"}, backend_url=url),
+        "clx_similarity": lambda t: clx.clx_similarity("m", t, t[::-1], backend_url=url),
+        "clx_fix_grammar": lambda t: clx.clx_fix_grammar("m", t, backend_url=url),
+    }
+    for name, helper in helpers.items():
+        yield measure(ctx, "tasks", name, helper, items, ctx.concurrency)
+    packed: Dict[str, Callable[[], Any]] = {
+        "clx_classify_many": lambda: clx.clx_classify_many(
+            "m", items, ["news", "sports"], backend_url=url, max_concurrency=ctx.concurrency
+        ),
+        "clx_extract_many": lambda: clx.clx_extract_many(
+            "m", items, {"title": "string"}, backend_url=url, max_concurrency=ctx.concurrency
+        ),
+    }
+    for name, run in packed.items():
+        yield measure_bulk(ctx, "tasks", name, rows, run)
+
+
+def suite_cache(ctx: Context, rows: int) -> Iterator[Result]:
+    items = prompts(rows)
+    url = ctx.url
+    for concurrency in (1, ctx.concurrency):
+        variants: Tuple[Tuple[str, Dict[str, Any]], ...] = (
+            ("sqlite", {}),
+            ("memory", {"memory_entries": rows}),
+            ("compressed", {"compress_threshold": 128, "binary_keys": True}),
+        )
+        for label, kwargs in variants:
+            with _cache(ctx, label, **kwargs) as cache:
+
+                def _call(p: str, cache: Cache = cache) -> Any:
+                    return clx_query("m", p, backend_url=url, cache=cache)
+
+                yield measure(ctx, "cache", f"cold[{label}]", _call, items, concurrency)
+                yield measure(ctx, "cache", f"warm[{label}]", _call, items, concurrency)
+
+
+def _sql_rows(rows: int) -> List[Tuple[str]]:
+    return [(p,) for p in prompts(rows)]
+
+
+def suite_adapters(ctx: Context, rows: int) -> Iterator[Result]:
+    url = ctx.url
+    data = _sql_rows(rows)
+    # DuckDB skips scalar UDF calls on NULL arguments, so pass an empty params object.
+    query = "SELECT clx_query('m', text, '{}') FROM docs"
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE docs (text TEXT)")
+    conn.executemany("INSERT INTO docs VALUES (?)", data)
+    sqlite_adapter.register_clx_query(conn, backend_url=url)
+    yield measure_bulk(ctx, "adapters", "sqlite", rows, lambda: conn.execute(query).fetchall())
+    conn.close()
+
+    # Repetitive column (10% distinct prompts): per-registration memo and the bulk pre-pass.
+    repeated = [(p,) for p in prompts(max(1, rows // 10))] * 10
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE docs (text TEXT)")
+    conn.executemany("INSERT INTO docs VALUES (?)", repeated)
+    sqlite_adapter.register_clx_query(conn, backend_url=url, memo_entries=rows)
+    yield measure_bulk(
+        ctx, "adapters", "sqlite[memo]", len(repeated), lambda: conn.execute(query).fetchall()
+    )
+    source = "SELECT 'm' AS model, text AS prompt, NULL AS params FROM docs"
+    yield measure_bulk(
+        ctx,
+        "adapters",
+        "sqlite[materialize]",
+        len(repeated),
+        lambda: sqlite_adapter.materialize_clx_query(
+            conn, source, backend_url=url, max_concurrency=ctx.concurrency
+        ),
+    )
+    conn.close()
+
+    try:
+        import duckdb  # type: ignore
+
+        from clx.adapters import duckdb as duckdb_adapter
+    except ImportError as exc:
+        yield skipped("adapters", "duckdb", rows, str(exc))
+    else:
+        for vectorized in (False, True):
+            name = "duckdb[vectorized]" if vectorized else "duckdb"
+            con = duckdb.connect()
+            con.execute("CREATE TABLE docs (text VARCHAR)")
+            con.executemany("INSERT INTO docs VALUES (?)", data)
+            try:
+                duckdb_adapter.register_clx_query(
+                    con, backend_url=url, vectorized=vectorized, max_concurrency=ctx.concurrency
+                )
+            except Exception as exc:  # noqa: BLE001 - e.g. missing numpy/pyarrow
+                yield skipped("adapters", name, rows, f"{type(exc).__name__}: {exc}")
+            else:
+                yield measure_bulk(
+                    ctx, "adapters", name, rows, lambda: con.execute(query).fetchall()
+                )
+            con.close()
+
+    yield from _spark_cases(ctx, rows, data)
+
+
+def _spark_cases(ctx: Context, rows: int, data: List[Tuple[str]]) -> Iterator[Result]:
+    try:
+        from pyspark.sql import SparkSession  # type: ignore
+
+        from clx.adapters import spark as spark_adapter
+
+        spark = (
+            SparkSession.builder.master(f"local[{ctx.concurrency}]")
+            .appName("clx-bench")
+            .config("spark.ui.enabled", "false")
+            .getOrCreate()
+        )
+    except Exception as exc:  # noqa: BLE001 - pyspark or Java missing
+        for name in ("spark", "spark[vectorized]"):
+            yield skipped("adapters", name, rows, f"{type(exc).__name__}: {exc}")
+        return
+
+    df = spark.createDataFrame(data, ["text"]).cache()
+    df.count()
+    for vectorized in (False, True):
+        name = "spark[vectorized]" if vectorized else "spark"
+        spark_adapter.register_clx_query(spark, backend_url=ctx.url, vectorized=vectorized)
+        yield measure_bulk(
+            ctx,
+            "adapters",
+            name,
+            rows,
+            lambda: df.selectExpr("clx_query('m', text, NULL) AS out").collect(),
+        )
+
+
+_SUITE_FUNCS = {
+    "query": suite_query,
+    "tasks": suite_tasks,
+    "cache": suite_cache,
+    "adapters": suite_adapters,
+}
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """Describe every case whose throughput fell more than `tolerance` below the baseline."""
+    with open(baseline_path, "r", encoding="utf-8") as handle:
+        baseline = json.load(handle)
+
+    def _key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+        return result["suite"], result["name"], result["rows"], result["concurrency"]
+
+    previous = {_key(r): r for r in baseline.get("results", []) if not r.get("skipped")}
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if result.get("skipped") or before is None or not before["throughput"]:
+            continue
+        change = result["throughput"] / before["throughput"] - 1
+        if change < -tolerance:
+            regressions.append(
+                f"{result['suite']}/{result['name']} rows={result['rows']} "
+                f"c={result['concurrency']}: {before['throughput']:.1f} -> "
+                f"{result['throughput']:.1f} rows/s ({change:+.0%})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark clx against a local mock backend.")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Repeatable.")
+    parser.add_argument("--rows", default="100,1000", help="Comma-separated row counts.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.002, help="Mock latency (s).")
+    parser.add_argument("--jitter", type=float, default=0.0005, help="Mock jitter (s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock error fraction.")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run the mock backend in this process (it then shares the GIL with clx).",
+    )
+    parser.add_argument("--output", default="bench.json", help="Where to write results.")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown.")
+    args = parser.parse_args()
+
+    row_counts = [int(value) for value in args.rows.split(",") if value.strip()]
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    results: List[Dict[str, Any]] = []
+
+    server_cm = MockBackend(config=config) if args.in_process else BackendProcess(config)
+    with server_cm as server, tempfile.TemporaryDirectory() as workdir:
+        ctx = Context(
+            url=server.url, server=server, concurrency=args.concurrency, workdir=workdir
+        )
+        for suite in args.suite or SUITES:
+            for rows in row_counts:
+                for result in _SUITE_FUNCS[suite](ctx, rows):
+                    results.append(asdict(result))
+                    if result.skipped:
+                        print(f"{suite:9} {result.name:24} rows={rows:<6} skipped")
+                        continue
+                    p50 = f"{result.p50_ms:.2f}" if result.p50_ms is not None else "-"
+                    p99 = f"{result.p99_ms:.2f}" if result.p99_ms is not None else "-"
+                    print(
+                        f"{suite:9} {result.name:24} rows={rows:<6} c={result.concurrency:<3} "
+                        f"{result.throughput:10.1f} rows/s  p50={p50}ms  p99={p99}ms  "
+                        f"errors={result.errors}"
+                    )
+
+    report = {
+        "meta": {
+            "clx_version": _clx_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "mock": asdict(config),
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+def _clx_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("clx-cli")
+    except Exception:  # noqa: BLE001 - running from a checkout
+        return "unknown"
+
+
+if __name__ == "__main__":
+    main()
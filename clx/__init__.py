@@ -1,25 +1,114 @@
-from .core import Cache, Config, clx_query, load_config, resolve_backend_url  # noqa: F401
-from .tasks import (  # noqa: F401
-    clx_classify,
-    clx_extract,
-    clx_fix_grammar,
-    clx_gen,
-    clx_similarity,
-    clx_summarize,
-    clx_translate,
-)
-
-__all__ = [
-    "Cache",
-    "Config",
-    "clx_query",
-    "load_config",
-    "resolve_backend_url",
-    "clx_gen",
-    "clx_summarize",
-    "clx_translate",
-    "clx_classify",
-    "clx_extract",
-    "clx_similarity",
-    "clx_fix_grammar",
-]
+"""
+clx: a minimal, backend-agnostic AI resolver with SQL adapters.
+
+Public names are imported lazily on first access, so `import clx` does not
+pull in `requests`, `asyncio` or any SQL engine until they are needed.
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .aio import AsyncClient, aclx_query, aclx_query_many, aclx_stream
+    from .balancer import BackendPool
+    from .batching import MicroBatcher
+    from .cache_server import CacheServer, RemoteCache
+    from .client import Client, get_default_client, set_default_client
+    from .config import Config, ResolvedConfig, load_config, resolve_config
+    from .core import Cache, CacheBackend, clx_query, clx_query_many, resolve_backend_url
+    from .keys import KeyPolicy
+    from .ledger import JobStats, Ledger, run_job
+    from .metrics import Metrics, disable_metrics, enable_metrics, get_metrics
+    from .ratelimit import RateLimit, RateLimiter
+    from .semantic import HashingEmbedder, SemanticCache
+    from .streaming import clx_stream
+    from .tasks import (
+        aclx_classify,
+        aclx_extract,
+        aclx_fix_grammar,
+        aclx_gen,
+        aclx_similarity,
+        aclx_summarize,
+        aclx_translate,
+        clx_classify,
+        clx_classify_many,
+        clx_extract,
+        clx_extract_many,
+        clx_fix_grammar,
+        clx_gen,
+        clx_similarity,
+        clx_similarity_many,
+        clx_summarize,
+        clx_translate,
+    )
+
+# Public name -> submodule that defines it.
+_EXPORTS = {
+    "Cache": ".core",
+    "CacheBackend": ".core",
+    "RemoteCache": ".cache_server",
+    "CacheServer": ".cache_server",
+    "KeyPolicy": ".keys",
+    "Ledger": ".ledger",
+    "JobStats": ".ledger",
+    "run_job": ".ledger",
+    "Client": ".client",
+    "MicroBatcher": ".batching",
+    "BackendPool": ".balancer",
+    "Metrics": ".metrics",
+    "enable_metrics": ".metrics",
+    "disable_metrics": ".metrics",
+    "get_metrics": ".metrics",
+    "RateLimit": ".ratelimit",
+    "RateLimiter": ".ratelimit",
+    "SemanticCache": ".semantic",
+    "HashingEmbedder": ".semantic",
+    "Config": ".config",
+    "ResolvedConfig": ".config",
+    "resolve_config": ".config",
+    "clx_query": ".core",
+    "clx_query_many": ".core",
+    "clx_stream": ".streaming",
+    "load_config": ".config",
+    "resolve_backend_url": ".core",
+    "get_default_client": ".client",
+    "set_default_client": ".client",
+    "clx_gen": ".tasks",
+    "clx_summarize": ".tasks",
+    "clx_translate": ".tasks",
+    "clx_classify": ".tasks",
+    "clx_classify_many": ".tasks",
+    "clx_extract": ".tasks",
+    "clx_extract_many": ".tasks",
+    "clx_similarity": ".tasks",
+    "clx_similarity_many": ".tasks",
+    "clx_fix_grammar": ".tasks",
+    "AsyncClient": ".aio",
+    "aclx_query": ".aio",
+    "aclx_query_many": ".aio",
+    "aclx_stream": ".aio",
+    "aclx_gen": ".tasks",
+    "aclx_summarize": ".tasks",
+    "aclx_translate": ".tasks",
+    "aclx_classify": ".tasks",
+    "aclx_extract": ".tasks",
+    "aclx_similarity": ".tasks",
+    "aclx_fix_grammar": ".tasks",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
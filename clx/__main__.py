@@ -1,22 +1,259 @@
 """
-Entrypoint shim for `python -m clx`.
+Entrypoint for `python -m clx`.
+
+    python -m clx run prompts.jsonl -o results.jsonl --model my-model
+    cat prompts.txt | python -m clx run - --format text --model my-model
+    python -m clx keys ~/.clx_cache.db --param-default temperature=0
+    python -m clx cache-server --listen tcp://0.0.0.0:7480 --cache /var/lib/clx/cache.db
 """
 
 from __future__ import annotations
 
-from . import clx_query
+import argparse
+import dataclasses
+import json
+import signal
+import sqlite3
+import sys
+from typing import Any, Dict, List, Optional
+
+from .cache import DEFAULT_CACHE_PATH, Cache
+from .cache_server import DEFAULT_ADDRESS, CacheServer, is_remote_address
+from .config import resolve_config
+from .keys import KeyPolicy, format_report, key_report
+from .runner import FORMATS, run_file
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m clx",
+        description="clx is a minimal AI resolver library.",
+    )
+    commands = parser.add_subparsers(dest="command")
 
+    run = commands.add_parser(
+        "run",
+        help="Run prompts from a file or stdin through clx_query and write JSONL results.",
+    )
+    run.add_argument("input", nargs="?", default="-", help="Input file, or '-' for stdin.")
+    run.add_argument("-o", "--output", default="-", help="Output JSONL file, or '-' for stdout.")
+    run.add_argument("--format", choices=FORMATS, help="Input format (default: from extension).")
+    run.add_argument("--model", help="Model for rows without a model field.")
+    run.add_argument("--params", help="JSON object of params applied to every row.")
+    run.add_argument("--prompt-field", default="prompt", help="Field holding the prompt.")
+    run.add_argument("--model-field", default="model", help="Field holding a per-row model.")
+    run.add_argument("--params-field", default="params", help="Field holding per-row params.")
+    run.add_argument("--id-field", help="Field copied to each output line as 'id'.")
+    run.add_argument("--backend-url", help="Backend URL (default: env/config).")
+    run.add_argument("--profile", help="Named backend profile from ~/.clx/config.toml.")
+    run.add_argument("--expect-json", action="store_true", help="Parse outputs as JSON.")
+    run.add_argument("-c", "--concurrency", type=int, default=8, help="In-flight requests.")
+    run.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write results as they complete instead of in input order.",
+    )
+    run.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to --output, skipping rows it already contains and retrying failed ones.",
+    )
+    run.add_argument(
+        "--cache",
+        help=f"Cache file path, or a tcp:// or unix:// cache server address "
+        f"(default: config or {DEFAULT_CACHE_PATH}).",
+    )
+    run.add_argument("--no-cache", action="store_true", help="Disable the result cache.")
 
-def main() -> None:
-    message = (
-        "clx is a minimal AI resolver library. "
-        "Import and call `clx.clx_query`"
+    keys = commands.add_parser(
+        "keys",
+        help="Estimate how a cache key policy would change the hit rate of a cache file.",
+        description="Entries need Cache(record_requests=True) to be regrouped. The policy "
+        "defaults to [cache.key_policy] from the config file; options override it.",
+    )
+    keys.add_argument("cache", nargs="?", help="Cache file (default: config or ~/.clx_cache.db).")
+    keys.add_argument("--profile", help="Named profile from ~/.clx/config.toml.")
+    keys.add_argument("--unicode-form", choices=("NFC", "NFKC", "NFD", "NFKD", "none"))
+    keys.add_argument("--keep-whitespace", action="store_true", help="Do not collapse whitespace.")
+    keys.add_argument("--casefold", action="store_true", help="Ignore case in prompts.")
+    keys.add_argument(
+        "--param-default",
+        action="append",
+        metavar="NAME=JSON",
+        help="Backend default for an omitted param. Repeatable.",
     )
+    keys.add_argument("--ignore-param", action="append", help="Param left out of keys.")
+    keys.add_argument(
+        "--ignore-metadata",
+        action="append",
+        help="Metadata field left out of keys (replaces the default list). Repeatable.",
+    )
+    keys.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    server = commands.add_parser(
+        "cache-server",
+        help="Serve a cache file to other processes and hosts (use RemoteCache to connect).",
+        description="Settings from the config file's [cache] table apply to the served cache. "
+        "Set CLX_CACHE_TOKEN to require a shared token.",
+    )
+    server.add_argument(
+        "--listen",
+        default=DEFAULT_ADDRESS,
+        help=f"tcp://host:port or unix:///path (default: {DEFAULT_ADDRESS}).",
+    )
+    server.add_argument("--cache", help=f"Cache file (default: config or {DEFAULT_CACHE_PATH}).")
+    server.add_argument("--profile", help="Named profile from ~/.clx/config.toml.")
+    server.add_argument("--memory-entries", type=int, help="In-memory tier size (default: 100000).")
+    server.add_argument(
+        "--lease-ttl", type=float, default=30.0, help="Seconds a worker's lease on a key lasts."
+    )
+    server.add_argument(
+        "--workers", type=int, default=8, help="Threads that access the cache file (default: 8)."
+    )
+    return parser
+
+
+def _key_policy(parser: argparse.ArgumentParser, args: argparse.Namespace, base: Any) -> KeyPolicy:
     try:
-        # Tiny sanity check to ensure the import worked.
-        _ = clx_query  # noqa: F841
+        policy = KeyPolicy.coerce(base) or KeyPolicy()
+    except ValueError as exc:
+        parser.error(str(exc))
+    changes: Dict[str, Any] = {}
+    if args.unicode_form:
+        changes["unicode_form"] = None if args.unicode_form == "none" else args.unicode_form
+    if args.keep_whitespace:
+        changes["collapse_whitespace"] = False
+    if args.casefold:
+        changes["casefold"] = True
+    if args.param_default:
+        defaults = dict(policy.param_defaults)
+        for item in args.param_default:
+            name, sep, raw = item.partition("=")
+            if not sep:
+                parser.error("--param-default must look like NAME=JSON")
+            try:
+                defaults[name] = json.loads(raw)
+            except json.JSONDecodeError:
+                defaults[name] = raw
+        changes["param_defaults"] = defaults
+    if args.ignore_param:
+        changes["ignore_params"] = tuple(args.ignore_param)
+    if args.ignore_metadata:
+        changes["ignore_metadata"] = tuple(args.ignore_metadata)
+    return dataclasses.replace(policy, **changes)
+
+
+def _keys(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    try:
+        config = resolve_config(args.profile)
+    except ValueError as exc:
+        parser.error(str(exc))
+    policy = _key_policy(parser, args, config.cache_options.get("key_policy"))
+    path = args.cache or config.cache_path or DEFAULT_CACHE_PATH
+    try:
+        report = key_report(path, policy)
+    except (ValueError, sqlite3.Error) as exc:
+        parser.error(f"cannot read {path}: {exc}")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for line in format_report(report):
+            print(line)
+
+
+def _cache_server(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    try:
+        config = resolve_config(args.profile)
+    except ValueError as exc:
+        parser.error(str(exc))
+    options = dict(config.cache_options)
+    options.pop("url", None)  # a worker-side setting; this process is the server
+    if args.memory_entries is not None:
+        options["memory_entries"] = args.memory_entries
+    options.setdefault("memory_entries", 100_000)
+    path = args.cache or config.cache_path or DEFAULT_CACHE_PATH
+    if is_remote_address(path):
+        parser.error(f"--cache must be a local file for the server, not {path}")
+    try:
+        server = CacheServer(
+            args.listen,
+            cache=Cache(path, **options),
+            lease_ttl=args.lease_ttl,
+            workers=args.workers,
+        )
+    except (ValueError, OSError) as exc:
+        parser.error(str(exc))
+    print(f"clx: serving {path} on {server.address}", file=sys.stderr)
+    # Stop cleanly (flushing buffered writes) when a supervisor sends SIGTERM.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
     finally:
-        print(message)
+        server.cache.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "keys":
+        _keys(parser, args)
+        return
+    if args.command == "cache-server":
+        _cache_server(parser, args)
+        return
+    if args.command != "run":
+        print("clx is a minimal AI resolver library. Import and call `clx.clx_query`")
+        print("or run `python -m clx run --help` to process a file of prompts.")
+        return
+
+    try:
+        params = json.loads(args.params) if args.params else {}
+    except json.JSONDecodeError:
+        parser.error("--params must be valid JSON")
+    if not isinstance(params, dict):
+        parser.error("--params must be a JSON object")
+    if args.resume and args.output == "-":
+        parser.error("--resume needs an --output file")
+
+    try:
+        config = resolve_config(args.profile)
+        if args.backend_url:
+            config = dataclasses.replace(config, backend_url=args.backend_url.rstrip("/"))
+        query_kwargs = config.query_kwargs()
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    cache_options = {"enabled": not args.no_cache, "commit_every": 256}
+    if args.cache:
+        cache_options["path"] = args.cache
+    with config.open_cache(**cache_options) as cache:
+        stats = run_file(
+            args.input,
+            args.output,
+            fmt=args.format,
+            resume=args.resume,
+            model=args.model,
+            params=params,
+            prompt_field=args.prompt_field,
+            model_field=args.model_field,
+            params_field=args.params_field,
+            id_field=args.id_field,
+            concurrency=args.concurrency,
+            ordered=not args.unordered,
+            cache=cache,
+            expect_json=args.expect_json,
+            **query_kwargs,
+        )
+
+    print(
+        f"clx: {stats.succeeded} succeeded, {stats.failed} failed, {stats.skipped} skipped",
+        file=sys.stderr,
+    )
+    if stats.failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
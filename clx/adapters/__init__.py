@@ -1,9 +1,34 @@
-from .spark import register_clx_query as register_clx_query_spark  # noqa: F401
-from .duckdb import register_clx_query as register_clx_query_duckdb  # noqa: F401
-from .sqlite import register_clx_query as register_clx_query_sqlite  # noqa: F401
-
-__all__ = [
-    "register_clx_query_spark",
-    "register_clx_query_duckdb",
-    "register_clx_query_sqlite",
-]
+"""
+SQL adapters. Each engine's module is imported only when its function is used.
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .duckdb import register_clx_query as register_clx_query_duckdb
+    from .spark import register_clx_query as register_clx_query_spark
+    from .sqlite import register_clx_query as register_clx_query_sqlite
+
+_EXPORTS = {
+    "register_clx_query_spark": ".spark",
+    "register_clx_query_duckdb": ".duckdb",
+    "register_clx_query_sqlite": ".sqlite",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = importlib.import_module(module_name, __name__).register_clx_query
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
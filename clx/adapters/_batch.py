@@ -0,0 +1,191 @@
+"""
+Shared helpers for the SQL adapters: the vectorized chunk resolver, the
+per-registration memo, the pre-pass that materializes a lookup table, and
+incremental ledger jobs.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+from ..cache import LRUCache
+from ..core import _query_many
+from ..ledger import JobRow, JobStats, Ledger, run_job
+
+_MISSING = object()
+
+
+def coerce_params(raw: Any) -> Dict[str, Any]:
+    """SQL engines hand params over as NULL, JSON text, or a map/struct."""
+    if raw is None:
+        return {}
+    if isinstance(raw, str):
+        if not raw.strip():
+            return {}
+        parsed = json.loads(raw)
+        if not isinstance(parsed, dict):
+            raise ValueError("clx_query params must be a JSON object")
+        return parsed
+    if isinstance(raw, dict):
+        return raw
+    if hasattr(raw, "asDict"):  # pyspark Row
+        return raw.asDict(recursive=True)
+    return dict(raw)
+
+
+def format_output(output: Any, expect_json: bool) -> str:
+    return json.dumps(output) if expect_json else str(output)
+
+
+def make_memo(memo_entries: int) -> Optional[LRUCache]:
+    return LRUCache(max_entries=memo_entries) if memo_entries > 0 else None
+
+
+def memo_key(model: Any, prompt: Any, raw_params: Any) -> Optional[Hashable]:
+    """
+    Key rows by the raw values the engine passed in, before any JSON parsing
+    or canonical hashing. Unhashable params (e.g. Spark maps) are not memoized.
+    """
+    key = (model, prompt, raw_params)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def memoize_udf(fn: Callable[..., Any], memo: Optional[LRUCache]) -> Callable[..., Any]:
+    """Wrap a scalar `fn(model, prompt, params)` UDF with `memo`, if there is one."""
+    if memo is None:
+        return fn
+
+    # `wraps` keeps the signature/annotations engines use to infer SQL types.
+    @functools.wraps(fn)
+    def _memoized(model: Any, prompt: Any, params: Any = None) -> Any:
+        key = memo_key(model, prompt, params)
+        if key is None:
+            return fn(model, prompt, params)
+        output = memo.get(key, _MISSING)
+        if output is _MISSING:
+            output = fn(model, prompt, params)
+            memo.put(key, output)
+        return output
+
+    return _memoized
+
+
+def resolve_chunk(
+    models: Sequence[Optional[str]],
+    prompts: Sequence[Optional[str]],
+    params: Sequence[Any],
+    *,
+    expect_json: bool = False,
+    max_concurrency: int = 8,
+    memo: Optional[LRUCache] = None,
+    **query_kwargs: Any,
+) -> List[Optional[str]]:
+    """
+    Resolve one column chunk of (model, prompt, params) rows.
+
+    Rows found in `memo` are answered without parsing or hashing. Identical
+    rows inside the chunk are sent once; cache hits are served in bulk and
+    misses run concurrently through `clx_query_many`'s engine. Rows with a
+    NULL model or prompt resolve to NULL. Any failed row raises, which
+    matches the scalar UDF failing the query.
+    """
+    results: List[Optional[str]] = [None] * len(prompts)
+    slots: Dict[Tuple[str, str, str], List[int]] = {}
+    unique: List[Tuple[str, str, Dict[str, Any]]] = []
+    to_memoize: List[Tuple[Hashable, int]] = []
+    for index, (model, prompt, raw_params) in enumerate(zip(models, prompts, params)):
+        if model is None or prompt is None:
+            continue
+        if memo is not None:
+            key = memo_key(model, prompt, raw_params)
+            if key is not None:
+                hit = memo.get(key)
+                if hit is not None:
+                    results[index] = hit
+                    continue
+                to_memoize.append((key, index))
+        parsed = coerce_params(raw_params)
+        row_key = (model, prompt, json.dumps(parsed, sort_keys=True))
+        if row_key not in slots:
+            slots[row_key] = []
+            unique.append((model, prompt, parsed))
+        slots[row_key].append(index)
+
+    if not unique:
+        return results
+
+    outputs = _query_many(
+        unique,
+        expect_json=expect_json,
+        max_concurrency=max_concurrency,
+        return_exceptions=False,
+        **query_kwargs,
+    )
+    for indices, output in zip(slots.values(), outputs):
+        formatted = format_output(output, expect_json)
+        for index in indices:
+            results[index] = formatted
+    if memo is not None:
+        for key, index in to_memoize:
+            memo.put(key, results[index])
+    return results
+
+
+def materialize_rows(
+    rows: Sequence[Tuple[Optional[str], Optional[str], Any]],
+    *,
+    chunk_size: int = 1024,
+    **resolve_kwargs: Any,
+) -> List[Tuple[Optional[str], Optional[str], Any, Optional[str]]]:
+    """Resolve distinct (model, prompt, params) rows in chunks; return rows with the output."""
+    resolved = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        outputs = resolve_chunk(
+            [row[0] for row in chunk],
+            [row[1] for row in chunk],
+            [row[2] for row in chunk],
+            **resolve_kwargs,
+        )
+        resolved.extend((*row, output) for row, output in zip(chunk, outputs))
+    return resolved
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a (possibly schema-qualified) table name for SQLite/DuckDB."""
+    return ".".join('"' + part.replace('"', '""') + '"' for part in name.split("."))
+
+
+def run_query_job(
+    connection: Any,
+    source: str,
+    *,
+    ledger: Ledger,
+    job_id: str,
+    table: str,
+    chunk_size: int = 256,
+    **job_kwargs: Any,
+) -> JobStats:
+    """
+    Run `source` (a SELECT of `row_key`, `model`, `prompt`, `params`) as a
+    ledger job, then export the job's results to `table` on `connection`.
+    """
+    cursor = connection.execute(source)
+
+    def _rows() -> Iterator[JobRow]:
+        while True:
+            batch = cursor.fetchmany(chunk_size)
+            if not batch:
+                return
+            for row_key, model, prompt, params in batch:
+                yield row_key, model, prompt, coerce_params(params)
+
+    stats = run_job(ledger, job_id, _rows(), chunk_size=chunk_size, **job_kwargs)
+    ledger.export(connection, job_id, table)
+    return stats
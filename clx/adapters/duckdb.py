@@ -5,27 +5,66 @@ DuckDB SQL integration.
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-from ..core import Cache, clx_query
+from ..core import CacheBackend, clx_query
+from ._batch import (
+    make_memo,
+    materialize_rows,
+    memoize_udf,
+    quote_identifier,
+    resolve_chunk,
+    run_query_job,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..cache import LRUCache
+    from ..client import Client
+    from ..ledger import JobStats, Ledger
 
 
 def register_clx_query(
     connection: Any,
     *,
     backend_url: Optional[str] = None,
-    cache: Optional[Cache] = None,
+    cache: Optional[CacheBackend] = None,
     expect_json: bool = False,
+    client: Optional[Client] = None,
+    vectorized: bool = False,
+    max_concurrency: int = 8,
+    memo_entries: int = 0,
 ) -> None:
     """
     Register `clx_query` as a DuckDB SQL function.
 
+    With `vectorized=True` the function is registered as an Arrow UDF: DuckDB
+    hands over a whole column chunk per call, identical (model, prompt, params)
+    rows are resolved once, cache hits are read in bulk, and misses are sent
+    with up to `max_concurrency` requests in flight. Requires `pyarrow`.
+
+    With `memo_entries > 0`, results are memoized per registration, keyed by
+    the raw (model, prompt, params) arguments. Repeated rows then skip payload
+    canonicalization and the cache lookup entirely.
+
     Example:
         import duckdb
         con = duckdb.connect()
         register_clx_query(con)
     """
 
+    memo = make_memo(memo_entries)
+    if vectorized:
+        _register_arrow_udf(
+            connection,
+            backend_url=backend_url,
+            cache=cache,
+            expect_json=expect_json,
+            client=client,
+            max_concurrency=max_concurrency,
+            memo=memo,
+        )
+        return
+
     def _clx_query_udf(model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
         output = clx_query(
             model=model,
@@ -34,7 +73,155 @@ def register_clx_query(
             backend_url=backend_url,
             cache=cache,
             expect_json=expect_json,
+            client=client,
         )
         return json.dumps(output) if expect_json else str(output)
 
-    connection.create_function("clx_query", _clx_query_udf)
+    connection.create_function("clx_query", memoize_udf(_clx_query_udf, memo))
+
+
+def _register_arrow_udf(
+    connection: Any,
+    *,
+    backend_url: Optional[str],
+    cache: Optional[CacheBackend],
+    expect_json: bool,
+    client: Optional[Client],
+    max_concurrency: int,
+    memo: Optional[LRUCache],
+) -> None:
+    # Lazily import to avoid hard dependency
+    import pyarrow as pa  # type: ignore
+
+    def _clx_query_arrow(models: Any, prompts: Any, params: Any) -> Any:
+        outputs = resolve_chunk(
+            models.to_pylist(),
+            prompts.to_pylist(),
+            params.to_pylist(),
+            backend_url=backend_url,
+            cache=cache,
+            expect_json=expect_json,
+            client=client,
+            max_concurrency=max_concurrency,
+            memo=memo,
+        )
+        return pa.array(outputs, type=pa.string())
+
+    connection.create_function(
+        "clx_query",
+        _clx_query_arrow,
+        ["VARCHAR", "VARCHAR", "VARCHAR"],
+        "VARCHAR",
+        type="arrow",
+        null_handling="special",
+    )
+
+
+def materialize_clx_query(
+    connection: Any,
+    source: str,
+    *,
+    table: str = "clx_results",
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    chunk_size: int = 1024,
+) -> int:
+    """
+    Resolve the distinct prompts of `source` in bulk into a lookup table.
+
+    `source` is a SELECT returning `model`, `prompt` and `params` (JSON text
+    or NULL) columns. Each distinct row not already in `table` is resolved,
+    with concurrent requests, and stored as (model, prompt, params, output).
+    Returns the number of rows added. Join against the table instead of
+    calling `clx_query` per row:
+
+        materialize_clx_query(con, "SELECT 'meta-llama3' AS model, "
+                                   "'Translate: ' || text AS prompt, NULL AS params FROM docs")
+        con.execute(\"\"\"
+            SELECT d.id, r.output FROM docs d JOIN clx_results r
+              ON r.model = 'meta-llama3' AND r.prompt = 'Translate: ' || d.text
+        \"\"\")
+    """
+    target = quote_identifier(table)
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {target} "
+        "(model VARCHAR NOT NULL, prompt VARCHAR NOT NULL, params VARCHAR, output VARCHAR)"
+    )
+    pending = connection.execute(
+        f"SELECT DISTINCT s.model, s.prompt, s.params FROM ({source}) AS s "
+        "WHERE s.model IS NOT NULL AND s.prompt IS NOT NULL AND NOT EXISTS ("
+        f"SELECT 1 FROM {target} AS r WHERE r.model = s.model AND r.prompt = s.prompt "
+        "AND r.params IS NOT DISTINCT FROM s.params)"
+    ).fetchall()
+    resolved = materialize_rows(
+        pending,
+        chunk_size=chunk_size,
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        client=client,
+        max_concurrency=max_concurrency,
+    )
+    if resolved:
+        connection.executemany(f"INSERT INTO {target} VALUES (?, ?, ?, ?)", resolved)
+    return len(resolved)
+
+
+def run_clx_job(
+    connection: Any,
+    source: str,
+    *,
+    job_id: str,
+    ledger: Ledger,
+    table: str = "clx_job_results",
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    chunk_size: int = 256,
+    retry_failed: bool = True,
+    prune: bool = False,
+) -> JobStats:
+    """
+    Incrementally resolve `source` as ledger job `job_id`, then export it to `table`.
+
+    `source` is a SELECT returning `row_key`, `model`, `prompt` and `params`
+    columns. Only rows that are new or whose inputs changed since the last
+    run (and, with `retry_failed`, rows that failed) are sent; see
+    `clx.ledger.run_job`. A crashed run resumes where it stopped. `table` is
+    then replaced with (row_key, output, status, error, updated_at) for every
+    row of the job. Pass `prune=True` when `source` selects the whole table,
+    so deleted rows leave the ledger:
+
+        with Ledger() as ledger:
+            run_clx_job(
+                con,
+                "SELECT id AS row_key, 'meta-llama3' AS model, "
+                "'Summarize: ' || text AS prompt, NULL AS params FROM docs",
+                job_id="docs-summaries",
+                ledger=ledger,
+                prune=True,
+            )
+        con.execute(\"\"\"
+            SELECT d.id, r.output FROM docs d JOIN clx_job_results r ON r.row_key = d.id
+        \"\"\")
+    """
+    return run_query_job(
+        connection,
+        source,
+        ledger=ledger,
+        job_id=job_id,
+        table=table,
+        chunk_size=chunk_size,
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        client=client,
+        max_concurrency=max_concurrency,
+        retry_failed=retry_failed,
+        prune=prune,
+    )
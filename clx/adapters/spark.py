@@ -5,26 +5,60 @@ Spark SQL integration.
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-from ..core import Cache, clx_query
+from ..core import CacheBackend, clx_query
+from ._batch import make_memo, memoize_udf, resolve_chunk
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..cache import LRUCache
+    from ..client import Client
 
 
 def register_clx_query(
     spark_session: Any,
     *,
     backend_url: Optional[str] = None,
-    cache: Optional[Cache] = None,
+    cache: Optional[CacheBackend] = None,
     expect_json: bool = False,
+    client: Optional[Client] = None,
+    vectorized: bool = False,
+    max_concurrency: int = 8,
+    memo_entries: int = 0,
 ) -> None:
     """
     Register `clx_query` as a Spark SQL function.
 
+    With `vectorized=True` the function is registered as a pandas (Arrow) UDF:
+    each executor call receives a batch of rows, resolves identical
+    (model, prompt, params) rows once, and sends misses with up to
+    `max_concurrency` requests in flight. Leave `client` unset to reuse one
+    HTTP pool per executor Python process. A `Cache` can be passed; each
+    executor opens its own SQLite file at the same path, so point it at
+    executor-local storage. Requires `pandas` and `pyarrow` on the executors.
+
+    With `memo_entries > 0`, each executor process memoizes results keyed by
+    the raw (model, prompt, params) arguments, skipping canonicalization and
+    the cache lookup for repeated rows. Map-typed params are not memoized.
+
     Example:
         from clx.adapters.spark import register_clx_query
         register_clx_query(spark)
     """
 
+    memo = make_memo(memo_entries)
+    if vectorized:
+        udf = _build_pandas_udf(
+            backend_url=backend_url,
+            cache=cache,
+            expect_json=expect_json,
+            client=client,
+            max_concurrency=max_concurrency,
+            memo=memo,
+        )
+        spark_session.udf.register("clx_query", udf)
+        return
+
     def _clx_query_udf(model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
         output = clx_query(
             model=model,
@@ -33,10 +67,98 @@ def register_clx_query(
             backend_url=backend_url,
             cache=cache,
             expect_json=expect_json,
+            client=client,
         )
         return json.dumps(output) if expect_json else str(output)
 
     # Lazily import to avoid hard dependency
     from pyspark.sql.types import StringType  # type: ignore
 
-    spark_session.udf.register("clx_query", _clx_query_udf, StringType())
+    spark_session.udf.register("clx_query", memoize_udf(_clx_query_udf, memo), StringType())
+
+
+def _build_pandas_udf(
+    *,
+    backend_url: Optional[str],
+    cache: Optional[CacheBackend],
+    expect_json: bool,
+    client: Optional[Client],
+    max_concurrency: int,
+    memo: Optional[LRUCache],
+) -> Any:
+    # Lazily import to avoid hard dependency
+    from pyspark.sql.functions import pandas_udf  # type: ignore
+    from pyspark.sql.types import StringType  # type: ignore
+
+    # Left unannotated: Spark infers a scalar (Series -> Series) pandas UDF, and
+    # pandas only needs to be importable on the executors.
+    def _clx_query_pandas(models, prompts, params):  # type: ignore[no-untyped-def]
+        import pandas as pd  # type: ignore
+
+        if isinstance(params, pd.DataFrame):  # struct columns arrive as DataFrames
+            params_list = params.to_dict("records")
+        else:
+            params_list = params.tolist()
+        outputs = resolve_chunk(
+            models.tolist(),
+            prompts.tolist(),
+            params_list,
+            backend_url=backend_url,
+            cache=cache,
+            expect_json=expect_json,
+            client=client,
+            max_concurrency=max_concurrency,
+            memo=memo,
+        )
+        return pd.Series(outputs, dtype=object)
+
+    return pandas_udf(_clx_query_pandas, StringType())
+
+
+def materialize_clx_query(
+    df: Any,
+    *,
+    model_col: str = "model",
+    prompt_col: str = "prompt",
+    params_col: Optional[str] = None,
+    output_col: str = "output",
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+) -> Any:
+    """
+    Return a lookup DataFrame of the distinct (model, prompt, params) rows of
+    `df` with their resolved `output_col`.
+
+    Each distinct row is resolved once, in batches on the executors through
+    the vectorized UDF. Join the result back on the same columns (cache or
+    write it out to reuse it across jobs):
+
+        docs = docs.withColumn("model", lit("meta-llama3")).withColumn(
+            "prompt", concat(lit("Summarize: "), col("text"))
+        )
+        lookup = materialize_clx_query(docs)
+        result = docs.join(lookup.drop("params"), ["model", "prompt"])
+    """
+    # Lazily import to avoid hard dependency
+    from pyspark.sql import functions as F  # type: ignore
+
+    params = F.col(params_col) if params_col else F.lit(None).cast("string")
+    distinct = df.select(
+        F.col(model_col).alias(model_col),
+        F.col(prompt_col).alias(prompt_col),
+        params.alias(params_col or "params"),
+    ).distinct()
+    udf = _build_pandas_udf(
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        client=client,
+        max_concurrency=max_concurrency,
+        memo=None,
+    )
+    return distinct.withColumn(
+        output_col, udf(F.col(model_col), F.col(prompt_col), F.col(params_col or "params"))
+    )
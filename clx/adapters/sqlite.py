@@ -5,21 +5,38 @@ SQLite SQL integration.
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-from ..core import Cache, clx_query
+from ..core import CacheBackend, clx_query
+from ._batch import (
+    make_memo,
+    materialize_rows,
+    memoize_udf,
+    quote_identifier,
+    run_query_job,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..client import Client
+    from ..ledger import JobStats, Ledger
 
 
 def register_clx_query(
     connection: Any,
     *,
     backend_url: Optional[str] = None,
-    cache: Optional[Cache] = None,
+    cache: Optional[CacheBackend] = None,
     expect_json: bool = False,
+    client: Optional[Client] = None,
+    memo_entries: int = 0,
 ) -> None:
     """
     Register `clx_query` as a SQLite SQL function.
 
+    With `memo_entries > 0`, results are memoized per registration, keyed by
+    the raw (model, prompt, params) arguments. Repeated rows then skip payload
+    canonicalization and the cache lookup entirely.
+
     Example:
         import sqlite3
         conn = sqlite3.connect(":memory:")
@@ -34,7 +51,119 @@ def register_clx_query(
             backend_url=backend_url,
             cache=cache,
             expect_json=expect_json,
+            client=client,
         )
         return json.dumps(output) if expect_json else str(output)
 
-    connection.create_function("clx_query", 3, _clx_query_fn)
+    connection.create_function("clx_query", 3, memoize_udf(_clx_query_fn, make_memo(memo_entries)))
+
+
+def materialize_clx_query(
+    connection: Any,
+    source: str,
+    *,
+    table: str = "clx_results",
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    chunk_size: int = 1024,
+) -> int:
+    """
+    Resolve the distinct prompts of `source` in bulk into a lookup table.
+
+    `source` is a SELECT returning `model`, `prompt` and `params` columns.
+    Each distinct row not already in `table` is resolved, with concurrent
+    requests, and stored as (model, prompt, params, output). Returns the
+    number of rows added. Join against the table instead of calling
+    `clx_query` per row:
+
+        materialize_clx_query(conn, "SELECT 'meta-llama3' AS model, "
+                                    "'Summarize: ' || text AS prompt, NULL AS params FROM docs")
+        conn.execute(\"\"\"
+            SELECT d.id, r.output FROM docs d JOIN clx_results r
+              ON r.model = 'meta-llama3' AND r.prompt = 'Summarize: ' || d.text
+        \"\"\")
+    """
+    target = quote_identifier(table)
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {target} "
+        "(model TEXT NOT NULL, prompt TEXT NOT NULL, params TEXT, output TEXT, "
+        "PRIMARY KEY (model, prompt, params))"
+    )
+    pending = connection.execute(
+        f"SELECT DISTINCT s.model, s.prompt, s.params FROM ({source}) AS s "
+        "WHERE s.model IS NOT NULL AND s.prompt IS NOT NULL AND NOT EXISTS ("
+        f"SELECT 1 FROM {target} AS r WHERE r.model = s.model AND r.prompt = s.prompt "
+        "AND r.params IS s.params)"
+    ).fetchall()
+    resolved = materialize_rows(
+        pending,
+        chunk_size=chunk_size,
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        client=client,
+        max_concurrency=max_concurrency,
+    )
+    with connection:
+        connection.executemany(f"INSERT OR REPLACE INTO {target} VALUES (?, ?, ?, ?)", resolved)
+    return len(resolved)
+
+
+def run_clx_job(
+    connection: Any,
+    source: str,
+    *,
+    job_id: str,
+    ledger: Ledger,
+    table: str = "clx_job_results",
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    chunk_size: int = 256,
+    retry_failed: bool = True,
+    prune: bool = False,
+) -> JobStats:
+    """
+    Incrementally resolve `source` as ledger job `job_id`, then export it to `table`.
+
+    `source` is a SELECT returning `row_key`, `model`, `prompt` and `params`
+    columns. Only rows that are new or whose inputs changed since the last
+    run (and, with `retry_failed`, rows that failed) are sent; see
+    `clx.ledger.run_job`. A crashed run resumes where it stopped. `table` is
+    then replaced with (row_key, output, status, error, updated_at) for every
+    row of the job. Pass `prune=True` when `source` selects the whole table,
+    so deleted rows leave the ledger:
+
+        with Ledger() as ledger:
+            run_clx_job(
+                conn,
+                "SELECT id AS row_key, 'meta-llama3' AS model, "
+                "'Summarize: ' || text AS prompt, NULL AS params FROM docs",
+                job_id="docs-summaries",
+                ledger=ledger,
+                prune=True,
+            )
+        conn.execute(\"\"\"
+            SELECT d.id, r.output FROM docs d JOIN clx_job_results r ON r.row_key = d.id
+        \"\"\")
+    """
+    return run_query_job(
+        connection,
+        source,
+        ledger=ledger,
+        job_id=job_id,
+        table=table,
+        chunk_size=chunk_size,
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        client=client,
+        max_concurrency=max_concurrency,
+        retry_failed=retry_failed,
+        prune=prune,
+    )
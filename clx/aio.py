@@ -0,0 +1,438 @@
+"""
+Asyncio counterparts of `clx_query` and `clx_query_many`.
+
+Requires the optional `httpx` dependency (`pip install clx-cli[async]`). The
+request contract, routing, caching and JSON handling match the sync path.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import json
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .balancer import BackendPool, split_pool_endpoint
+from .client import (
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_BACKOFF_MAX,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_RETRIES,
+    DEFAULT_RETRY_STATUSES,
+    encode_body,
+)
+from .core import (
+    CacheBackend,
+    _build_endpoint,
+    _build_payload,
+    _ensure_json_payload,
+    _extract_output,
+    resolve_backend_path,
+    resolve_backend_url,
+)
+from .ratelimit import RateLimiter, backoff_delay, estimate_cost, parse_retry_after
+from .streaming import STREAM_ACCEPT, StreamDecoder, _stream_request
+
+
+class AsyncClient:
+    """
+    Pooled asyncio HTTP client backed by `httpx.AsyncClient`.
+
+    Args:
+        max_connections: Maximum concurrent connections across all backends.
+        max_keepalive_connections: Idle connections kept open for reuse.
+        retries: Retry budget for connection errors and retryable statuses.
+        backoff_factor: Base delay in seconds for jittered exponential backoff.
+        backoff_max: Longest delay between retries. A `Retry-After` longer than
+            this is not waited out; the response is returned instead.
+        retry_statuses: HTTP statuses that trigger a retry.
+        headers: Extra headers sent with every request.
+        rate_limiter: Optional `RateLimiter` pacing requests per backend/model.
+            It can be shared with a sync `Client`.
+        compress_requests: Gzip request bodies of at least this many bytes
+            (see `Client`). None never compresses.
+
+    Status retries and rate limiting apply to `post`; streams are sent once.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 1000,
+        max_keepalive_connections: int = DEFAULT_POOL_MAXSIZE,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        headers: Optional[Dict[str, str]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        compress_requests: Optional[int] = None,
+    ):
+        # Lazily import to avoid hard dependency
+        try:
+            import httpx  # type: ignore
+        except ModuleNotFoundError as exc:  # pragma: no cover
+            raise ImportError(
+                "clx async support requires httpx: pip install clx-cli[async]"
+            ) from exc
+
+        self._httpx = httpx
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = tuple(retry_statuses)
+        self.rate_limiter = rate_limiter
+        self.compress_requests = compress_requests
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+            headers=headers,
+        )
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def post(
+        self,
+        endpoint: str,
+        payload: Any,
+        *,
+        timeout: Tuple[float, float] = (5, 30),
+    ) -> Any:
+        """
+        POST `payload` as JSON to `endpoint` and return the httpx response.
+
+        Retryable statuses are retried like `Client` does: honouring
+        `Retry-After`, otherwise with jittered backoff, and each attempt
+        passes through the rate limiter.
+        """
+        pooled = split_pool_endpoint(endpoint)
+        if pooled is not None:
+            return await self._post_pooled(*pooled, payload, timeout)
+        return await self._post(endpoint, payload, timeout, self.retries)
+
+    async def _post_pooled(
+        self,
+        pool: BackendPool,
+        path: str,
+        payload: Any,
+        timeout: Tuple[float, float],
+    ) -> Any:
+        # A retryable status fails over to the next replica straight away; only once
+        # the pool has no better answer is the whole request retried after a backoff.
+        attempt = 0
+        while True:
+            response = await pool.asend(path, lambda url: self._post(url, payload, timeout, 0))
+            delay = self._retry_delay(response, attempt, self.retries)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, response: Any, attempt: int, retries: int) -> Optional[float]:
+        """Seconds to wait before retrying `response`, or None to return it as is."""
+        if response.status_code not in self.retry_statuses or attempt >= retries:
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            return backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+        if retry_after <= self.backoff_max:
+            return retry_after
+        return None
+
+    async def _post(
+        self,
+        endpoint: str,
+        payload: Any,
+        timeout: Tuple[float, float],
+        retries: int,
+    ) -> Any:
+        connect_timeout, read_timeout = timeout
+        request_timeout = self._httpx.Timeout(read_timeout, connect=connect_timeout)
+        body = self._body(payload)
+        if self.rate_limiter is not None:
+            model, tokens = estimate_cost(payload)
+        attempt = 0
+        while True:
+            permit = None
+            if self.rate_limiter is not None:
+                permit = await self.rate_limiter.acquire_async(
+                    endpoint, model=model, tokens=tokens
+                )
+            try:
+                response = await self._client.post(endpoint, timeout=request_timeout, **body)
+            except self._httpx.HTTPError:
+                if permit is not None:
+                    permit.release(failed=True)
+                raise
+            except BaseException:
+                # Cancellation (e.g. a hedge that lost) says nothing about the backend.
+                if permit is not None:
+                    permit.release(cancelled=True)
+                raise
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if permit is not None:
+                permit.release(response.status_code, retry_after=retry_after)
+            delay = self._retry_delay(response, attempt, retries)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(
+        self,
+        endpoint: str,
+        payload: Any,
+        *,
+        timeout: Tuple[float, float] = (5, 300),
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        """Open a streamed POST; use as `async with client.stream(...) as response`."""
+        pooled = split_pool_endpoint(endpoint)
+        if pooled is not None:
+            return self._pooled_stream(*pooled, payload, timeout, headers)
+        connect_timeout, read_timeout = timeout
+        body = self._body(payload)
+        return self._client.stream(
+            "POST",
+            endpoint,
+            headers={**(headers or {}), **body.pop("headers", {})},
+            timeout=self._httpx.Timeout(read_timeout, connect=connect_timeout),
+            **body,
+        )
+
+    def _body(self, payload: Any) -> Dict[str, Any]:
+        if self.compress_requests is None:
+            return {"json": payload}
+        content, headers = encode_body(payload, self.compress_requests)
+        return {"content": content, "headers": headers}
+
+    @contextlib.asynccontextmanager
+    async def _pooled_stream(
+        self,
+        pool: BackendPool,
+        path: str,
+        payload: Any,
+        timeout: Tuple[float, float],
+        headers: Optional[Dict[str, str]],
+    ) -> AsyncIterator[Any]:
+        # Streams go to one replica without failover or hedging.
+        replica = pool._acquire()
+        assert replica is not None
+        started = time.monotonic()
+        healthy = False
+        try:
+            async with self.stream(
+                replica.url + path, payload, timeout=timeout, headers=headers
+            ) as response:
+                healthy = response.status_code < 500
+                yield response
+        finally:
+            pool._release(replica, started, healthy)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# httpx clients are bound to the event loop they first run on, so keep one per loop.
+_default_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_default_async_client() -> AsyncClient:
+    """Return the shared `AsyncClient` for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        client = AsyncClient()
+        _default_clients[loop] = client
+    return client
+
+
+async def _offload(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking call (cache I/O) on the loop's default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+async def _apost_query(
+    client: AsyncClient,
+    endpoint: str,
+    payload: Dict[str, Any],
+    timeout: Tuple[int, int],
+) -> Any:
+    try:
+        response = await client.post(endpoint, payload, timeout=timeout)
+    except client._httpx.HTTPError as exc:
+        raise RuntimeError(f"Failed to reach backend at {endpoint}") from exc
+
+    if response.status_code >= 400:
+        raise RuntimeError(f"Backend returned {response.status_code}: {response.text}")
+
+    try:
+        data = response.json()
+    except ValueError as exc:
+        raise ValueError("Backend response was not valid JSON") from exc
+
+    return _extract_output(data)
+
+
+async def aclx_query(
+    model: str,
+    prompt: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    backend_url: Optional[str] = None,
+    backend_path: Optional[str] = None,
+    pod_name: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    expect_json: bool = False,
+    use_messages_payload: bool = False,
+    timeout: Tuple[int, int] = (5, 30),
+    client: Optional[AsyncClient] = None,
+) -> Any:
+    """
+    Async version of `clx_query`. Arguments match `clx_query`, except that
+    `client` is an `AsyncClient` (defaults to one shared per event loop).
+
+    Retryable statuses (429, 503, ...) are retried by the `AsyncClient`;
+    pass `AsyncClient(rate_limiter=...)` to pace requests as with `Client`.
+    Cache reads and writes run on the event loop's default executor, so a
+    slow cache (a SQLite file on a busy disk, or a `RemoteCache` daemon) does
+    not block other coroutines.
+    """
+    resolved_backend = resolve_backend_url(backend_url)
+    resolved_path = resolve_backend_path(backend_path, pod_name=pod_name, actor_id=actor_id)
+    params = params or {}
+    meta = metadata or {}
+    cache_key = None
+
+    if cache:
+        cache_key = cache.build_key(
+            resolved_backend,
+            resolved_path,
+            model,
+            prompt,
+            params,
+            meta,
+            use_messages_payload,
+        )
+        cached = await _offload(cache.get, cache_key)
+        if cached is not None:
+            return cached if not expect_json else _ensure_json_payload(cached)
+
+    payload = _build_payload(model, prompt, params, meta, use_messages_payload)
+    endpoint = _build_endpoint(resolved_backend, resolved_path)
+    output = await _apost_query(client or get_default_async_client(), endpoint, payload, timeout)
+    # Validate before caching, but cache the raw output so hits parse like fresh answers.
+    result = _ensure_json_payload(output) if expect_json else output
+
+    if cache and cache_key:
+        await _offload(cache.set, cache_key, output, namespace=model)
+
+    return result
+
+
+async def aclx_query_many(
+    model: str,
+    prompts: Iterable[str],
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    max_concurrency: int = 64,
+    return_exceptions: bool = True,
+    **kwargs: Any,
+) -> List[Any]:
+    """
+    Async version of `clx_query_many`: run `aclx_query` over `prompts` with at
+    most `max_concurrency` requests in flight, returning results in order.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(prompt: str) -> Any:
+        async with semaphore:
+            return await aclx_query(model, prompt, params, **kwargs)
+
+    return await asyncio.gather(
+        *(_run(prompt) for prompt in prompts), return_exceptions=return_exceptions
+    )
+
+
+async def aclx_stream(
+    model: str,
+    prompt: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    backend_url: Optional[str] = None,
+    backend_path: Optional[str] = None,
+    pod_name: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    use_messages_payload: bool = False,
+    timeout: Tuple[int, int] = (5, 300),
+    client: Optional[AsyncClient] = None,
+) -> AsyncIterator[str]:
+    """
+    Async version of `clx_stream`: yields output chunks as they arrive and
+    caches the assembled text once the stream completes. Cache calls run on
+    the default executor, as in `aclx_query`.
+    """
+    endpoint, payload, cache_key = _stream_request(
+        model,
+        prompt,
+        params,
+        backend_url,
+        backend_path,
+        pod_name,
+        actor_id,
+        cache,
+        metadata,
+        use_messages_payload,
+    )
+    if cache and cache_key:
+        cached = await _offload(cache.get, cache_key)
+        if cached is not None:
+            yield cached if isinstance(cached, str) else json.dumps(cached)
+            return
+
+    http = client or get_default_async_client()
+    parts: List[str] = []
+    try:
+        async with http.stream(
+            endpoint, payload, timeout=timeout, headers={"Accept": STREAM_ACCEPT}
+        ) as response:
+            if response.status_code >= 400:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                raise RuntimeError(f"Backend returned {response.status_code}: {body}")
+
+            decoder = StreamDecoder(response.headers.get("Content-Type", ""))
+            async for text in response.aiter_text():
+                for chunk in decoder.feed(text):
+                    parts.append(chunk)
+                    yield chunk
+                if decoder.done:
+                    break
+            for chunk in decoder.finish():
+                parts.append(chunk)
+                yield chunk
+    except http._httpx.HTTPError as exc:
+        raise RuntimeError(f"Backend stream from {endpoint} failed") from exc
+
+    if cache and cache_key:
+        await _offload(cache.set, cache_key, "".join(parts), namespace=model)
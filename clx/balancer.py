@@ -0,0 +1,528 @@
+"""
+Client-side load balancing over backend replicas.
+
+A `BackendPool` stands for several interchangeable replicas of one backend
+behind a logical URL, `clx+pool://<name>`. That logical URL is what
+`resolve_backend_url` returns and what goes into cache keys, so a cached
+answer is found no matter which replica produced it. `Client` and
+`AsyncClient` swap in a concrete replica only when the request is sent:
+
+- `strategy` picks the replica: `round_robin`, `least_outstanding` (fewest
+  in-flight requests) or `latency_weighted` (random, weighted by the inverse
+  of each replica's moving-average latency).
+- A circuit breaker ejects a replica after `failure_threshold` consecutive
+  failures (connection errors or 5xx). After `cooldown` seconds a single
+  probe request is let through; success restores it, failure ejects it again
+  for twice as long (up to `max_cooldown`). When every replica is ejected,
+  requests go to the one closest to recovering rather than failing outright.
+- A failed attempt (connection error, 429 or 5xx) is retried on another
+  replica, up to `max_attempts` replicas per request.
+- With `hedge_after`, a request still unanswered after that many seconds is
+  sent to a second replica as well. Async requests take the first good
+  answer and cancel the other. Sync requests keep the primary on the
+  caller's thread and only the hedge runs on a shared worker pool, so the
+  caller returns once its primary finishes. It then uses the hedge's answer
+  if that arrived first or the primary failed. Streams are never hedged.
+
+Pools are registered by name in the current process. A comma-separated list
+of URLs passed as `backend_url`, set in `CLX_BACKEND_URL` or given as a list in
+the config file creates (or reuses) the matching pool, which also works on
+Spark executors. Give the pool a `name` to keep cache keys stable when the
+set of replicas changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+POOL_SCHEME = "clx+pool://"
+STRATEGIES = ("round_robin", "least_outstanding", "latency_weighted")
+FAILOVER_STATUSES = (429, 500, 502, 503, 504)
+_LATENCY_DECAY = 0.2
+_HEDGE_WORKERS = 64
+
+Attempt = Tuple[Any, Optional[BaseException]]
+
+
+class _Replica:
+    __slots__ = (
+        "url",
+        "outstanding",
+        "latency",
+        "failures",
+        "opened_until",
+        "trips",
+        "probing",
+        "requests",
+        "errors",
+    )
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.opened_until = 0.0
+        self.trips = 0
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+
+    def state(self, now: float) -> str:
+        if not self.trips:
+            return "closed"
+        return "open" if now < self.opened_until else "half_open"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+
+class BackendPool:
+    """
+    Replicas of one logical backend with load balancing and failover.
+
+    Args:
+        urls: Base URLs of the replicas.
+        name: Logical backend name; `url` is `clx+pool://<name>`. Defaults to a
+            hash of the sorted replica URLs.
+        strategy: `round_robin`, `least_outstanding` or `latency_weighted`.
+        failure_threshold: Consecutive failures that eject a replica.
+        cooldown: Seconds an ejected replica waits before a probe request.
+        max_cooldown: Upper bound for the doubling cooldown of a replica that
+            keeps failing its probes.
+        max_attempts: Replicas tried per request, including hedges.
+        hedge_after: Seconds after which an unanswered request is also sent to
+            a second replica. None disables hedging.
+        register: Make the pool reachable through its `url` in this process.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        *,
+        name: Optional[str] = None,
+        strategy: str = "round_robin",
+        failure_threshold: int = 3,
+        cooldown: float = 10.0,
+        max_cooldown: float = 300.0,
+        max_attempts: int = 3,
+        hedge_after: Optional[float] = None,
+        register: bool = True,
+    ):
+        replicas = [url.strip().rstrip("/") for url in urls if url and url.strip()]
+        if not replicas:
+            raise ValueError("BackendPool needs at least one URL")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+        if failure_threshold < 1 or max_attempts < 1:
+            raise ValueError("failure_threshold and max_attempts must be at least 1")
+        if hedge_after is not None and hedge_after < 0:
+            raise ValueError("hedge_after must be non-negative")
+        self.name = name or "pool-" + hashlib.sha256(
+            ",".join(sorted(replicas)).encode("utf-8")
+        ).hexdigest()[:12]
+        if "/" in self.name:
+            raise ValueError("pool name must not contain '/'")
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_attempts = max_attempts
+        self.hedge_after = hedge_after
+        self._replicas = [_Replica(url) for url in replicas]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._counters = dict.fromkeys(("requests", "failovers", "hedges", "hedge_wins"), 0)
+        if register:
+            register_backend_pool(self)
+
+    @property
+    def url(self) -> str:
+        """Logical backend URL to pass as `backend_url`; used in cache keys."""
+        return f"{POOL_SCHEME}{self.name}"
+
+    @property
+    def urls(self) -> List[str]:
+        return [replica.url for replica in self._replicas]
+
+    def health(self) -> Dict[str, Any]:
+        """Per-replica state (closed/open/half_open), load and latency, plus pool counters."""
+        now = time.monotonic()
+        with self._lock:
+            replicas = [
+                {
+                    "url": replica.url,
+                    "state": replica.state(now),
+                    "outstanding": replica.outstanding,
+                    "latency_ms": None if replica.latency is None else replica.latency * 1000,
+                    "consecutive_failures": replica.failures,
+                    "requests": replica.requests,
+                    "errors": replica.errors,
+                }
+                for replica in self._replicas
+            ]
+            return {"name": self.name, "replicas": replicas, **self._counters}
+
+    def _acquire(self, exclude: Sequence[_Replica] = ()) -> Optional[_Replica]:
+        now = time.monotonic()
+        with self._lock:
+            rest = [replica for replica in self._replicas if replica not in exclude]
+            if not rest:
+                return None
+            candidates = [replica for replica in rest if replica.available(now)]
+            if candidates:
+                replica = self._choose(candidates)
+            else:
+                # Every remaining replica is ejected: fail open to the one closest to recovery.
+                replica = min(rest, key=lambda r: r.opened_until)
+            if replica.state(now) == "half_open":
+                replica.probing = True
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def _choose(self, candidates: List[_Replica]) -> _Replica:
+        self._next += 1
+        if len(candidates) == 1:
+            return candidates[0]
+        offset = self._next % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        if self.strategy == "round_robin":
+            return rotated[0]
+        if self.strategy == "least_outstanding":
+            return min(rotated, key=lambda r: r.outstanding)
+        known = [r.latency for r in candidates if r.latency is not None]
+        # Replicas without a measurement yet get the best weight so they are probed.
+        fastest = min(known) if known else 1.0
+        latencies = [fastest if r.latency is None else r.latency for r in rotated]
+        weights = [1.0 / max(latency, 1e-6) for latency in latencies]
+        return random.choices(rotated, weights=weights)[0]
+
+    def _release(self, replica: _Replica, started: float, healthy: Optional[bool]) -> None:
+        """Record an attempt's outcome; `healthy=None` means it was abandoned (hedge loser)."""
+        now = time.monotonic()
+        with self._lock:
+            replica.outstanding -= 1
+            was_probe, replica.probing = replica.probing, False
+            if healthy is None:
+                return
+            if healthy:
+                elapsed = now - started
+                replica.latency = (
+                    elapsed
+                    if replica.latency is None
+                    else replica.latency + _LATENCY_DECAY * (elapsed - replica.latency)
+                )
+                replica.failures = 0
+                replica.trips = 0
+                replica.opened_until = 0.0
+                return
+            replica.errors += 1
+            replica.failures += 1
+            if was_probe or replica.failures >= self.failure_threshold:
+                cooldown = min(self.max_cooldown, self.cooldown * (2 ** replica.trips))
+                replica.trips += 1
+                replica.opened_until = now + cooldown
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def send(self, path: str, send: Callable[[str], Any], *, hedge: bool = True) -> Any:
+        """
+        Send a request to a replica (with failover and optional hedging).
+
+        Args:
+            path: Path (and query) appended to the chosen replica's URL.
+            send: Performs the request for a full URL and returns a response
+                with a `status_code`. Exceptions count as replica failures.
+            hedge: Allow a hedged second request when `hedge_after` is set.
+        """
+        self._count("requests")
+        tried: List[_Replica] = []
+        attempt: Attempt = (None, None)
+        while len(tried) < self.max_attempts:
+            replica = self._acquire(tried)
+            if replica is None:
+                break
+            if tried:
+                self._count("failovers")
+            tried.append(replica)
+            if hedge and self.hedge_after is not None:
+                attempt = self._send_hedged(replica, path, send, tried)
+            else:
+                attempt = self._attempt(replica, path, send)
+            if not _should_fail_over(attempt) or len(tried) >= self.max_attempts:
+                break
+            _discard(attempt)
+        return _unwrap(attempt)
+
+    def _attempt(self, replica: _Replica, path: str, send: Callable[[str], Any]) -> Attempt:
+        started = time.monotonic()
+        try:
+            response = send(replica.url + path)
+        except Exception as exc:  # noqa: BLE001 - counted against the replica, re-raised later
+            self._release(replica, started, False)
+            return None, exc
+        self._release(replica, started, response.status_code < 500)
+        return response, None
+
+    def _send_hedged(
+        self,
+        primary: _Replica,
+        path: str,
+        send: Callable[[str], Any],
+        tried: List[_Replica],
+    ) -> Attempt:
+        # The primary runs on the caller's thread; only the hedge, if it fires,
+        # takes a worker from the shared executor.
+        lock = threading.Lock()
+        finished = False
+        backup_future: Optional["Future[Attempt]"] = None
+
+        def launch_hedge() -> None:
+            nonlocal backup_future
+            with lock:
+                if finished or len(tried) >= self.max_attempts:
+                    return
+                backup = self._acquire(tried)
+                if backup is None:
+                    return
+                tried.append(backup)
+                self._count("hedges")
+                backup_future = _hedge_executor().submit(self._attempt, backup, path, send)
+
+        _hedge_timer().call_later(self.hedge_after, launch_hedge)
+        attempt = self._attempt(primary, path, send)
+        with lock:
+            finished = True
+            future = backup_future
+        if future is None:
+            return attempt
+        if not _should_fail_over(attempt) and not future.done():
+            # Requests cannot be cancelled mid-flight; close the late answer instead.
+            future.add_done_callback(_discard_future)
+            return attempt
+        backup_attempt = future.result()
+        if _should_fail_over(backup_attempt):
+            _discard(backup_attempt)
+            return attempt
+        self._count("hedge_wins")
+        _discard(attempt)
+        return backup_attempt
+
+    async def asend(
+        self,
+        path: str,
+        send: Callable[[str], Awaitable[Any]],
+        *,
+        hedge: bool = True,
+    ) -> Any:
+        """Async version of `send`; hedged requests that lose are cancelled."""
+        self._count("requests")
+        tried: List[_Replica] = []
+        attempt: Attempt = (None, None)
+        while len(tried) < self.max_attempts:
+            replica = self._acquire(tried)
+            if replica is None:
+                break
+            if tried:
+                self._count("failovers")
+            tried.append(replica)
+            if hedge and self.hedge_after is not None:
+                attempt = await self._asend_hedged(replica, path, send, tried)
+            else:
+                attempt = await self._aattempt(replica, path, send)
+            if not _should_fail_over(attempt) or len(tried) >= self.max_attempts:
+                break
+        return _unwrap(attempt)
+
+    async def _aattempt(
+        self, replica: _Replica, path: str, send: Callable[[str], Awaitable[Any]]
+    ) -> Attempt:
+        import asyncio
+
+        started = time.monotonic()
+        try:
+            response = await send(replica.url + path)
+        except asyncio.CancelledError:
+            self._release(replica, started, None)
+            raise
+        except Exception as exc:  # noqa: BLE001 - counted against the replica, re-raised later
+            self._release(replica, started, False)
+            return None, exc
+        self._release(replica, started, response.status_code < 500)
+        return response, None
+
+    async def _asend_hedged(
+        self,
+        primary: _Replica,
+        path: str,
+        send: Callable[[str], Awaitable[Any]],
+        tried: List[_Replica],
+    ) -> Attempt:
+        import asyncio
+
+        pending = {asyncio.ensure_future(self._aattempt(primary, path, send))}
+        backup_task = None
+        done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+        if not done and len(tried) < self.max_attempts:
+            backup = self._acquire(tried)
+            if backup is not None:
+                tried.append(backup)
+                self._count("hedges")
+                backup_task = asyncio.ensure_future(self._aattempt(backup, path, send))
+                pending.add(backup_task)
+        attempt: Attempt = (None, None)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt = task.result()
+                    if not _should_fail_over(attempt):
+                        if task is backup_task:
+                            self._count("hedge_wins")
+                        return attempt
+            return attempt
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def _should_fail_over(attempt: Attempt) -> bool:
+    response, error = attempt
+    return error is not None or response.status_code in FAILOVER_STATUSES
+
+
+def _unwrap(attempt: Attempt) -> Any:
+    response, error = attempt
+    if error is not None:
+        raise error
+    return response
+
+
+def _discard(attempt: Attempt) -> None:
+    response = attempt[0]
+    close = getattr(response, "close", None)
+    if close is not None:
+        close()
+
+
+def _discard_future(future: "Future[Attempt]") -> None:
+    _discard(future.result())
+
+
+class _Timer:
+    """A single daemon thread that runs short callbacks after a delay."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), callback))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="clx-hedge-timer", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(
+                        self._heap[0][0] - time.monotonic() if self._heap else None
+                    )
+                callback = heapq.heappop(self._heap)[2]
+            try:
+                callback()
+            except Exception:  # noqa: BLE001 - a failed hedge leaves the primary running
+                pass
+
+
+_timer: Optional[_Timer] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _hedge_timer() -> _Timer:
+    global _timer
+    if _timer is None:
+        with _executor_lock:
+            if _timer is None:
+                _timer = _Timer()
+    return _timer
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(_HEDGE_WORKERS, thread_name_prefix="clx-hedge")
+    return _executor
+
+
+_pools: Dict[str, BackendPool] = {}
+_specs: Dict[Tuple[Any, ...], str] = {}
+_registry_lock = threading.Lock()
+
+
+def register_backend_pool(pool: BackendPool) -> BackendPool:
+    """Make `pool.url` routable in this process, replacing any pool of the same name."""
+    with _registry_lock:
+        _pools[pool.name] = pool
+    return pool
+
+
+def get_backend_pool(name_or_url: str) -> BackendPool:
+    """Return the registered pool for a name or `clx+pool://` URL."""
+    name = name_or_url[len(POOL_SCHEME) :] if name_or_url.startswith(POOL_SCHEME) else name_or_url
+    pool = _pools.get(name.split("/", 1)[0])
+    if pool is None:
+        raise RuntimeError(
+            f"Unknown backend pool {name!r}; create it with BackendPool(...) in this process "
+            "or pass the replica URLs comma-separated as backend_url"
+        )
+    return pool
+
+
+def split_pool_endpoint(endpoint: str) -> Optional[Tuple[BackendPool, str]]:
+    """For a `clx+pool://name/path` endpoint return (pool, "/path"); None for other URLs."""
+    if not endpoint.startswith(POOL_SCHEME):
+        return None
+    name, _, path = endpoint[len(POOL_SCHEME) :].partition("/")
+    return get_backend_pool(name), "/" + path
+
+
+def pool_url(spec: Union[str, Sequence[str]], **options: Any) -> str:
+    """
+    Logical URL for a replica list (comma-separated string or sequence),
+    creating and registering the pool on first use. Later calls with the same
+    list and options reuse it, so its health state persists across queries.
+    """
+    urls = tuple(spec.split(",")) if isinstance(spec, str) else tuple(spec)
+    key = (urls, tuple(sorted(options.items())))
+    url = _specs.get(key)
+    if url is not None and url[len(POOL_SCHEME) :] in _pools:
+        return url
+    with _registry_lock:
+        url = _specs.get(key)
+        if url is None or url[len(POOL_SCHEME) :] not in _pools:
+            pool = BackendPool(urls, register=False, **options)
+            _pools[pool.name] = pool
+            url = _specs[key] = pool.url
+    return url
@@ -0,0 +1,296 @@
+"""
+Client-side micro-batching for the optional bulk query contract.
+
+Backends that advertise batching accept many `/v1/query` payloads in one POST:
+
+    POST /v1/query:batch
+    {"items": [{"model": ..., "prompt": ..., "params": {...}, "metadata": {...}}, ...]}
+
+    Response:
+    {"outputs": [{"output": ...} | {"error": "..."}, ...]}  # one entry per item, in order
+
+Support is advertised by `GET /v1/capabilities` returning `{"batch": true}`
+(optionally with `"batch_path"` and `"max_batch_size"`). Backends that do not
+advertise it keep receiving single `/v1/query` calls.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from .client import Client, get_default_client
+from .core import DEFAULT_BACKEND_PATH, _build_endpoint, _extract_output, _post_query
+
+DEFAULT_BATCH_PATH = "/v1/query:batch"
+CAPABILITIES_PATH = "/v1/capabilities"
+_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+
+@dataclass
+class _Route:
+    batch_path: Optional[str]
+    max_batch_size: int
+
+
+# Calls are only batched together when they share backend, client and timeout.
+_Group = Tuple[str, Optional[Client], Tuple[int, int]]
+_Item = Tuple[Dict[str, Any], Future]
+
+
+class MicroBatcher:
+    """
+    Collect concurrent `clx_query` calls into bulk requests.
+
+    A pending batch is flushed when it reaches `max_batch_size` items or when
+    its oldest item has waited `max_wait` seconds, whichever comes first.
+
+    Args:
+        client: Pooled `Client` for calls submitted without their own client.
+        max_batch_size: Upper bound on items per bulk request.
+        max_wait: Maximum seconds an item waits for companions before flushing.
+        batch_path: Force a batch route and skip capability discovery.
+        timeout: (connect_timeout, read_timeout) for calls submitted without
+            their own timeout, and for capability discovery.
+        max_inflight_batches: Bulk requests allowed in flight at once.
+
+    Calls that pass different clients or timeouts go out in separate batches.
+
+    Example:
+        batcher = MicroBatcher(max_batch_size=64, max_wait=0.01)
+        clx_query("classifier", prompt, batcher=batcher)
+    """
+
+    def __init__(
+        self,
+        *,
+        client: Optional[Client] = None,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        batch_path: Optional[str] = None,
+        timeout: Tuple[int, int] = (5, 60),
+        max_inflight_batches: int = 8,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_path = batch_path
+        self.timeout = timeout
+        self._routes: Dict[str, _Route] = {}
+        self._routes_lock = threading.Lock()
+        self._pending: Dict[_Group, List[_Item]] = {}
+        self._deadlines: Dict[_Group, float] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._senders = ThreadPoolExecutor(
+            max_workers=max_inflight_batches, thread_name_prefix="clx-batch"
+        )
+        # Fallback single calls get their own pool so a degraded batch runs in parallel.
+        self._singles = ThreadPoolExecutor(
+            max_workers=max_batch_size, thread_name_prefix="clx-batch-single"
+        )
+        self._timer = threading.Thread(target=self._run_timer, name="clx-batch-timer", daemon=True)
+        self._timer.start()
+
+    def __enter__(self) -> "MicroBatcher":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _http(self, client: Optional[Client] = None) -> Client:
+        return client or self.client or get_default_client()
+
+    def _route_for(self, backend_url: str, client: Optional[Client] = None) -> _Route:
+        route = self._routes.get(backend_url)
+        if route is not None:
+            return route
+
+        # One discovery per backend, however many callers arrive at once.
+        with self._routes_lock:
+            route = self._routes.get(backend_url)
+            if route is None:
+                route = self._discover(backend_url, client)
+                self._routes[backend_url] = route
+        return route
+
+    def _discover(self, backend_url: str, client: Optional[Client]) -> _Route:
+        if self.batch_path:
+            return _Route(self.batch_path, self.max_batch_size)
+        endpoint = _build_endpoint(backend_url, CAPABILITIES_PATH)
+        try:
+            response = self._http(client).get(endpoint, timeout=self.timeout)
+            caps = response.json() if response.status_code < 400 else {}
+        except (requests.RequestException, ValueError):
+            caps = {}
+        if isinstance(caps, dict) and caps.get("batch"):
+            limit = caps.get("max_batch_size") or self.max_batch_size
+            return _Route(
+                str(caps.get("batch_path") or DEFAULT_BATCH_PATH),
+                max(1, min(int(limit), self.max_batch_size)),
+            )
+        return _Route(None, self.max_batch_size)
+
+    def accepts(
+        self,
+        backend_url: str,
+        backend_path: str,
+        use_messages_payload: bool,
+        *,
+        client: Optional[Client] = None,
+    ) -> bool:
+        """True if calls to this backend/path can be folded into bulk requests."""
+        if self._closed or use_messages_payload or backend_path != DEFAULT_BACKEND_PATH:
+            return False
+        return self._route_for(backend_url, client).batch_path is not None
+
+    def submit(
+        self,
+        backend_url: str,
+        payload: Dict[str, Any],
+        *,
+        client: Optional[Client] = None,
+        timeout: Optional[Tuple[int, int]] = None,
+    ) -> "Future[Any]":
+        """
+        Queue one `/v1/query` payload; the future resolves to its output.
+
+        Args:
+            backend_url: Backend base URL.
+            payload: The single-query payload.
+            client: Client for this call; defaults to the batcher's client.
+            timeout: (connect_timeout, read_timeout) for this call; defaults
+                to the batcher's timeout.
+        """
+        future: "Future[Any]" = Future()
+        route = self._route_for(backend_url, client)
+        connect_timeout, read_timeout = timeout or self.timeout
+        group: _Group = (backend_url, client, (connect_timeout, read_timeout))
+        ready: Optional[List[_Item]] = None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            batch = self._pending.setdefault(group, [])
+            if not batch:
+                self._deadlines[group] = time.monotonic() + self.max_wait
+                self._cond.notify()
+            batch.append((payload, future))
+            if len(batch) >= route.max_batch_size:
+                ready = self._take(group)
+        if ready:
+            self._senders.submit(self._send, group, ready)
+        return future
+
+    def _take(self, group: _Group) -> List[_Item]:
+        self._deadlines.pop(group, None)
+        return self._pending.pop(group, [])
+
+    def _run_timer(self) -> None:
+        while True:
+            due: List[Tuple[_Group, List[_Item]]] = []
+            with self._cond:
+                if self._closed and not self._pending:
+                    return
+                now = time.monotonic()
+                for group, deadline in list(self._deadlines.items()):
+                    if deadline <= now or self._closed:
+                        due.append((group, self._take(group)))
+                if not due:
+                    wait = min(self._deadlines.values(), default=now + 1.0) - now
+                    self._cond.wait(timeout=max(wait, 0.0))
+                    continue
+            for group, batch in due:
+                self._senders.submit(self._send, group, batch)
+
+    def _send(self, group: _Group, batch: List[_Item]) -> None:
+        backend_url, client, timeout = group
+        route = self._route_for(backend_url, client)
+        try:
+            if route.batch_path is None:
+                raise _BatchUnsupported
+            outputs = self._post_batch(
+                self._http(client), backend_url, route.batch_path, [p for p, _ in batch], timeout
+            )
+        except _BatchUnsupported:
+            # The route went away; remember that and degrade to single calls.
+            with self._routes_lock:
+                self._routes[backend_url] = _Route(None, route.max_batch_size)
+            self._send_singles(group, batch)
+            return
+        except Exception as exc:  # noqa: BLE001 - propagated to every caller
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future), item in zip(batch, outputs):
+            try:
+                if isinstance(item, dict) and "error" in item:
+                    raise RuntimeError(f"Backend batch item failed: {item['error']}")
+                future.set_result(_extract_output(item))
+            except Exception as exc:  # noqa: BLE001
+                future.set_exception(exc)
+
+    def _post_batch(
+        self,
+        http: Client,
+        backend_url: str,
+        batch_path: str,
+        payloads: List[Dict[str, Any]],
+        timeout: Tuple[int, int],
+    ) -> List[Any]:
+        endpoint = _build_endpoint(backend_url, batch_path)
+        try:
+            response = http.post(endpoint, {"items": payloads}, timeout=timeout)
+        except requests.RequestException as exc:
+            raise RuntimeError(f"Failed to reach backend at {endpoint}") from exc
+
+        if response.status_code in _UNSUPPORTED_STATUSES:
+            raise _BatchUnsupported
+        if response.status_code >= 400:
+            raise RuntimeError(f"Backend returned {response.status_code}: {response.text}")
+
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise ValueError("Backend response was not valid JSON") from exc
+
+        outputs = data.get("outputs") if isinstance(data, dict) else None
+        if not isinstance(outputs, list) or len(outputs) != len(payloads):
+            raise ValueError("Backend batch response must contain one 'outputs' entry per item")
+        return outputs
+
+    def _send_singles(self, group: _Group, batch: List[_Item]) -> None:
+        backend_url, client, timeout = group
+        endpoint = _build_endpoint(backend_url, DEFAULT_BACKEND_PATH)
+        http = self._http(client)
+
+        def send_one(payload: Dict[str, Any], future: Future) -> None:
+            try:
+                future.set_result(_post_query(http, endpoint, payload, timeout))
+            except Exception as exc:  # noqa: BLE001
+                future.set_exception(exc)
+
+        for payload, future in batch:
+            self._singles.submit(send_one, payload, future)
+
+    def close(self) -> None:
+        """Flush pending items and stop the background threads."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._timer.join()
+        self._senders.shutdown(wait=True)
+        self._singles.shutdown(wait=True)
+
+
+class _BatchUnsupported(Exception):
+    pass
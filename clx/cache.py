@@ -0,0 +1,1071 @@
+"""
+SQLite-backed result cache used by `clx_query`.
+
+The cache is safe to share across threads and processes: every thread gets
+its own connection to a WAL-mode database, and writes can be grouped into
+fewer transactions with `commit_every`. Entries can expire (per entry or per
+namespace), and the file can be capped by entry count or bytes with LRU or
+LFU eviction. Large values can be stored compressed (zlib or zstd) and keys
+as 32-byte BLOBs to keep the file small.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import types
+import weakref
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .keys import KeyPolicy
+
+DEFAULT_CACHE_PATH = Path("~/.clx_cache.db").expanduser()
+_SQLITE_MAX_PARAMS = 500
+_TOUCH_FLUSH_SIZE = 256
+# Requests remembered between `build_key` and the write that stores their entry.
+_RECORD_BUFFER = 4096
+_EVICTION_POLICIES = ("lru", "lfu")
+_SERIALIZERS = ("json", "orjson", "auto")
+_COMPRESSIONS = ("auto", "zlib", "zstd")
+# Compressed values are stored as BLOBs starting with a codec tag; plain values
+# stay JSON TEXT, so files written with any settings remain readable.
+_ZLIB_TAG = b"z"
+_ZSTD_TAG = b"s"
+
+# Columns added after the original (cache_key, value, created_at) schema.
+_MIGRATED_COLUMNS = (
+    ("namespace", "TEXT"),
+    ("expires_at", "REAL"),
+    ("last_access", "REAL"),
+    ("hits", "INTEGER NOT NULL DEFAULT 0"),
+    ("size", "INTEGER"),
+)
+
+# (stored value, namespace, expires_at)
+# (stored value, namespace, expires_at, serialized size in bytes)
+_Row = Tuple[Union[str, bytes], Optional[str], Optional[float], int]
+
+
+class _ThreadConnection:
+    """Holds one thread's connection; collected (and closed) when the thread exits."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+def _close_connection(
+    conn: sqlite3.Connection, connections: "set[sqlite3.Connection]", lock: threading.Lock
+) -> None:
+    with lock:
+        connections.discard(conn)
+    conn.close()
+
+
+def _zstd() -> Any:
+    """Return a module with zstd `compress`/`decompress`, or None if unavailable."""
+    try:
+        from compression import zstd  # type: ignore  # Python 3.14+
+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        # Lazily import to avoid hard dependency
+        import zstandard  # type: ignore
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _orjson() -> Any:
+    try:
+        # Lazily import to avoid hard dependency
+        import orjson  # type: ignore
+    except ImportError:
+        return None
+    return orjson
+
+
+def _blob_key(cache_key: str) -> bytes:
+    try:
+        return bytes.fromhex(cache_key)
+    except ValueError:
+        return cache_key.encode("utf-8")
+
+
+def _text_keys(db_key: Union[str, bytes]) -> Tuple[str, ...]:
+    """Keys that may have been stored as `db_key` (inverse of `_blob_key`)."""
+    if isinstance(db_key, str):
+        return (db_key,)
+    return (db_key.hex(), db_key.decode("utf-8", "replace"))
+
+
+class _Codec:
+    """Converts values to the stored column value (JSON text or a compressed BLOB) and back."""
+
+    def __init__(
+        self,
+        serializer: str,
+        compression: str,
+        threshold: Optional[int],
+        level: Optional[int],
+    ):
+        orjson = _orjson() if serializer != "json" else None
+        if serializer == "orjson" and orjson is None:
+            raise ImportError("serializer='orjson' requires orjson: pip install clx-cli[fast]")
+        self._dumps: Callable[[Any], str] = self._json_dumps
+        self._loads: Callable[[Union[str, bytes]], Any] = json.loads
+        if orjson is not None:
+            self._orjson = orjson
+            self._dumps = self._orjson_dumps
+            self._loads = orjson.loads
+
+        self.threshold = threshold
+        self._compress: Optional[Callable[[bytes], bytes]] = None
+        if threshold is not None:
+            zstd = _zstd() if compression != "zlib" else None
+            if compression == "zstd" and zstd is None:
+                raise ImportError(
+                    "compression='zstd' requires zstandard: pip install clx-cli[fast]"
+                )
+            if zstd is not None:
+                zstd_level = 3 if level is None else level
+                self._compress = lambda data: _ZSTD_TAG + zstd.compress(data, zstd_level)
+            else:
+                zlib_level = 6 if level is None else level
+                self._compress = lambda data: _ZLIB_TAG + zlib.compress(data, zlib_level)
+
+    @staticmethod
+    def _json_dumps(value: Any) -> str:
+        try:
+            return json.dumps(value)
+        except TypeError:
+            return json.dumps(str(value))
+
+    def _orjson_dumps(self, value: Any) -> str:
+        orjson = self._orjson
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            return orjson.dumps(str(value)).decode("utf-8")
+
+    def encode(self, value: Any) -> Tuple[Union[str, bytes], int]:
+        """Return (stored value, serialized size in bytes)."""
+        text = self._dumps(value)
+        data = None
+        if text.isascii():
+            size = len(text)
+        else:
+            data = text.encode("utf-8")
+            size = len(data)
+        if self._compress is None or size < self.threshold:  # type: ignore[operator]
+            return text, size
+        compressed = self._compress(data or text.encode("utf-8"))
+        if len(compressed) >= size:
+            return text, size
+        return compressed, size
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        if isinstance(raw, bytes):
+            tag = raw[:1]
+            if tag == _ZLIB_TAG:
+                raw = zlib.decompress(raw[1:])
+            elif tag == _ZSTD_TAG:
+                zstd = _zstd()
+                if zstd is None:
+                    raise RuntimeError(
+                        "Cache entry is zstd-compressed; install zstandard: "
+                        "pip install clx-cli[fast]"
+                    )
+                raw = zstd.decompress(raw[1:])
+        try:
+            return self._loads(raw)
+        except Exception:
+            return raw.decode("utf-8", "replace") if isinstance(raw, bytes) else raw
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU map bounded by entry count and/or approximate bytes.
+
+    Values are stored as-is (not copied), so callers must not mutate what
+    they get back.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Ship the bounds only; each process starts with an empty map.
+        return {"max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Any, value: Any, size: int = 0) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def discard(self, key: Any) -> None:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._bytes -= item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+class _KeyMethod:
+    """
+    Makes `build_key` callable on an instance (applying its key policy) and,
+    as it was before key policies, on the class itself with the default policy.
+    """
+
+    def __init__(self, func: Callable[..., str]):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Callable[..., str]:
+        # On the class, the class attributes stand in for an instance: no policy, no recording.
+        return types.MethodType(self.func, instance if instance is not None else owner)
+
+
+@dataclass
+class CacheEntry:
+    """A cached value plus whether it is past its TTL but still servable."""
+
+    value: Any
+    stale: bool = False
+
+
+class CacheBackend:
+    """
+    Interface of the result stores accepted as `cache=` by `clx_query` and friends.
+
+    Implementations provide `get_many`, `set_many` and `delete`; the other
+    methods have working defaults built on them (no stale entries, no
+    cross-process leases). `Cache` stores results in a local SQLite file and
+    is the default; `clx.cache_server.RemoteCache` shares one store between
+    processes and hosts through a cache daemon.
+    """
+
+    enabled = True
+    key_policy: Optional["KeyPolicy"] = None
+    record_requests = False
+
+    @_KeyMethod
+    def build_key(
+        self,
+        backend_url: str,
+        backend_path: str,
+        model: str,
+        prompt: str,
+        params: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]],
+        use_messages_payload: bool,
+    ) -> str:
+        request = {
+            "backend_url": backend_url,
+            "backend_path": backend_path,
+            "model": model,
+            "prompt": prompt,
+            "params": params,
+            "metadata": metadata or {},
+            "use_messages_payload": use_messages_payload,
+        }
+        keyed = self.key_policy.apply(request) if self.key_policy is not None else request
+        canonical = json.dumps(keyed, sort_keys=True)
+        cache_key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        if self.record_requests:
+            # The raw request is kept, so reports can re-key it under any policy.
+            raw = canonical if keyed is request else json.dumps(request, sort_keys=True)
+            self._record_request(cache_key, raw)
+        return cache_key
+
+    def _record_request(self, cache_key: str, request: str) -> None:
+        pass
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Any]:
+        """Return a mapping of the requested keys that are present and fresh."""
+        raise NotImplementedError
+
+    def set_many(
+        self,
+        items: Dict[str, Any],
+        *,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """Store several values. `ttl` overrides the namespace/default lifetime."""
+        raise NotImplementedError
+
+    def delete(self, cache_key: str) -> None:
+        raise NotImplementedError
+
+    def get(self, cache_key: str) -> Optional[Any]:
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """Like `get`, but also returns entries inside the stale window, flagged as stale."""
+        value = self.get(cache_key)
+        return None if value is None else CacheEntry(value)
+
+    def set(
+        self,
+        cache_key: str,
+        value: Any,
+        *,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        self.set_many({cache_key: value}, ttl=ttl, namespace=namespace)
+
+    def acquire_lease(self, cache_key: str) -> bool:
+        """Claim the right to compute `cache_key`; True when leases are not supported."""
+        return True
+
+    def release_lease(self, cache_key: str) -> None:
+        pass
+
+    def wait_for(self, cache_key: str) -> Optional[Any]:
+        """Wait for a value computed under another owner's lease; None to compute it here."""
+        return None
+
+    def flush(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "CacheBackend":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class Cache(CacheBackend):
+    """
+    Optional SQLite-backed cache keyed by backend URL, model, prompt, params, and routing.
+
+    Disabled unless explicitly passed into `clx_query`.
+
+    Args:
+        path: SQLite file location.
+        enabled: Set to False to turn every operation into a no-op.
+        commit_every: Buffer up to this many `set` calls and write them in one
+            transaction. Buffered values are visible to `get` immediately and
+            are written on `flush`/`close`. The default of 1 commits each write.
+        flush_interval: Also flush buffered writes once the oldest one is this
+            many seconds old (checked on the next `set`).
+        busy_timeout: Seconds a connection waits for a lock held by another
+            writer before raising.
+        ttl: Default lifetime in seconds for new entries. None keeps them forever.
+        namespace_ttls: Per-namespace lifetimes overriding `ttl`. `clx_query`
+            stores entries under the model name.
+        stale_ttl: Seconds past expiry during which an entry is still served
+            (flagged stale) while `clx_query` refreshes it in the background.
+        max_entries: Evict entries once the table holds more than this many.
+        max_bytes: Evict entries once stored values exceed this many bytes.
+        eviction: "lru" (least recently read) or "lfu" (fewest hits) order
+            used when a cap is exceeded.
+        prune_every: Check caps after this many written rows.
+        memory_entries: Size of an in-process LRU tier in front of SQLite.
+            Reads go through it and writes go to both tiers, so hot keys are
+            served without disk I/O or JSON decoding. 0 disables the tier.
+        memory_bytes: Optional byte bound (of serialized values) for the
+            in-process tier.
+        lease_ttl: Enable cross-process request coalescing. Before calling the
+            backend on a miss, `clx_query` takes a lease on the key in this
+            file; other processes wait for the result instead of issuing the
+            same request. A lease older than this many seconds is ignored.
+        lease_poll_interval: Seconds between cache checks while waiting on
+            another process's lease.
+        compress_threshold: Compress serialized values of at least this many
+            bytes. None (the default) stores everything as JSON text.
+        compression: "zstd", "zlib", or "auto" (zstd when `zstandard` is
+            installed, else zlib). Entries record their codec, so files mixing
+            codecs, or written without compression, stay readable.
+        compression_level: Codec level; defaults to 3 for zstd and 6 for zlib.
+        serializer: "json", "orjson" (faster; requires `orjson`) or "auto"
+            (orjson when installed). Both store the same JSON.
+        binary_keys: Store keys as 32-byte BLOBs instead of 64-character hex
+            text. Use it for new files: entries written with text keys are not
+            found under binary keys and vice versa.
+        key_policy: `KeyPolicy` (or a mapping of its settings) normalizing
+            requests before they are hashed, so equivalent requests share an
+            entry. Changing it changes keys: existing entries are not found.
+        record_requests: Store the request behind each new entry and count
+            hits per entry, so `python -m clx keys` can report how a key
+            policy would change the hit rate.
+    """
+
+    _CONFIG_FIELDS = (
+        "path",
+        "enabled",
+        "commit_every",
+        "flush_interval",
+        "busy_timeout",
+        "ttl",
+        "namespace_ttls",
+        "stale_ttl",
+        "max_entries",
+        "max_bytes",
+        "eviction",
+        "prune_every",
+        "memory_entries",
+        "memory_bytes",
+        "lease_ttl",
+        "lease_poll_interval",
+        "compress_threshold",
+        "compression",
+        "compression_level",
+        "serializer",
+        "binary_keys",
+        "key_policy",
+        "record_requests",
+    )
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CACHE_PATH,
+        enabled: bool = True,
+        *,
+        commit_every: int = 1,
+        flush_interval: float = 1.0,
+        busy_timeout: float = 30.0,
+        ttl: Optional[float] = None,
+        namespace_ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        eviction: str = "lru",
+        prune_every: int = 1000,
+        memory_entries: int = 0,
+        memory_bytes: Optional[int] = None,
+        lease_ttl: Optional[float] = None,
+        lease_poll_interval: float = 0.05,
+        compress_threshold: Optional[int] = None,
+        compression: str = "auto",
+        compression_level: Optional[int] = None,
+        serializer: str = "json",
+        binary_keys: bool = False,
+        key_policy: Optional[Union["KeyPolicy", Dict[str, Any]]] = None,
+        record_requests: bool = False,
+    ):
+        if commit_every < 1:
+            raise ValueError("commit_every must be at least 1")
+        if eviction not in _EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {', '.join(_EVICTION_POLICIES)}")
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"compression must be one of {', '.join(_COMPRESSIONS)}")
+        if serializer not in _SERIALIZERS:
+            raise ValueError(f"serializer must be one of {', '.join(_SERIALIZERS)}")
+        self.path = Path(path).expanduser()
+        self.enabled = enabled
+        self.commit_every = commit_every
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self.ttl = ttl
+        self.namespace_ttls = dict(namespace_ttls or {})
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.prune_every = prune_every
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.lease_ttl = lease_ttl
+        self.lease_poll_interval = lease_poll_interval
+        self.compress_threshold = compress_threshold
+        self.compression = compression
+        self.compression_level = compression_level
+        self.serializer = serializer
+        self.binary_keys = binary_keys
+        if key_policy is not None:
+            from .keys import KeyPolicy
+
+            key_policy = KeyPolicy.coerce(key_policy)
+        self.key_policy: Optional["KeyPolicy"] = key_policy
+        self.record_requests = record_requests
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: "set[sqlite3.Connection]" = set()
+        self._pid = os.getpid()
+        self._schema_ready = False
+        self._pending: Dict[str, _Row] = {}
+        self._pending_since = 0.0
+        self._touches: Dict[str, int] = {}
+        self._requests: "OrderedDict[str, str]" = OrderedDict()
+        self._written_since_prune = 0
+        self._memory: Optional[LRUCache] = None
+        if self.memory_entries or self.memory_bytes:
+            self._memory = LRUCache(self.memory_entries or None, self.memory_bytes)
+        self._counters = dict.fromkeys(
+            ("memory_hits", "memory_misses", "sqlite_hits", "sqlite_misses"), 0
+        )
+        self._codec = _Codec(
+            self.serializer, self.compression, self.compress_threshold, self.compression_level
+        )
+        self._db_key: Callable[[str], Union[str, bytes]] = (
+            _blob_key if self.binary_keys else str
+        )
+
+    def __enter__(self) -> "Cache":
+        return self
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Connections are process-local; the unpickled copy (e.g. on a Spark
+        # executor) reopens the same path lazily.
+        return {name: getattr(self, name) for name in self._CONFIG_FIELDS}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def _tracks_access(self) -> bool:
+        return self.max_entries is not None or self.max_bytes is not None or self.record_requests
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self.enabled:
+            raise RuntimeError("Cache is disabled")
+
+        if self._pid != os.getpid():
+            # Connections must not cross a fork; start over in the child.
+            self._init_state()
+
+        holder: Optional[_ThreadConnection] = getattr(self._local, "holder", None)
+        if holder is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+                self._connections.add(conn)
+            holder = self._local.holder = _ThreadConnection(conn)
+            # The thread-local drops the holder when the thread exits; close the
+            # connection then instead of keeping it (and its file handles) until
+            # `close()`. The finalizer must not reference `self`.
+            weakref.finalize(holder, _close_connection, conn, self._connections, self._lock)
+        return holder.conn
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        for column, declaration in _MIGRATED_COLUMNS:
+            if column not in existing:
+                try:
+                    conn.execute(f"ALTER TABLE cache ADD COLUMN {column} {declaration}")
+                except sqlite3.OperationalError:
+                    pass  # another process migrated the table first
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        if self.record_requests:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_requests "
+                "(cache_key TEXT PRIMARY KEY, request TEXT NOT NULL)"
+            )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                cache_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+
+    def _record_request(self, cache_key: str, request: str) -> None:
+        with self._lock:
+            self._requests[cache_key] = request
+            if len(self._requests) > _RECORD_BUFFER:
+                self._requests.popitem(last=False)
+
+    def _expires_at(self, ttl: Optional[float], namespace: Optional[str]) -> Optional[float]:
+        if ttl is None and namespace is not None:
+            ttl = self.namespace_ttls.get(namespace)
+        if ttl is None:
+            ttl = self.ttl
+        return None if ttl is None else time.time() + ttl
+
+    def _freshness(self, expires_at: Optional[float], now: float) -> Optional[bool]:
+        """None if unusable, False if fresh, True if stale but inside `stale_ttl`."""
+        if expires_at is None or now < expires_at:
+            return False
+        if self.stale_ttl is not None and now < expires_at + self.stale_ttl:
+            return True
+        return None
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        if amount:
+            with self._lock:
+                self._counters[counter] += amount
+
+    def _remember(self, cache_key: str, value: Any, size: int, expires_at: Optional[float]) -> None:
+        if self._memory is not None:
+            self._memory.put(cache_key, (value, expires_at), size)
+
+    def _from_memory(self, cache_key: str, now: float) -> Optional[CacheEntry]:
+        if self._memory is None:
+            return None
+        item = self._memory.get(cache_key)
+        if item is not None:
+            stale = self._freshness(item[1], now)
+            if stale is not None:
+                self._count("memory_hits")
+                return CacheEntry(item[0], stale=stale)
+            self._memory.discard(cache_key)
+        self._count("memory_misses")
+        return None
+
+    def _touch(self, cache_keys: Iterable[str]) -> None:
+        if not self._tracks_access:
+            return
+        with self._lock:
+            for cache_key in cache_keys:
+                self._touches[cache_key] = self._touches.get(cache_key, 0) + 1
+            due = len(self._touches) >= _TOUCH_FLUSH_SIZE
+        if due:
+            self._flush_touches()
+
+    def _flush_touches(self) -> None:
+        with self._lock:
+            touches = self._touches
+            self._touches = {}
+        if touches:
+            now = time.time()
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "UPDATE cache SET last_access = ?, hits = hits + ? WHERE cache_key = ?",
+                    [(now, count, self._db_key(key)) for key, count in touches.items()],
+                )
+
+    def get_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """Like `get`, but also returns entries inside the stale window, flagged as stale."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        entry = self._from_memory(cache_key, now)
+        if entry is not None:
+            self._touch((cache_key,))
+            return entry
+
+        pending = self._pending.get(cache_key)
+        if pending is not None:
+            stale = self._freshness(pending[2], now)
+            if stale is None:
+                return None
+            return CacheEntry(self._codec.decode(pending[0]), stale=stale)
+
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at, COALESCE(size, LENGTH(value)) FROM cache "
+            "WHERE cache_key = ?",
+            (self._db_key(cache_key),),
+        ).fetchone()
+        stale = None if not row else self._freshness(row[1], now)
+        if stale is None:
+            self._count("sqlite_misses")
+            return None
+        self._count("sqlite_hits")
+        value = self._codec.decode(row[0])
+        self._remember(cache_key, value, row[2], row[1])
+        self._touch((cache_key,))
+        return CacheEntry(value, stale=stale)
+
+    def get(self, cache_key: str) -> Optional[Any]:
+        entry = self.get_entry(cache_key)
+        if entry is None or entry.stale:
+            return None
+        return entry.value
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Any]:
+        """Return a mapping of the requested keys that are present and fresh."""
+        if not self.enabled:
+            return {}
+
+        now = time.time()
+        found: Dict[str, Any] = {}
+        keys: List[str] = []
+        memory_hits: List[str] = []
+        for cache_key in cache_keys:
+            entry = self._from_memory(cache_key, now)
+            if entry is not None:
+                if not entry.stale:
+                    found[cache_key] = entry.value
+                    memory_hits.append(cache_key)
+                continue
+            pending = self._pending.get(cache_key)
+            if pending is not None:
+                if self._freshness(pending[2], now) is False:
+                    found[cache_key] = self._codec.decode(pending[0])
+            else:
+                keys.append(cache_key)
+        self._touch(memory_hits)
+
+        conn = self._connect()
+        hits: List[str] = []
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            chunk = {self._db_key(key): key for key in keys[start : start + _SQLITE_MAX_PARAMS]}
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                "SELECT cache_key, value, expires_at, COALESCE(size, LENGTH(value)) "
+                f"FROM cache WHERE cache_key IN ({placeholders})",
+                list(chunk),
+            ).fetchall()
+            for db_key, raw, expires_at, size in rows:
+                if self._freshness(expires_at, now) is False:
+                    cache_key = chunk[db_key]
+                    value = self._codec.decode(raw)
+                    found[cache_key] = value
+                    hits.append(cache_key)
+                    self._remember(cache_key, value, size, expires_at)
+        self._count("sqlite_hits", len(hits))
+        self._count("sqlite_misses", len(keys) - len(hits))
+        self._touch(hits)
+        return found
+
+    def set(
+        self,
+        cache_key: str,
+        value: Any,
+        *,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """Store `value`. `ttl` overrides the namespace/default lifetime."""
+        if not self.enabled:
+            return
+
+        raw, size = self._codec.encode(value)
+        row: _Row = (raw, namespace, self._expires_at(ttl, namespace), size)
+        self._remember(cache_key, value, size, row[2])
+        if self.commit_every == 1:
+            self._write({cache_key: row})
+            return
+
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending[cache_key] = row
+            due = (
+                len(self._pending) >= self.commit_every
+                or time.monotonic() - self._pending_since >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def set_many(
+        self,
+        items: Dict[str, Any],
+        *,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """Store several values in a single transaction."""
+        if not self.enabled or not items:
+            return
+
+        expires_at = self._expires_at(ttl, namespace)
+        rows: Dict[str, _Row] = {}
+        for cache_key, value in items.items():
+            raw, size = self._codec.encode(value)
+            self._remember(cache_key, value, size, expires_at)
+            rows[cache_key] = (raw, namespace, expires_at, size)
+        self._write(rows)
+
+    def _write(self, rows: Dict[str, _Row]) -> None:
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO cache
+                    (cache_key, value, namespace, expires_at, last_access, hits, size)
+                VALUES (?, ?, ?, ?, ?, 0, ?)
+                """,
+                [
+                    (self._db_key(cache_key), raw, namespace, expires_at, now, size)
+                    for cache_key, (raw, namespace, expires_at, size) in rows.items()
+                ],
+            )
+            if self.record_requests:
+                with self._lock:
+                    requests = [
+                        (self._db_key(cache_key), self._requests.pop(cache_key))
+                        for cache_key in rows
+                        if cache_key in self._requests
+                    ]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cache_requests (cache_key, request) VALUES (?, ?)",
+                    requests,
+                )
+        with self._lock:
+            self._written_since_prune += len(rows)
+            due = self._tracks_access and self._written_since_prune >= self.prune_every
+        if due:
+            self.prune(expired=False)
+
+    def flush(self) -> None:
+        """Write any buffered `set` calls and access statistics."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if pending:
+            try:
+                self._write(pending)
+            except Exception:
+                # Keep the values buffered so a later flush can retry them.
+                with self._lock:
+                    for cache_key, row in pending.items():
+                        self._pending.setdefault(cache_key, row)
+                raise
+        self._flush_touches()
+
+    def delete(self, cache_key: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending.pop(cache_key, None)
+        if self._memory is not None:
+            self._memory.discard(cache_key)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE cache_key = ?", (self._db_key(cache_key),))
+            if self.record_requests:
+                conn.execute(
+                    "DELETE FROM cache_requests WHERE cache_key = ?", (self._db_key(cache_key),)
+                )
+
+    def prune(self, *, expired: bool = True) -> int:
+        """
+        Drop expired entries (past their stale window) and evict down to
+        `max_entries`/`max_bytes`. Returns the number of rows removed.
+        """
+        if not self.enabled:
+            return 0
+
+        with self._lock:
+            self._written_since_prune = 0
+        self.flush()
+        conn = self._connect()
+        removed = 0
+        order = (
+            "COALESCE(last_access, 0)"
+            if self.eviction == "lru"
+            else "hits, COALESCE(last_access, 0)"
+        )
+        with conn:
+            if expired:
+                cutoff = time.time() - (self.stale_ttl or 0)
+                removed += conn.execute(
+                    "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+                    (cutoff,),
+                ).rowcount
+
+            evicted: List[Tuple[Union[str, bytes]]] = []
+            if self.max_entries is not None:
+                (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+                excess = count - self.max_entries
+                if excess > 0:
+                    oldest = conn.execute(
+                        f"SELECT cache_key FROM cache ORDER BY {order} LIMIT ?", (excess,)
+                    ).fetchall()
+                    conn.executemany("DELETE FROM cache WHERE cache_key = ?", oldest)
+                    removed += len(oldest)
+                    evicted.extend(oldest)
+
+            if self.max_bytes is not None:
+                (total,) = conn.execute(
+                    "SELECT COALESCE(SUM(COALESCE(size, LENGTH(value))), 0) FROM cache"
+                ).fetchone()
+                excess = total - self.max_bytes
+                if excess > 0:
+                    victims: List[Tuple[Union[str, bytes]]] = []
+                    cursor = conn.execute(
+                        "SELECT cache_key, COALESCE(size, LENGTH(value)) FROM cache "
+                        f"ORDER BY {order}"
+                    )
+                    for cache_key, size in cursor:
+                        if excess <= 0:
+                            break
+                        victims.append((cache_key,))
+                        excess -= size
+                    cursor.close()
+                    conn.executemany("DELETE FROM cache WHERE cache_key = ?", victims)
+                    removed += len(victims)
+                    evicted.extend(victims)
+
+            if removed and self.record_requests:
+                conn.execute(
+                    "DELETE FROM cache_requests "
+                    "WHERE cache_key NOT IN (SELECT cache_key FROM cache)"
+                )
+        # Evicted entries must not outlive the cap in the memory tier. Expired
+        # ones are already rejected there by their expiry time.
+        if self._memory is not None:
+            for (db_key,) in evicted:
+                for cache_key in _text_keys(db_key):
+                    self._memory.discard(cache_key)
+        return removed
+
+    def vacuum(self) -> int:
+        """Prune, then compact the database file and truncate the WAL."""
+        if not self.enabled:
+            return 0
+        removed = self.prune()
+        conn = self._connect()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def _lease_owner(self) -> str:
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def acquire_lease(self, cache_key: str) -> bool:
+        """
+        Try to claim the right to compute `cache_key` across processes.
+
+        Returns True when leases are disabled or the lease was taken, False
+        when another live owner holds it.
+        """
+        if not self.enabled or self.lease_ttl is None:
+            return True
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM leases WHERE cache_key = ? AND expires_at < ?", (cache_key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO leases (cache_key, owner, expires_at) VALUES (?, ?, ?)",
+                (cache_key, self._lease_owner(), now + self.lease_ttl),
+            )
+        return cursor.rowcount == 1
+
+    def release_lease(self, cache_key: str) -> None:
+        """Publish buffered writes and drop this owner's lease on `cache_key`."""
+        if not self.enabled or self.lease_ttl is None:
+            return
+        self.flush()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM leases WHERE cache_key = ? AND owner = ?",
+                (cache_key, self._lease_owner()),
+            )
+
+    def wait_for(self, cache_key: str) -> Optional[Any]:
+        """
+        Poll for a value another process is computing under a lease.
+
+        Returns the value, or None once the lease is gone or has expired
+        without a value being stored (the caller should then compute it).
+        """
+        if not self.enabled or self.lease_ttl is None:
+            return None
+        conn = self._connect()
+        while True:
+            value = self.get(cache_key)
+            if value is not None:
+                return value
+            row = conn.execute(
+                "SELECT expires_at FROM leases WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None or row[0] < time.time():
+                return self.get(cache_key)
+            time.sleep(self.lease_poll_interval)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per tier since this Cache was created."""
+        with self._lock:
+            counters = dict(self._counters)
+        memory = self._memory
+        return {
+            "memory": {
+                "hits": counters["memory_hits"],
+                "misses": counters["memory_misses"],
+                "entries": len(memory) if memory is not None else 0,
+                "bytes": memory.nbytes if memory is not None else 0,
+            },
+            "sqlite": {
+                "hits": counters["sqlite_hits"],
+                "misses": counters["sqlite_misses"],
+            },
+        }
+
+    def close(self) -> None:
+        if self.enabled and self._pid == os.getpid():
+            self.flush()
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = set()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
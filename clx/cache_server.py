@@ -0,0 +1,498 @@
+"""
+Shared cache daemon and its client.
+
+Every worker that opens its own `~/.clx_cache.db` only reuses its own results,
+and SQLite files on network filesystems lock or corrupt. Instead, run one
+cache daemon per host (or per cluster) as a sidecar: it owns a local SQLite
+`Cache` with an in-memory tier and serves it over a socket. Workers pass a
+`RemoteCache` wherever a `Cache` is accepted:
+
+    python -m clx cache-server --listen tcp://0.0.0.0:7480 --cache /var/lib/clx/cache.db
+
+    cache = RemoteCache("tcp://cache-host:7480")
+    clx_query("meta-llama3", prompt, cache=cache)
+
+Requests for the same key are coalesced across all workers through leases
+held by the daemon.
+
+Protocol: each message is a 4-byte big-endian length followed by a UTF-8
+JSON object. Requests are {"op": ..., "token": ..., ...}; responses are
+{"ok": true, ...} or {"ok": false, "error": "..."}.
+
+    ping                                  -> {}
+    get_many       keys                   -> {"values": {key: value}}
+    get_entry      key                    -> {"value": value or null, "stale": bool}
+    set_many       items, ttl, namespace  -> {}
+    delete         key                    -> {}
+    acquire_lease  key, owner             -> {"acquired": bool}
+    release_lease  key, owner             -> {}
+    wait_for       key, timeout           -> {"value": value or null}
+    stats                                 -> {"stats": {...}}
+
+There is no encryption; a shared `token` (or `CLX_CACHE_TOKEN`) guards
+against stray clients. Keep TCP listeners on a private network.
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .cache import Cache, CacheBackend, CacheEntry
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .keys import KeyPolicy
+
+DEFAULT_ADDRESS = "tcp://127.0.0.1:7480"
+REMOTE_SCHEMES = ("tcp://", "unix://")
+# `RemoteCache` keyword arguments; other `[cache]` settings configure the daemon.
+REMOTE_OPTIONS = ("enabled", "timeout", "token", "key_policy", "ttl", "fail_open", "wait_timeout")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+def is_remote_address(target: Any) -> bool:
+    """True for `tcp://host:port` and `unix:///path` cache addresses."""
+    return isinstance(target, str) and target.startswith(REMOTE_SCHEMES)
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """Split a cache address into (socket family, socket address)."""
+    if address.startswith("unix://"):
+        return socket.AF_UNIX, address[len("unix://") :]
+    host, sep, port = address[len("tcp://") :].rpartition(":")
+    if not address.startswith("tcp://") or not sep or not port.isdigit():
+        raise ValueError(f"Invalid cache address {address!r}; use tcp://host:port or unix:///path")
+    return socket.AF_INET6 if ":" in host else socket.AF_INET, (host.strip("[]"), int(port))
+
+
+def _send(sock: socket.socket, message: Dict[str, Any]) -> None:
+    data = json.dumps(message, default=str).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock: socket.socket) -> Dict[str, Any]:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_MESSAGE_BYTES:
+        raise ConnectionError(f"message of {size} bytes exceeds the limit")
+    return json.loads(_recv_exact(sock, size))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        sock: socket.socket = self.request
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        owner = self.server.owner
+        while True:
+            try:
+                request = _recv(sock)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                response = {"ok": True, **owner.handle(request)}
+            except Exception as exc:  # noqa: BLE001 - reported to the client
+                response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            try:
+                _send(sock, response)
+            except OSError:
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    owner: "CacheServer"
+
+
+class _Server6(_Server):
+    address_family = socket.AF_INET6
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    owner: "CacheServer"
+
+
+class CacheServer:
+    """
+    Cache daemon serving one `Cache` to many processes over a socket.
+
+    Args:
+        address: `tcp://host:port` (port 0 picks a free one) or `unix:///path`.
+        cache: Store to serve. Defaults to `~/.clx_cache.db` with a 100k-entry
+            memory tier.
+        lease_ttl: Seconds a worker's lease on a key is honoured; other
+            workers asking for the key wait for its result meanwhile.
+        token: Shared secret clients must send. Defaults to `CLX_CACHE_TOKEN`.
+        workers: Threads that access the cache. Each client connection has a
+            handler thread, but only these threads touch the cache, so the
+            number of open SQLite connections stays fixed however many
+            clients come and go.
+    """
+
+    def __init__(
+        self,
+        address: str = DEFAULT_ADDRESS,
+        *,
+        cache: Optional[Cache] = None,
+        lease_ttl: float = 30.0,
+        token: Optional[str] = None,
+        workers: int = 8,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.cache = cache if cache is not None else Cache(memory_entries=100_000)
+        self.lease_ttl = lease_ttl
+        self.token = token if token is not None else os.environ.get("CLX_CACHE_TOKEN")
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._changed = threading.Condition()
+        self._counters = dict.fromkeys(("requests", "errors", "lease_waits"), 0)
+        self._counters_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._io = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clx-cache-io")
+
+        family, bind = parse_address(address)
+        if family == socket.AF_UNIX:
+            path = Path(str(bind))
+            if path.exists():
+                path.unlink()  # stale socket from a previous run
+            self._server: socketserver.BaseServer = _UnixServer(str(bind), _Handler)
+            self.address = address
+        else:
+            server_class = _Server6 if family == socket.AF_INET6 else _Server
+            self._server = server_class(bind, _Handler)  # type: ignore[arg-type]
+            host, port = self._server.server_address[:2]  # type: ignore[misc]
+            host = f"[{host}]" if family == socket.AF_INET6 else host
+            self.address = f"tcp://{host}:{port}"
+        self._server.owner = self  # type: ignore[attr-defined]
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self._on_cache(self.cache.flush)
+
+    def start(self) -> "CacheServer":
+        """Serve on a background thread (for embedding and tests)."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="clx-cache-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._on_cache(self.cache.close)
+        self._io.shutdown()
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one protocol request and return the response fields."""
+        self._count("requests")
+        if self.token and not hmac.compare_digest(str(request.get("token") or ""), self.token):
+            self._count("errors")
+            raise PermissionError("invalid cache server token")
+        op = request.get("op")
+        cache = self.cache
+        call = self._on_cache
+        if op == "get_many":
+            return {"values": call(cache.get_many, request["keys"])}
+        if op == "get_entry":
+            entry = call(cache.get_entry, request["key"])
+            return {"value": entry.value if entry else None, "stale": bool(entry and entry.stale)}
+        if op == "set_many":
+            call(
+                cache.set_many,
+                request["items"],
+                ttl=request.get("ttl"),
+                namespace=request.get("namespace"),
+            )
+            with self._changed:
+                self._changed.notify_all()
+            return {}
+        if op == "delete":
+            call(cache.delete, request["key"])
+            return {}
+        if op == "acquire_lease":
+            return {"acquired": self._acquire(request["key"], str(request["owner"]))}
+        if op == "release_lease":
+            self._release(request["key"], str(request["owner"]))
+            return {}
+        if op == "wait_for":
+            return {"value": self._wait_for(request["key"], float(request.get("timeout") or 60))}
+        if op == "stats":
+            with self._changed:
+                leases = len(self._leases)
+            with self._counters_lock:
+                server = {**self._counters, "leases": leases}
+            return {"stats": {"server": server, **call(cache.stats)}}
+        if op == "ping":
+            return {}
+        raise ValueError(f"unknown op {op!r}")
+
+    def _on_cache(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a cache call on one of the fixed I/O workers and wait for it."""
+        return self._io.submit(fn, *args, **kwargs).result()
+
+    def _count(self, counter: str) -> None:
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def _acquire(self, key: str, owner: str) -> bool:
+        now = time.monotonic()
+        with self._changed:
+            held = self._leases.get(key)
+            if held is not None and held[0] != owner and held[1] > now:
+                return False
+            self._leases[key] = (owner, now + self.lease_ttl)
+            if len(self._leases) > 10_000:
+                self._leases = {k: v for k, v in self._leases.items() if v[1] > now}
+            return True
+
+    def _release(self, key: str, owner: str) -> None:
+        with self._changed:
+            held = self._leases.get(key)
+            if held is not None and held[0] == owner:
+                del self._leases[key]
+            self._changed.notify_all()
+
+    def _wait_for(self, key: str, timeout: float) -> Optional[Any]:
+        self._count("lease_waits")
+        deadline = time.monotonic() + timeout
+        while True:
+            value = self._on_cache(self.cache.get, key)
+            if value is not None:
+                return value
+            with self._changed:
+                held = self._leases.get(key)
+                now = time.monotonic()
+                if held is None or held[1] <= now or now >= deadline:
+                    break
+                # Woken by set_many/release; the timeout bounds a missed notification.
+                self._changed.wait(min(0.25, held[1] - now, deadline - now))
+        return self._on_cache(self.cache.get, key)
+
+
+class RemoteCache(CacheBackend):
+    """
+    `CacheBackend` talking to a `CacheServer`; use it wherever a `Cache` is accepted.
+
+    Each thread keeps one persistent connection. It is picklable (e.g. for
+    Spark executors) and reconnects after a fork.
+
+    Args:
+        address: `tcp://host:port` or `unix:///path` of the daemon.
+        enabled: Set to False to turn every operation into a no-op.
+        timeout: Socket timeout in seconds for each request.
+        token: Shared secret; defaults to `CLX_CACHE_TOKEN`.
+        key_policy: `KeyPolicy` (or mapping) applied when building keys.
+        ttl: Default lifetime in seconds for entries written by this client.
+        fail_open: If the daemon is unreachable or errors, treat reads as
+            misses and drop writes (counted in `stats()["client"]`) instead of
+            raising `RuntimeError`.
+        wait_timeout: Longest wait, in seconds, for a key another worker is
+            computing.
+    """
+
+    def __init__(
+        self,
+        address: str = DEFAULT_ADDRESS,
+        enabled: bool = True,
+        *,
+        timeout: float = 5.0,
+        token: Optional[str] = None,
+        key_policy: Optional[Union["KeyPolicy", Dict[str, Any]]] = None,
+        ttl: Optional[float] = None,
+        fail_open: bool = True,
+        wait_timeout: float = 60.0,
+    ):
+        parse_address(address)  # validate early
+        if key_policy is not None:
+            from .keys import KeyPolicy
+
+            key_policy = KeyPolicy.coerce(key_policy)
+        self.address = address
+        self.enabled = enabled
+        self.timeout = timeout
+        self.token = token if token is not None else os.environ.get("CLX_CACHE_TOKEN")
+        self.key_policy = key_policy  # type: ignore[assignment]
+        self.ttl = ttl
+        self.fail_open = fail_open
+        self.wait_timeout = wait_timeout
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sockets: List[socket.socket] = []
+        self._pid = os.getpid()
+        self._errors = 0
+        self._owner = f"{socket.gethostname()}:{self._pid}"
+
+    _CONFIG_FIELDS = ("address", *REMOTE_OPTIONS)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sockets are process-local; the unpickled copy reconnects lazily.
+        return {name: getattr(self, name) for name in self._CONFIG_FIELDS}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _socket(self) -> socket.socket:
+        if self._pid != os.getpid():
+            self._init_state()  # connections must not cross a fork
+        sock: Optional[socket.socket] = getattr(self._local, "sock", None)
+        if sock is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+            if family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._sockets.append(sock)
+            self._local.sock = sock
+        return sock
+
+    def _drop_socket(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            with self._lock:
+                if sock in self._sockets:
+                    self._sockets.remove(sock)
+            sock.close()
+
+    def _call(
+        self, op: str, socket_timeout: Optional[float] = None, **fields: Any
+    ) -> Dict[str, Any]:
+        """Send one request; an empty response on failure when `fail_open` is set."""
+        request = {"op": op, **fields}
+        if self.token:
+            request["token"] = self.token
+        error: Optional[BaseException] = None
+        for _ in range(2):  # one retry on a fresh connection (e.g. after a daemon restart)
+            try:
+                sock = self._socket()
+                sock.settimeout(socket_timeout or self.timeout)
+                _send(sock, request)
+                response = _recv(sock)
+                break
+            except (OSError, ConnectionError, ValueError) as exc:
+                self._drop_socket()
+                error = exc
+        else:
+            return self._failed(f"Cache server {self.address} unavailable: {error}", error)
+        if not response.get("ok"):
+            return self._failed(f"Cache server error: {response.get('error')}", None)
+        return response
+
+    def _failed(self, message: str, cause: Optional[BaseException]) -> Dict[str, Any]:
+        with self._lock:
+            self._errors += 1
+        if not self.fail_open:
+            raise RuntimeError(message) from cause
+        return {}
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(cache_keys)
+        if not self.enabled or not keys:
+            return {}
+        return self._call("get_many", keys=keys).get("values") or {}
+
+    def get_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        if not self.enabled:
+            return None
+        response = self._call("get_entry", key=cache_key)
+        if response.get("value") is None:
+            return None
+        return CacheEntry(response["value"], stale=bool(response.get("stale")))
+
+    def set_many(
+        self,
+        items: Dict[str, Any],
+        *,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        if not self.enabled or not items:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self._call("set_many", items=items, ttl=ttl, namespace=namespace)
+
+    def delete(self, cache_key: str) -> None:
+        if self.enabled:
+            self._call("delete", key=cache_key)
+
+    def _lease_owner(self) -> str:
+        return f"{self._owner}:{threading.get_ident()}"
+
+    def acquire_lease(self, cache_key: str) -> bool:
+        if not self.enabled:
+            return True
+        response = self._call("acquire_lease", key=cache_key, owner=self._lease_owner())
+        return bool(response.get("acquired", True))
+
+    def release_lease(self, cache_key: str) -> None:
+        if self.enabled:
+            self._call("release_lease", key=cache_key, owner=self._lease_owner())
+
+    def wait_for(self, cache_key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        response = self._call(
+            "wait_for",
+            socket_timeout=self.wait_timeout + self.timeout,
+            key=cache_key,
+            timeout=self.wait_timeout,
+        )
+        return response.get("value")
+
+    def ping(self) -> bool:
+        """True if the daemon answers."""
+        return self._call("ping").get("ok") is True
+
+    def stats(self) -> Dict[str, Any]:
+        """The daemon's counters and tier statistics, plus this client's error count."""
+        stats = dict(self._call("stats").get("stats") or {}) if self.enabled else {}
+        with self._lock:
+            stats["client"] = {"errors": self._errors}
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            sockets = self._sockets
+            self._sockets = []
+        for sock in sockets:
+            sock.close()
+        self._local = threading.local()
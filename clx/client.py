@@ -0,0 +1,377 @@
+"""
+Pooled HTTP client used by `clx_query` and friends.
+
+A `Client` keeps one `requests.Session` per backend base URL so repeated calls
+reuse keep-alive connections instead of paying a TCP/TLS handshake per prompt.
+Retryable statuses are retried here, honouring `Retry-After` and otherwise
+backing off with full jitter, so an optional `RateLimiter` sees every attempt.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from .balancer import split_pool_endpoint
+from .metrics import get_metrics, note_connect_time, take_connect_time
+from .ratelimit import RateLimiter, backoff_delay, estimate_cost, parse_retry_after
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504)
+_GZIP_LEVEL = 6
+
+
+class _TimedConnectMixin:
+    def connect(self) -> None:
+        started = time.perf_counter()
+        try:
+            super().connect()  # type: ignore[misc]
+        finally:
+            note_connect_time(time.perf_counter() - started)
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class Client:
+    """
+    Thread-safe HTTP client with a connection pool per backend.
+
+    Args:
+        pool_connections: Number of host pools cached by each session.
+        pool_maxsize: Maximum connections kept alive per host. Size this to
+            the concurrency you expect to drive against a single backend.
+        retries: Retry budget for connection errors and retryable statuses.
+        backoff_factor: Base delay in seconds for jittered exponential backoff.
+        backoff_max: Longest delay between retries. A `Retry-After` longer than
+            this is not waited out; the response is returned instead.
+        retry_statuses: HTTP statuses that trigger a retry.
+        headers: Extra headers sent with every request.
+        rate_limiter: Optional `RateLimiter` pacing requests per backend/model.
+        compress_requests: Gzip request bodies of at least this many bytes and
+            send them with `Content-Encoding: gzip`. The backend must accept
+            compressed bodies. None (the default) never compresses. Compressed
+            responses are always accepted and decoded.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        headers: Optional[Dict[str, str]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        compress_requests: Optional[int] = None,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = tuple(retry_statuses)
+        self.headers = dict(headers or {})
+        self.rate_limiter = rate_limiter
+        self.compress_requests = compress_requests
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sessions and locks are process-local; rebuild them after unpickling
+        # (e.g. when a Spark UDF closure is shipped to executors).
+        state = self.__dict__.copy()
+        state["_sessions"] = {}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        # urllib3 only retries failed connects; status retries happen in `_send`.
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        # Time new connections so metrics can report connect latency.
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def session_for(self, endpoint: str) -> requests.Session:
+        """Return the pooled session serving the scheme/host of `endpoint`."""
+        parts = urlsplit(endpoint)
+        pool_key = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(pool_key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(pool_key)
+                if session is None:
+                    session = self._build_session()
+                    self._sessions[pool_key] = session
+        return session
+
+    def post(
+        self,
+        endpoint: str,
+        payload: Any,
+        *,
+        timeout: Tuple[float, float] = (5, 30),
+        stream: bool = False,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        """POST `payload` as JSON to `endpoint` over a pooled connection."""
+        if self.rate_limiter is not None:
+            model, tokens = estimate_cost(payload)
+        else:
+            model = payload.get("model") if isinstance(payload, dict) else None
+            tokens = 0
+        body: Dict[str, Any] = {"json": payload}
+        if self.compress_requests is not None:
+            data, encoding_headers = encode_body(payload, self.compress_requests)
+            body = {"data": data}
+            headers = {**(headers or {}), **encoding_headers}
+        return self._send(
+            "POST",
+            endpoint,
+            model=model,
+            tokens=tokens,
+            timeout=timeout,
+            stream=stream,
+            headers=headers,
+            **body,
+        )
+
+    def get(
+        self,
+        endpoint: str,
+        *,
+        timeout: Tuple[float, float] = (5, 30),
+    ) -> requests.Response:
+        """GET `endpoint` over a pooled connection."""
+        return self._send("GET", endpoint, timeout=timeout)
+
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        model: Optional[str] = None,
+        tokens: int = 0,
+        retries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        pooled = split_pool_endpoint(endpoint)
+        if pooled is not None:
+            return self._send_pooled(method, pooled, model, tokens, kwargs)
+
+        if retries is None:
+            retries = self.retries
+        metrics = get_metrics()
+        if metrics is None:
+            return self._send_with_retries(
+                method, endpoint, model, tokens, retries, None, kwargs
+            )
+
+        take_connect_time()
+        exchange = {"retries": 0, "bytes_sent": 0}
+        metrics.add_in_flight(model, endpoint, 1)
+        response = None
+        try:
+            response = self._send_with_retries(
+                method, endpoint, model, tokens, retries, exchange, kwargs
+            )
+            return response
+        finally:
+            metrics.add_in_flight(model, endpoint, -1)
+            received = 0
+            if response is not None:
+                if kwargs.get("stream"):
+                    received = int(response.headers.get("Content-Length") or 0)
+                else:
+                    received = len(response.content)
+            metrics.record_http(
+                model,
+                endpoint,
+                connect=take_connect_time(),
+                ttfb=response.elapsed.total_seconds() if response is not None else None,
+                retries=exchange["retries"],
+                bytes_sent=exchange["bytes_sent"],
+                bytes_received=received,
+            )
+
+    def _send_pooled(
+        self,
+        method: str,
+        pooled: Tuple[Any, str],
+        model: Optional[str],
+        tokens: int,
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        # Logical `clx+pool://` backend: the pool picks a replica per attempt. A
+        # retryable status fails over to the next replica straight away; only once
+        # the pool has no better answer is the whole request retried after a backoff.
+        pool, path = pooled
+
+        def send(url: str) -> requests.Response:
+            return self._send(method, url, model=model, tokens=tokens, retries=0, **kwargs)
+
+        attempt = 0
+        while True:
+            response = pool.send(path, send, hedge=not kwargs.get("stream"))
+            delay = self._retry_delay(response, attempt, self.retries)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(
+        self, response: requests.Response, attempt: int, retries: int
+    ) -> Optional[float]:
+        """Seconds to wait before retrying `response`, or None to return it as is."""
+        if response.status_code not in self.retry_statuses or attempt >= retries:
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            return backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+        if retry_after <= self.backoff_max:
+            return retry_after
+        return None
+
+    def _send_with_retries(
+        self,
+        method: str,
+        endpoint: str,
+        model: Optional[str],
+        tokens: int,
+        retries: int,
+        exchange: Optional[Dict[str, int]],
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        session = self.session_for(endpoint)
+        attempt = 0
+        while True:
+            permit = None
+            if self.rate_limiter is not None:
+                permit = self.rate_limiter.acquire(endpoint, model=model, tokens=tokens)
+            try:
+                response = session.request(method, endpoint, **kwargs)
+            except requests.RequestException:
+                if permit is not None:
+                    permit.release(failed=True)
+                raise
+            except BaseException:
+                if permit is not None:
+                    permit.release(cancelled=True)
+                raise
+
+            if exchange is not None:
+                exchange["retries"] = attempt
+                exchange["bytes_sent"] += len(response.request.body or b"")
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if permit is not None:
+                permit.release(response.status_code, retry_after=retry_after)
+            delay = self._retry_delay(response, attempt, retries)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+def encode_body(payload: Any, compress_min: int) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serialize `payload` as JSON, gzipped when it is at least `compress_min`
+    bytes. Returns the body and the headers that describe it.
+    """
+    data = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(data) >= compress_min:
+        data = gzip.compress(data, compresslevel=_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
+
+
+_default_client: Optional[Client] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> Client:
+    """Return the process-wide client, creating it on first use."""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = Client()
+    return _default_client
+
+
+def set_default_client(client: Optional[Client]) -> None:
+    """Replace the process-wide client. Pass None to reset to a fresh default."""
+    global _default_client
+    with _default_client_lock:
+        previous = _default_client
+        _default_client = client
+    if previous is not None and previous is not client:
+        previous.close()
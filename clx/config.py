@@ -0,0 +1,360 @@
+"""
+Configuration file handling and resolved (memoized) backend settings.
+
+`~/.clx/config.toml` is parsed once and re-read only when its mtime, size or
+inode changes; the file is stat-ed at most every `CONFIG_CHECK_INTERVAL`
+seconds, so resolving the backend per query does not touch the filesystem.
+
+    backend_url = "https://my-backend.company.com"   # or a list of replicas
+    backend_path = "/v1/query"        # optional; or pod_name + actor_id
+    timeout = [5, 30]                 # (connect, read) seconds
+
+    [pool]                            # Client settings
+    maxsize = 64
+    compress_requests = 65536         # gzip request bodies from 64 KiB
+    retries = 3
+
+    [cache]                           # Cache settings; `path` plus keyword arguments
+    path = "~/.clx_cache.db"          # or url = "tcp://cache-host:7480" for a cache daemon
+    ttl = 86400
+
+    [cache.key_policy]                # KeyPolicy settings (request normalization)
+    param_defaults = { temperature = 0 }
+
+    [balancer]                        # BackendPool options when several URLs are given
+    name = "llm"
+    strategy = "least_outstanding"
+
+    [profiles.staging]                # named backends; override the keys above
+    backend_url = "https://staging.company.com"
+    timeout = [2, 10]
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .cache import CacheBackend
+    from .client import Client
+
+DEFAULT_CONFIG_PATH = Path("~/.clx/config.toml").expanduser()
+DEFAULT_TIMEOUT: Tuple[float, float] = (5, 30)
+CONFIG_CHECK_INTERVAL = 2.0
+
+# Environment variables that feed into a resolved configuration.
+_ENV_KEYS = ("CLX_BACKEND_URL", "CLX_POD_NAME", "CLX_ACTOR_ID")
+_POOL_KEYS = {
+    "connections": "pool_connections",
+    "maxsize": "pool_maxsize",
+    "retries": "retries",
+    "backoff_factor": "backoff_factor",
+    "backoff_max": "backoff_max",
+    "compress_requests": "compress_requests",
+}
+_BALANCER_KEYS = (
+    "name",
+    "strategy",
+    "failure_threshold",
+    "cooldown",
+    "max_cooldown",
+    "max_attempts",
+    "hedge_after",
+)
+_SECTIONS = ("backend", "pool", "cache", "balancer")
+
+
+@dataclass
+class Config:
+    backend_url: str
+
+
+@dataclass(frozen=True)
+class ResolvedConfig:
+    """
+    Backend settings resolved from arguments, environment and config file.
+
+    Obtain one with `resolve_config()` and reuse it; `query_kwargs()` feeds
+    `clx_query` and friends without any further config lookups:
+
+        config = resolve_config("staging")
+        for prompt in prompts:
+            clx_query("meta-llama3", prompt, **config.query_kwargs())
+
+    Args:
+        backend_url: Backend base URL, or None if none is configured. Several
+            replicas are kept comma-separated.
+        backend_path: Path appended to the URL (or a full URL).
+        timeout: (connect_timeout, read_timeout) in seconds.
+        client_options: Keyword arguments for `Client` from the `[pool]` table.
+        cache_path: Cache file from `[cache] path`, if set.
+        cache_options: Remaining `[cache]` keys, passed to `Cache`.
+        balancer_options: `BackendPool` keyword arguments from `[balancer]`.
+        profile: Name of the applied profile, if any.
+        source: Config file that was read, or None if it does not exist.
+    """
+
+    backend_url: Optional[str] = None
+    backend_path: str = "/v1/query"
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT
+    client_options: Dict[str, Any] = field(default_factory=dict)
+    cache_path: Optional[str] = None
+    cache_options: Dict[str, Any] = field(default_factory=dict)
+    balancer_options: Dict[str, Any] = field(default_factory=dict)
+    profile: Optional[str] = None
+    source: Optional[Path] = None
+    _client: Optional["Client"] = field(default=None, init=False, repr=False, compare=False)
+
+    def require_backend_url(self) -> str:
+        """The URL to send to; for several replicas, the logical `clx+pool://` URL."""
+        if not self.backend_url:
+            raise ValueError(
+                "No backend URL provided. "
+                "Set CLX_BACKEND_URL, add backend_url to ~/.clx/config.toml, "
+                "or pass backend_url directly to clx_query()."
+            )
+        if "," in self.backend_url:
+            from .balancer import pool_url
+
+            return pool_url(self.backend_url, **self.balancer_options)
+        return self.backend_url
+
+    def client(self) -> "Client":
+        """
+        Pooled client for this configuration: the shared default client when
+        no `[pool]` settings are given, otherwise one built on first use.
+        """
+        from .client import Client, get_default_client
+
+        if not self.client_options:
+            return get_default_client()
+        if self._client is None:
+            with _lock:
+                if self._client is None:
+                    object.__setattr__(self, "_client", Client(**self.client_options))
+        return self._client  # type: ignore[return-value]
+
+    def open_cache(self, **overrides: Any) -> "CacheBackend":
+        """
+        Open the cache from the `[cache]` table; keyword arguments take precedence.
+
+        A `tcp://` or `unix://` address in `url` (or `path`) opens a
+        `RemoteCache` for a cache daemon; settings that only apply to a local
+        `Cache` are then left to the daemon.
+        """
+        from .cache import DEFAULT_CACHE_PATH, Cache
+
+        options = {**self.cache_options, **overrides}
+        path = options.pop("path", None) or self.cache_path or DEFAULT_CACHE_PATH
+        url = options.pop("url", None)
+        if "path" in overrides:
+            url = None  # an explicit path (e.g. `--cache`) wins over the configured daemon
+        if url or str(path).startswith(("tcp://", "unix://")):
+            from .cache_server import REMOTE_OPTIONS, RemoteCache
+
+            remote = {key: value for key, value in options.items() if key in REMOTE_OPTIONS}
+            return RemoteCache(url or str(path), **remote)
+        return Cache(path, **options)
+
+    def query_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for `clx_query`, `clx_query_many`, `clx_stream` and the tasks."""
+        return {
+            "backend_url": self.require_backend_url(),
+            "backend_path": self.backend_path,
+            "timeout": self.timeout,
+            "client": self.client(),
+        }
+
+
+class _ConfigFile:
+    __slots__ = ("stamp", "data", "checked", "resolved")
+
+    def __init__(self, stamp: Optional[Tuple[int, int, int]], data: Dict[str, Any]):
+        self.stamp = stamp
+        self.data = data
+        self.checked = time.monotonic()
+        self.resolved: Dict[Tuple[Any, ...], ResolvedConfig] = {}
+
+
+# Keyed by the path as given, so cache hits skip Path construction and expanduser().
+_files: Dict[Union[str, Path], Tuple[Path, _ConfigFile]] = {}
+_lock = threading.Lock()
+
+
+def _toml() -> Any:
+    try:  # Python <3.11 fallback
+        import tomllib  # type: ignore
+    except ModuleNotFoundError:  # pragma: no cover
+        import tomli as tomllib  # type: ignore
+    return tomllib
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _config_file(path: Union[str, Path]) -> Tuple[Path, _ConfigFile]:
+    cached = _files.get(path)
+    if cached is not None and time.monotonic() - cached[1].checked < CONFIG_CHECK_INTERVAL:
+        return cached
+
+    with _lock:
+        cached = _files.get(path)
+        if cached is not None and time.monotonic() - cached[1].checked < CONFIG_CHECK_INTERVAL:
+            return cached
+        config_path = Path(path).expanduser()
+        stamp = _stamp(config_path)
+        if cached is not None and cached[1].stamp == stamp:
+            cached[1].checked = time.monotonic()
+            return cached
+        data: Dict[str, Any] = {}
+        if stamp is not None:
+            with config_path.open("rb") as handle:
+                data = _toml().load(handle)
+        cached = _files[path] = (config_path, _ConfigFile(stamp, data))
+    return cached
+
+
+def read_config(path: Union[str, Path] = DEFAULT_CONFIG_PATH) -> Dict[str, Any]:
+    """
+    Parsed contents of the config file ({} if it does not exist).
+
+    Results are cached per path and invalidated when the file changes. The
+    returned mapping is shared: do not modify it.
+    """
+    return _config_file(path)[1].data
+
+
+def clear_config_cache() -> None:
+    """Forget all cached config files, e.g. after changing them within the check interval."""
+    with _lock:
+        _files.clear()
+
+
+def load_config(path: Union[str, Path] = DEFAULT_CONFIG_PATH) -> Optional[Config]:
+    data = read_config(path)
+    backend_url = data.get("backend_url") or data.get("backend", {}).get("url")
+    if not backend_url:
+        return None
+    if isinstance(backend_url, (list, tuple)):
+        backend_url = ",".join(str(url) for url in backend_url)
+
+    return Config(backend_url=str(backend_url))
+
+
+def resolve_config(
+    profile: Optional[str] = None, *, config_path: Union[str, Path] = DEFAULT_CONFIG_PATH
+) -> ResolvedConfig:
+    """
+    Resolve backend settings once; the result is memoized until the config
+    file or the relevant environment variables change.
+
+    Args:
+        profile: Name of a `[profiles.<name>]` table to apply over the
+            top-level settings. Defaults to `CLX_PROFILE`.
+        config_path: Config file to read.
+
+    `CLX_BACKEND_URL` overrides the file's top-level URL but not a URL set by
+    the selected profile. `CLX_POD_NAME`/`CLX_ACTOR_ID` apply when the file
+    sets neither `backend_path` nor `pod_name`/`actor_id`.
+    """
+    profile = profile or os.environ.get("CLX_PROFILE") or None
+    env = tuple(os.environ.get(name) for name in _ENV_KEYS)
+    source, entry = _config_file(config_path)
+    memo_key = (profile, env)
+    resolved = entry.resolved.get(memo_key)
+    if resolved is None:
+        resolved = _resolve(entry.data, profile, env, source if entry.stamp else None)
+        entry.resolved[memo_key] = resolved
+    return resolved
+
+
+def _merge(data: Dict[str, Any], profile: Optional[str], source: Optional[Path]) -> Dict[str, Any]:
+    if not profile:
+        return data
+    profiles = data.get("profiles") or {}
+    if profile not in profiles:
+        raise ValueError(f"Unknown clx profile {profile!r} in {source or DEFAULT_CONFIG_PATH}")
+    merged = {key: value for key, value in data.items() if key != "profiles"}
+    for key, value in profiles[profile].items():
+        if key in _SECTIONS and isinstance(value, dict):
+            merged[key] = {**(merged.get(key) or {}), **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def _resolve(
+    data: Dict[str, Any],
+    profile: Optional[str],
+    env: Tuple[Optional[str], ...],
+    source: Optional[Path],
+) -> ResolvedConfig:
+    env_url, env_pod, env_actor = env
+    settings = _merge(data, profile, source)
+    backend = settings.get("backend") or {}
+    overrides = data["profiles"][profile] if profile else {}
+    profile_url = overrides.get("backend_url") or (overrides.get("backend") or {}).get("url")
+
+    backend_url = profile_url or env_url or settings.get("backend_url") or backend.get("url")
+    if isinstance(backend_url, (list, tuple)):
+        backend_url = ",".join(str(url).rstrip("/") for url in backend_url)
+    backend_path = settings.get("backend_path") or backend.get("path")
+    if not backend_path:
+        pod = settings.get("pod_name") or env_pod
+        actor = settings.get("actor_id") or env_actor
+        backend_path = f"/pods/{pod}/actors/{actor}/run" if pod and actor else "/v1/query"
+
+    timeout = settings.get("timeout")
+    if timeout is None:
+        connect, read = DEFAULT_TIMEOUT
+        timeout = (settings.get("connect_timeout", connect), settings.get("read_timeout", read))
+    if isinstance(timeout, (int, float)):
+        timeout = (timeout, timeout)
+    if len(timeout) != 2:
+        raise ValueError("timeout must be a number or a [connect, read] pair")
+
+    pool = _known(settings, "pool", _POOL_KEYS, source)
+    balancer = _known(settings, "balancer", _BALANCER_KEYS, source)
+    cache_options = dict(settings.get("cache") or {})
+    cache_path = cache_options.pop("path", None)
+    if cache_path and not str(cache_path).startswith(("tcp://", "unix://")):
+        cache_path = str(Path(cache_path).expanduser())
+
+    return ResolvedConfig(
+        backend_url=str(backend_url).rstrip("/") if backend_url else None,
+        backend_path=str(backend_path),
+        timeout=(timeout[0], timeout[1]),
+        client_options={_POOL_KEYS[key]: value for key, value in pool.items()},
+        cache_path=str(cache_path) if cache_path else None,
+        cache_options=cache_options,
+        balancer_options=dict(balancer),
+        profile=profile,
+        source=source,
+    )
+
+
+def _known(
+    settings: Dict[str, Any], section: str, keys: Iterable[str], source: Optional[Path]
+) -> Dict[str, Any]:
+    # A typo in an optional table must not break URL resolution for every query:
+    # warn (once per config change, as results are memoized) and drop the key.
+    table = settings.get(section) or {}
+    unknown = set(table) - set(keys)
+    if unknown:
+        warnings.warn(
+            f"Ignoring unknown [{section}] settings in {source or DEFAULT_CONFIG_PATH}: "
+            + ", ".join(sorted(unknown)),
+            stacklevel=4,
+        )
+    return {key: value for key, value in table.items() if key not in unknown}
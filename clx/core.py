@@ -8,161 +8,74 @@ implements the `/v1/query` contract.
 
 from __future__ import annotations
 
-import hashlib
 import json
 import os
-import sqlite3
-from dataclasses import dataclass
+import queue
+import threading
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .cache import DEFAULT_CACHE_PATH, Cache, CacheBackend  # noqa: F401
+from .config import DEFAULT_CONFIG_PATH, Config, load_config, resolve_config  # noqa: F401
+from .metrics import QueryTrace, get_metrics
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .batching import MicroBatcher
+    from .client import Client
 
-import requests
-
-try:  # Python <3.11 fallback
-    import tomllib  # type: ignore
-except ModuleNotFoundError:  # pragma: no cover
-    import tomli as tomllib  # type: ignore
-
-DEFAULT_CONFIG_PATH = Path("~/.clx/config.toml").expanduser()
-DEFAULT_CACHE_PATH = Path("~/.clx_cache.db").expanduser()
 DEFAULT_BACKEND_PATH = "/v1/query"
 
 
-@dataclass
-class Config:
-    backend_url: str
-
-
-class Cache:
-    """
-    Optional SQLite-backed cache keyed by backend URL, model, prompt, params, and routing.
-
-    Disabled unless explicitly passed into `clx_query`.
-    """
-
-    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH, enabled: bool = True):
-        self.path = Path(path).expanduser()
-        self.enabled = enabled
-        self._conn: Optional[sqlite3.Connection] = None
-
-    def __enter__(self) -> "Cache":
-        return self
-
-    def __exit__(self, *exc_info: object) -> None:
-        self.close()
-
-    def _connect(self) -> sqlite3.Connection:
-        if not self.enabled:
-            raise RuntimeError("Cache is disabled")
-
-        if self._conn is None:
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            self._conn = sqlite3.connect(self.path)
-            self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS cache (
-                    cache_key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-        return self._conn
-
-    @staticmethod
-    def build_key(
-        backend_url: str,
-        backend_path: str,
-        model: str,
-        prompt: str,
-        params: Dict[str, Any],
-        metadata: Optional[Dict[str, Any]],
-        use_messages_payload: bool,
-    ) -> str:
-        canonical = json.dumps(
-            {
-                "backend_url": backend_url,
-                "backend_path": backend_path,
-                "model": model,
-                "prompt": prompt,
-                "params": params,
-                "metadata": metadata or {},
-                "use_messages_payload": use_messages_payload,
-            },
-            sort_keys=True,
-        )
-        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
-
-    def get(self, cache_key: str) -> Optional[Any]:
-        if not self.enabled:
-            return None
-
-        conn = self._connect()
-        row = conn.execute("SELECT value FROM cache WHERE cache_key = ?", (cache_key,)).fetchone()
-        if not row:
-            return None
-        try:
-            return json.loads(row[0])
-        except Exception:
-            return row[0]
-
-    def set(self, cache_key: str, value: Any) -> None:
-        if not self.enabled:
-            return
-
-        conn = self._connect()
-        try:
-            serialized = json.dumps(value)
-        except TypeError:
-            serialized = json.dumps(str(value))
-
-        conn.execute(
-            "INSERT OR REPLACE INTO cache (cache_key, value) VALUES (?, ?)",
-            (cache_key, serialized),
-        )
-        conn.commit()
-
-    def close(self) -> None:
-        if self._conn is not None:
-            self._conn.commit()
-            self._conn.close()
-            self._conn = None
-
+# requests (with urllib3 and friends) is imported on first
+# use, so `import clx` stays cheap for short-lived processes and Spark workers.
+def _requests() -> Any:
+    import requests
 
-def load_config(path: Union[str, Path] = DEFAULT_CONFIG_PATH) -> Optional[Config]:
-    config_path = Path(path).expanduser()
-    if not config_path.exists():
-        return None
+    return requests
 
-    with config_path.open("rb") as handle:
-        data = tomllib.load(handle)
 
-    backend_url = data.get("backend_url") or data.get("backend", {}).get("url")
-    if not backend_url:
-        return None
+def _default_client() -> "Client":
+    from .client import get_default_client
 
-    return Config(backend_url=str(backend_url))
+    return get_default_client()
 
 
 def resolve_backend_url(
     backend_url: Optional[str] = None, *, config_path: Union[str, Path] = DEFAULT_CONFIG_PATH
 ) -> str:
+    """
+    Return the URL to send to: `backend_url` if given, otherwise whatever
+    `resolve_config` picks (a `CLX_PROFILE` profile's URL, then
+    `CLX_BACKEND_URL`, then the config file).
+    """
     if backend_url:
+        if "," in backend_url:
+            # Several replicas: route through a pool under one logical URL. The
+            # configured pool name belongs to the configured replicas only.
+            from .balancer import pool_url
+
+            options = dict(resolve_config(config_path=config_path).balancer_options)
+            options.pop("name", None)
+            return pool_url(backend_url, **options)
         return backend_url.rstrip("/")
 
-    env_backend = os.environ.get("CLX_BACKEND_URL")
-    if env_backend:
-        return env_backend.rstrip("/")
-
-    config = load_config(config_path)
-    if config and config.backend_url:
-        return config.backend_url.rstrip("/")
-
-    raise ValueError(
-        "No backend URL provided. "
-        "Set CLX_BACKEND_URL, add backend_url to ~/.clx/config.toml, "
-        "or pass backend_url directly to clx_query()."
-    )
+    # Memoized and invalidated by the file's mtime: no filesystem access per call.
+    return resolve_config(config_path=config_path).require_backend_url()
 
 
 def resolve_backend_path(
@@ -197,6 +110,67 @@ def _ensure_json_payload(output: Any) -> Any:
     raise ValueError(f"Unsupported JSON output type: {type(output).__name__}")
 
 
+def _build_payload(
+    model: str,
+    prompt: str,
+    params: Dict[str, Any],
+    meta: Dict[str, Any],
+    use_messages_payload: bool,
+) -> Dict[str, Any]:
+    if use_messages_payload:
+        payload: Dict[str, Any] = {
+            "messages": [{"role": "user", "content": prompt}],
+            "metadata": meta,
+        }
+        # preserve model/params if the backend wants to branch on them
+        if model:
+            payload["model"] = model
+        if params:
+            payload["params"] = params
+        return payload
+    return {"model": model, "prompt": prompt, "params": params, "metadata": meta or None}
+
+
+def _build_endpoint(resolved_backend: str, resolved_path: str) -> str:
+    if resolved_path.startswith("http://") or resolved_path.startswith("https://"):
+        return resolved_path
+    return f"{resolved_backend}/{resolved_path.lstrip('/')}"
+
+
+def _extract_output(data: Any) -> Any:
+    # Try the standard contract first
+    if isinstance(data, dict):
+        if "output" in data:
+            return data["output"]
+        if "response" in data:
+            return data["response"]
+    raise ValueError("Backend response missing 'output' or 'response' field")
+
+
+def _post_query(
+    client: Client,
+    endpoint: str,
+    payload: Dict[str, Any],
+    timeout: Tuple[int, int],
+    *,
+    trace: Optional[QueryTrace] = None,
+) -> Any:
+    try:
+        response = client.post(endpoint, payload, timeout=timeout)
+    except _requests().RequestException as exc:
+        raise RuntimeError(f"Failed to reach backend at {endpoint}") from exc
+
+    if response.status_code >= 400:
+        raise RuntimeError(f"Backend returned {response.status_code}: {response.text}")
+
+    with _stage(trace, "decode"):
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise ValueError("Backend response was not valid JSON") from exc
+        return _extract_output(data)
+
+
 def clx_query(
     model: str,
     prompt: str,
@@ -206,11 +180,14 @@ def clx_query(
     backend_path: Optional[str] = None,
     pod_name: Optional[str] = None,
     actor_id: Optional[str] = None,
-    cache: Optional[Cache] = None,
+    cache: Optional[CacheBackend] = None,
     metadata: Optional[Dict[str, Any]] = None,
     expect_json: bool = False,
     use_messages_payload: bool = False,
     timeout: Tuple[int, int] = (5, 30),
+    client: Optional[Client] = None,
+    batcher: Optional["MicroBatcher"] = None,
+    coalesce: bool = True,
 ) -> Any:
     """
     Forward a query to the configured backend.
@@ -231,70 +208,373 @@ def clx_query(
         use_messages_payload: If True, send payload as {"messages": [...]} rather than
             {"model": ..., "prompt": ...}.
         timeout: (connect_timeout, read_timeout) tuple passed to requests.
+        client: Optional pooled `Client`. Defaults to the shared process-wide client.
+        batcher: Optional `MicroBatcher`. When the backend advertises the bulk
+            route, concurrent calls are folded into `/v1/query:batch` requests.
+        coalesce: When caching, concurrent calls for the same cache key share a
+            single backend request. With `Cache(lease_ttl=...)` this extends
+            across processes using the same cache file.
     """
     resolved_backend = resolve_backend_url(backend_url)
     resolved_path = resolve_backend_path(backend_path, pod_name=pod_name, actor_id=actor_id)
-    params = params or {}
-    meta = metadata or {}
+    request = (
+        model,
+        prompt,
+        params or {},
+        metadata or {},
+        resolved_backend,
+        resolved_path,
+        expect_json,
+        use_messages_payload,
+        timeout,
+        client,
+        batcher,
+        coalesce,
+    )
+    metrics = get_metrics()
+    if metrics is None:
+        return _resolve_query(cache, None, *request)
+
+    trace = metrics.start(model, resolved_path)
+    try:
+        output = _resolve_query(cache, trace, *request)
+    except BaseException as exc:
+        metrics.finish(trace, exc)
+        raise
+    metrics.finish(trace)
+    return output
+
+
+def _stage(trace: Optional[QueryTrace], name: str) -> ContextManager[None]:
+    return trace.time(name) if trace is not None else _NO_STAGE
+
+
+_NO_STAGE = nullcontext()
+
+
+def _resolve_query(
+    cache: Optional[CacheBackend],
+    trace: Optional[QueryTrace],
+    model: str,
+    prompt: str,
+    params: Dict[str, Any],
+    meta: Dict[str, Any],
+    resolved_backend: str,
+    resolved_path: str,
+    expect_json: bool,
+    use_messages_payload: bool,
+    timeout: Tuple[int, int],
+    client: Optional[Client],
+    batcher: Optional["MicroBatcher"],
+    coalesce: bool,
+) -> Any:
     cache_key = None
 
-    if cache:
-        cache_key = cache.build_key(
-            resolved_backend,
-            resolved_path,
-            model,
-            prompt,
-            params,
-            meta,
-            use_messages_payload,
+    def _fetch(trace: Optional[QueryTrace] = None) -> Any:
+        with _stage(trace, "payload_build"):
+            payload = _build_payload(model, prompt, params, meta, use_messages_payload)
+        use_batch = batcher is not None and batcher.accepts(
+            resolved_backend, resolved_path, use_messages_payload, client=client
         )
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return cached if not expect_json else _ensure_json_payload(cached)
+        if use_batch:
+            output = batcher.submit(  # type: ignore[union-attr]
+                resolved_backend, payload, client=client, timeout=timeout
+            ).result()
+        else:
+            endpoint = _build_endpoint(resolved_backend, resolved_path)
+            http = client or _default_client()
+            output = _post_query(http, endpoint, payload, timeout, trace=trace)
+        if expect_json:
+            _ensure_json_payload(output)  # invalid JSON raises before anything is cached
+        # The raw output is what gets cached, so a hit parses exactly like a fresh answer.
+        return output
 
-    if use_messages_payload:
-        payload = {
-            "messages": [{"role": "user", "content": prompt}],
-            "metadata": meta,
-        }
-        # preserve model/params if the backend wants to branch on them
-        if model:
-            payload["model"] = model
-        if params:
-            payload["params"] = params
-    else:
-        payload = {"model": model, "prompt": prompt, "params": params, "metadata": meta or None}
+    if cache:
+        with _stage(trace, "cache_lookup"):
+            cache_key = cache.build_key(
+                resolved_backend,
+                resolved_path,
+                model,
+                prompt,
+                params,
+                meta,
+                use_messages_payload,
+            )
+            entry = cache.get_entry(cache_key)
+        if entry is not None:
+            if trace is not None:
+                trace.cache = "stale" if entry.stale else "hit"
+            if entry.stale:
+                _revalidate_in_background(cache, cache_key, model, _fetch)
+            return entry.value if not expect_json else _ensure_json_payload(entry.value)
+        if trace is not None:
+            trace.cache = "miss"
+
+        if coalesce:
+            output = _inflight.do(
+                cache_key, lambda: _fetch_and_store(cache, cache_key, model, lambda: _fetch(trace))
+            )
+            return output if not expect_json else _ensure_json_payload(output)
 
-    if resolved_path.startswith("http://") or resolved_path.startswith("https://"):
-        endpoint = resolved_path
-    else:
-        endpoint = f"{resolved_backend}/{resolved_path.lstrip('/')}"
+    output = _fetch(trace)
 
-    try:
-        response = requests.post(endpoint, json=payload, timeout=timeout)
-    except requests.RequestException as exc:
-        raise RuntimeError(f"Failed to reach backend at {endpoint}") from exc
+    if cache and cache_key:
+        cache.set(cache_key, output, namespace=model)
 
-    if response.status_code >= 400:
-        raise RuntimeError(f"Backend returned {response.status_code}: {response.text}")
+    return output if not expect_json else _ensure_json_payload(output)
+
+
+# Calls currently talking to the backend, keyed by cache key.
+_inflight = SingleFlight()
+
+
+def _fetch_and_store(
+    cache: CacheBackend, cache_key: str, namespace: str, fetch: Callable[[], Any]
+) -> Any:
+    """Single-flight leader: recheck the cache, honour cross-process leases, fetch, store."""
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if not cache.acquire_lease(cache_key):
+        cached = cache.wait_for(cache_key)
+        if cached is not None:
+            return cached
+        # The other owner gave up or died; compute it here.
+        cache.acquire_lease(cache_key)
 
     try:
-        data = response.json()
-    except ValueError as exc:
-        raise ValueError("Backend response was not valid JSON") from exc
+        output = fetch()
+        cache.set(cache_key, output, namespace=namespace)
+    finally:
+        cache.release_lease(cache_key)
+    return output
 
-    # Try the standard contract first
-    if "output" in data:
-        output = data["output"]
-    elif "response" in data:
-        output = data["response"]
+
+_revalidating: Set[str] = set()
+_revalidating_lock = threading.Lock()
+# Refreshes run on a few shared daemon threads, so a burst of stale keys
+# queues up instead of starting a thread per key.
+_REVALIDATE_WORKERS = 4
+_revalidate_queue: "queue.SimpleQueue[Callable[[], None]]" = queue.SimpleQueue()
+_revalidate_workers: List[threading.Thread] = []
+
+
+def _revalidate_worker() -> None:
+    while True:
+        _revalidate_queue.get()()
+
+
+def _reset_revalidation() -> None:
+    # Worker threads do not survive a fork; the child starts its own.
+    global _revalidate_queue, _revalidating_lock
+    _revalidate_queue = queue.SimpleQueue()
+    _revalidating_lock = threading.Lock()
+    _revalidate_workers.clear()
+    _revalidating.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_revalidation)
+
+
+def _revalidate_in_background(
+    cache: CacheBackend, cache_key: str, namespace: str, fetch: Callable[[], Any]
+) -> None:
+    """Refresh a stale cache entry on the shared workers, at most once per key at a time."""
+    with _revalidating_lock:
+        if cache_key in _revalidating:
+            return
+        _revalidating.add(cache_key)
+        if len(_revalidate_workers) < _REVALIDATE_WORKERS:
+            worker = threading.Thread(
+                target=_revalidate_worker, name="clx-revalidate", daemon=True
+            )
+            worker.start()
+            _revalidate_workers.append(worker)
+
+    def _run() -> None:
+        try:
+            cache.set(cache_key, fetch(), namespace=namespace)
+        except Exception:  # noqa: BLE001 - the stale value keeps being served
+            pass
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(cache_key)
+
+    _revalidate_queue.put(_run)
+
+
+def clx_query_many(
+    model: str,
+    prompts: Iterable[str],
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    backend_url: Optional[str] = None,
+    backend_path: Optional[str] = None,
+    pod_name: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    expect_json: bool = False,
+    use_messages_payload: bool = False,
+    timeout: Tuple[int, int] = (5, 30),
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    return_exceptions: bool = True,
+) -> List[Any]:
+    """
+    Run `clx_query` over many prompts with bounded concurrency.
+
+    Results are returned in the same order as `prompts`. The cache is consulted
+    once for the whole batch before any request is sent, and identical prompts
+    are only sent once when caching is enabled. Requests run on a thread pool of
+    at most `max_concurrency` workers; cache writes happen on the calling thread.
+
+    Args:
+        max_concurrency: Maximum number of in-flight backend requests.
+        return_exceptions: If True, a failed item yields its exception in the
+            result list instead of aborting the batch. If False, the first
+            failure is raised once all in-flight requests have finished.
+
+    All other arguments match `clx_query` and apply to every prompt.
+    """
+    return _query_many(
+        [(model, prompt, params or {}) for prompt in prompts],
+        backend_url=backend_url,
+        backend_path=backend_path,
+        pod_name=pod_name,
+        actor_id=actor_id,
+        cache=cache,
+        metadata=metadata,
+        expect_json=expect_json,
+        use_messages_payload=use_messages_payload,
+        timeout=timeout,
+        client=client,
+        max_concurrency=max_concurrency,
+        return_exceptions=return_exceptions,
+    )
+
+
+def _query_many(
+    items: Sequence[Tuple[str, str, Dict[str, Any]]],
+    *,
+    backend_url: Optional[str] = None,
+    backend_path: Optional[str] = None,
+    pod_name: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    expect_json: bool = False,
+    use_messages_payload: bool = False,
+    timeout: Tuple[int, int] = (5, 30),
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    return_exceptions: bool = True,
+) -> List[Any]:
+    """Batch engine behind `clx_query_many`; each request is (model, prompt, params)."""
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    resolved_backend = resolve_backend_url(backend_url)
+    resolved_path = resolve_backend_path(backend_path, pod_name=pod_name, actor_id=actor_id)
+    endpoint = _build_endpoint(resolved_backend, resolved_path)
+    meta = metadata or {}
+    http = client or _default_client()
+
+    results: List[Any] = [None] * len(items)
+    # Each pending entry maps a request key to the result slots it fills.
+    pending: Dict[Any, List[int]] = {}
+
+    if cache:
+        keys = [
+            cache.build_key(
+                resolved_backend,
+                resolved_path,
+                model,
+                prompt,
+                params,
+                meta,
+                use_messages_payload,
+            )
+            for model, prompt, params in items
+        ]
+        cached = cache.get_many(set(keys))
+        metrics = get_metrics()
+        for index, cache_key in enumerate(keys):
+            value = cached.get(cache_key)
+            if value is not None:
+                if metrics is not None:
+                    metrics.count(items[index][0], resolved_path, requests=1, cache_hits=1)
+                try:
+                    results[index] = _ensure_json_payload(value) if expect_json else value
+                except ValueError as exc:
+                    if not return_exceptions:
+                        raise
+                    results[index] = exc
+            else:
+                pending.setdefault(cache_key, []).append(index)
     else:
-        raise ValueError("Backend response missing 'output' or 'response' field")
+        for index in range(len(items)):
+            pending[index] = [index]
+
+    def _fetch(index: int) -> Any:
+        model, prompt, params = items[index]
+        metrics = get_metrics()
+        trace = metrics.start(model, resolved_path) if metrics is not None else None
+        if trace is not None and cache:
+            trace.cache = "miss"
+        try:
+            with _stage(trace, "payload_build"):
+                payload = _build_payload(model, prompt, params, meta, use_messages_payload)
+            output = _post_query(http, endpoint, payload, timeout, trace=trace)
+            if expect_json:
+                _ensure_json_payload(output)  # validate; the raw output is cached
+        except BaseException as exc:
+            if trace is not None:
+                metrics.finish(trace, exc)  # type: ignore[union-attr]
+            raise
+        if trace is not None:
+            metrics.finish(trace)  # type: ignore[union-attr]
+        return output
 
-    if expect_json:
-        output = _ensure_json_payload(output)
+    def _run(key: Any) -> Any:
+        index = pending[key][0]
+        if not cache:
+            return _fetch(index)
+        # Share the request with concurrent clx_query/clx_query_many callers.
+        return _inflight.do(key, lambda: _fetch(index))
+
+    first_error: Optional[BaseException] = None
+    # Fresh results grouped by model, which is the cache namespace.
+    fresh: Dict[str, Dict[str, Any]] = {}
+    if pending:
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        workers = min(max_concurrency, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clx") as pool:
+            futures = {pool.submit(_run, key): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    value: Any = future.result()
+                except Exception as exc:  # noqa: BLE001 - surfaced per item
+                    if first_error is None:
+                        first_error = exc
+                    value = exc
+                else:
+                    if cache:
+                        fresh.setdefault(items[pending[key][0]][0], {})[key] = value
+                    if expect_json:
+                        value = _ensure_json_payload(value)
+                for index in pending[key]:
+                    results[index] = value
 
-    if cache and cache_key:
-        cache.set(cache_key, output)
+    if cache:
+        for model, values in fresh.items():
+            cache.set_many(values, namespace=model)
 
-    return output
+    if first_error is not None and not return_exceptions:
+        raise first_error
+
+    return results
@@ -0,0 +1,240 @@
+"""
+Cache key policies: deterministic request normalization in front of `Cache.build_key`.
+
+A `KeyPolicy` rewrites the request that gets hashed, never the request that is
+sent, so equivalent requests share one cache entry:
+
+    cache = Cache(key_policy=KeyPolicy(param_defaults={"temperature": 0}))
+
+or in `~/.clx/config.toml`:
+
+    [cache.key_policy]
+    unicode_form = "NFKC"
+    param_defaults = { temperature = 0 }
+    ignore_metadata = ["user_id", "request_id"]
+
+`key_report()` (and `python -m clx keys`) estimates the hit-rate impact of a
+policy on an existing cache file written with `Cache(record_requests=True)`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import re
+import sqlite3
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+# Metadata fields that identify a call rather than the question asked.
+VOLATILE_METADATA = (
+    "request_id",
+    "trace_id",
+    "span_id",
+    "session_id",
+    "user_id",
+    "timestamp",
+)
+_UNICODE_FORMS = ("NFC", "NFKC", "NFD", "NFKD")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _canonical_number(value: Any) -> Any:
+    """Map integral floats to ints, recursively, so 0 and 0.0 hash alike."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {key: _canonical_number(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_canonical_number(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class KeyPolicy:
+    """
+    Normalization applied to a request before it is hashed into a cache key.
+
+    Args:
+        unicode_form: Unicode normalization of the prompt ("NFC", "NFKC",
+            "NFD", "NFKD"), or None to keep it as is.
+        collapse_whitespace: Collapse runs of whitespace in the prompt to one
+            space and strip the ends.
+        casefold: Case-insensitive prompts. Off by default: case can change
+            the answer.
+        param_defaults: Values the backend uses for omitted params. They are
+            filled in, so `{}` and `{"temperature": 0}` share a key when
+            `param_defaults={"temperature": 0}`. Integral floats are always
+            treated as ints.
+        ignore_params: Params left out of the key (e.g. a client-side `seed`).
+        ignore_metadata: Metadata fields left out of the key.
+        keep_metadata: If set, only these metadata fields are part of the key;
+            `ignore_metadata` then does not apply.
+    """
+
+    unicode_form: Optional[str] = "NFKC"
+    collapse_whitespace: bool = True
+    casefold: bool = False
+    param_defaults: Dict[str, Any] = field(default_factory=dict)
+    ignore_params: Tuple[str, ...] = ()
+    ignore_metadata: Tuple[str, ...] = VOLATILE_METADATA
+    keep_metadata: Optional[Tuple[str, ...]] = None
+
+    def __post_init__(self) -> None:
+        if self.unicode_form is not None and self.unicode_form not in _UNICODE_FORMS:
+            raise ValueError(f"unicode_form must be one of {', '.join(_UNICODE_FORMS)} or None")
+        # Accept lists (e.g. from TOML) and keep the policy immutable and picklable.
+        object.__setattr__(self, "param_defaults", dict(self.param_defaults))
+        object.__setattr__(self, "ignore_params", tuple(self.ignore_params))
+        object.__setattr__(self, "ignore_metadata", tuple(self.ignore_metadata))
+        if self.keep_metadata is not None:
+            object.__setattr__(self, "keep_metadata", tuple(self.keep_metadata))
+
+    @classmethod
+    def coerce(cls, value: Union["KeyPolicy", Dict[str, Any], None]) -> Optional["KeyPolicy"]:
+        """Build a policy from a config table; policies and None pass through."""
+        if value is None or isinstance(value, KeyPolicy):
+            return value
+        if isinstance(value, dict):
+            unknown = set(value) - {item.name for item in dataclasses.fields(cls)}
+            if unknown:
+                raise ValueError(f"Unknown key_policy settings: {', '.join(sorted(unknown))}")
+            return cls(**value)
+        raise ValueError("key_policy must be a KeyPolicy or a mapping of its settings")
+
+    def normalize_prompt(self, prompt: str) -> str:
+        if self.unicode_form:
+            prompt = unicodedata.normalize(self.unicode_form, prompt)
+        if self.collapse_whitespace:
+            prompt = _WHITESPACE.sub(" ", prompt).strip()
+        if self.casefold:
+            prompt = prompt.casefold()
+        return prompt
+
+    def normalize_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {**self.param_defaults, **params} if self.param_defaults else params
+        if self.ignore_params:
+            merged = {key: value for key, value in merged.items() if key not in self.ignore_params}
+        return _canonical_number(merged)
+
+    def normalize_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        if self.keep_metadata is not None:
+            return {key: value for key, value in metadata.items() if key in self.keep_metadata}
+        return {key: value for key, value in metadata.items() if key not in self.ignore_metadata}
+
+    def apply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the normalized copy of a `Cache.build_key` request mapping."""
+        return {
+            **request,
+            "prompt": self.normalize_prompt(request["prompt"]),
+            "params": self.normalize_params(request.get("params") or {}),
+            "metadata": self.normalize_metadata(request.get("metadata") or {}),
+        }
+
+
+# Settings that turn each rule off, and the settings belonging to each rule; used
+# for the per-rule breakdown in `key_report`.
+_NEUTRAL: Dict[str, Any] = {
+    "unicode_form": None,
+    "collapse_whitespace": False,
+    "casefold": False,
+    "param_defaults": {},
+    "ignore_params": (),
+    "ignore_metadata": (),
+    "keep_metadata": None,
+}
+_RULES = {
+    "unicode": ("unicode_form",),
+    "whitespace": ("collapse_whitespace",),
+    "casefold": ("casefold",),
+    "params": ("param_defaults", "ignore_params"),
+    "metadata": ("ignore_metadata", "keep_metadata"),
+}
+
+
+def request_key(request: Dict[str, Any], policy: Optional[KeyPolicy] = None) -> str:
+    """Cache key of a request mapping, as `Cache.build_key` computes it."""
+    if policy is not None:
+        request = policy.apply(request)
+    canonical = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _hit_rate(hits: int, lookups: int) -> float:
+    return hits / lookups if lookups else 0.0
+
+
+def key_report(path: Union[str, Path], policy: Optional[KeyPolicy] = None) -> Dict[str, Any]:
+    """
+    Estimate the cache hit rate an existing cache file would have had under `policy`.
+
+    Every entry counts as one miss (the request that filled it) plus its
+    recorded hits. Entries whose requests normalize to the same key would have
+    been one entry, turning the extra misses into hits. Only entries written
+    with `Cache(record_requests=True)` can be regrouped; others are counted
+    unchanged.
+
+    Returns a mapping with `entries`, `recorded`, `lookups`, `hit_rate`,
+    `projected_entries`, `projected_hit_rate`, and `rules`: the projected hit
+    rate with each rule of `policy` applied on its own.
+    """
+    policy = policy or KeyPolicy()
+    conn = sqlite3.connect(f"file:{Path(path).expanduser()}?mode=ro", uri=True)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        if "cache" not in tables:
+            raise ValueError(f"{path} is not a clx cache file")
+        if "cache_requests" in tables:
+            query = (
+                "SELECT c.cache_key, c.hits, r.request FROM cache c "
+                "LEFT JOIN cache_requests r ON r.cache_key = c.cache_key"
+            )
+        else:
+            query = "SELECT cache_key, hits, NULL FROM cache"
+        rows = [
+            (key, hits or 0, json.loads(request) if request else None)
+            for key, hits, request in conn.execute(query)
+        ]
+    finally:
+        conn.close()
+
+    lookups = sum(1 + hits for _, hits, _ in rows)
+    hits = lookups - len(rows)
+
+    def _groups(rule_policy: KeyPolicy) -> int:
+        keys = {
+            request_key(request, rule_policy) if request is not None else ("raw", key)
+            for key, _, request in rows
+        }
+        return len(keys)
+
+    projected = _groups(policy)
+    rules = {}
+    for name, settings in _RULES.items():
+        only = {key: value for key, value in _NEUTRAL.items() if key not in settings}
+        rules[name] = _hit_rate(lookups - _groups(dataclasses.replace(policy, **only)), lookups)
+    return {
+        "entries": len(rows),
+        "recorded": sum(request is not None for _, _, request in rows),
+        "lookups": lookups,
+        "hit_rate": _hit_rate(hits, lookups),
+        "projected_entries": projected,
+        "projected_hit_rate": _hit_rate(lookups - projected, lookups),
+        "rules": rules,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> Iterable[str]:
+    """Human-readable lines for a `key_report` result."""
+    yield f"entries:            {report['entries']} ({report['recorded']} with recorded requests)"
+    yield f"lookups:            {report['lookups']}"
+    yield f"hit rate:           {report['hit_rate']:.1%}"
+    yield (
+        f"with policy:        {report['projected_hit_rate']:.1%} "
+        f"({report['projected_entries']} entries)"
+    )
+    for name, rate in report["rules"].items():
+        yield f"  {name + ' only:':17} {rate:.1%}"
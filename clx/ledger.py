@@ -0,0 +1,368 @@
+"""
+Result ledger for incremental, resumable batch jobs.
+
+A `Ledger` records, per job, one row for every input row: (job_id, row_key,
+input_hash, output, status). `run_job` hashes each input and only sends rows
+that are new, changed, or failed last time; unchanged rows keep their stored
+output. Results are committed chunk by chunk, so a job that crashes resumes
+where it stopped when it is run again.
+
+    from clx import Ledger, run_job
+
+    with Ledger("~/.clx_ledger.db") as ledger:
+        stats = run_job(ledger, "nightly-summaries", rows, cache=cache)
+
+`rows` yields (row_key, model, prompt, params) tuples. A nightly run over an
+unchanged table then costs no backend calls. Pass a `Cache` as well to share
+outputs for identical prompts across jobs and rows. `Ledger.export` copies a
+job's results into a SQLite or DuckDB table for joins, and the SQL adapters'
+`run_clx_job` does the whole round trip from a SELECT.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .core import _query_many
+
+DEFAULT_LEDGER_PATH = Path("~/.clx_ledger.db").expanduser()
+STATUSES = ("ok", "error")
+
+RowKey = Union[str, int]
+# (row_key, model, prompt, params)
+JobRow = Tuple[RowKey, Optional[str], Optional[str], Optional[Dict[str, Any]]]
+
+# Keeps `IN (...)` lists below SQLite's bound-parameter limit on old builds.
+_LOOKUP_CHUNK = 500
+
+
+def input_hash(
+    model: str, prompt: str, params: Optional[Dict[str, Any]], expect_json: bool
+) -> str:
+    """Hash of everything that determines a row's output."""
+    canonical = json.dumps([model, prompt, params or {}, expect_json], sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _check_key(row_key: Any) -> RowKey:
+    if isinstance(row_key, bool) or not isinstance(row_key, (str, int)):
+        raise ValueError(f"Row keys must be str or int, not {type(row_key).__name__}")
+    return row_key
+
+
+class Ledger:
+    """
+    Per-job record of row inputs and outputs in a SQLite file.
+
+    Args:
+        path: Ledger file (":memory:" for a throwaway ledger). Keep it on
+            local disk; jobs sharing a file must use distinct job ids.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_LEDGER_PATH):
+        self.path = path if str(path) == ":memory:" else Path(path).expanduser()
+        if isinstance(self.path, Path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(
+            str(self.path), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clx_ledger ("
+            "job_id TEXT NOT NULL, row_key NOT NULL, input_hash TEXT NOT NULL, "
+            "output TEXT, status TEXT NOT NULL, error TEXT, run INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (job_id, row_key)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clx_jobs (job_id TEXT PRIMARY KEY, "
+            "run INTEGER NOT NULL, started_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError("Ledger is closed")
+        return self._conn
+
+    def begin_run(self, job_id: str) -> int:
+        """Start the next run of `job_id` and return its number (1 for a new job)."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO clx_jobs VALUES (?, 1, ?, NULL) ON CONFLICT (job_id) DO UPDATE "
+                "SET run = run + 1, started_at = excluded.started_at, finished_at = NULL",
+                (job_id, time.time()),
+            )
+            (run,) = conn.execute("SELECT run FROM clx_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            conn.commit()
+            return int(run)
+
+    def finish_run(self, job_id: str, run: int) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE clx_jobs SET finished_at = ? WHERE job_id = ? AND run = ?",
+                (time.time(), job_id, run),
+            )
+            conn.commit()
+
+    def lookup(self, job_id: str, row_keys: Sequence[RowKey]) -> Dict[RowKey, Tuple[str, str]]:
+        """Map each recorded key of `row_keys` to its (input_hash, status)."""
+        found: Dict[RowKey, Tuple[str, str]] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(row_keys), _LOOKUP_CHUNK):
+                chunk = row_keys[start : start + _LOOKUP_CHUNK]
+                marks = ", ".join("?" * len(chunk))
+                for row_key, digest, status in conn.execute(
+                    "SELECT row_key, input_hash, status FROM clx_ledger "
+                    f"WHERE job_id = ? AND row_key IN ({marks})",
+                    (job_id, *chunk),
+                ):
+                    found[row_key] = (digest, status)
+        return found
+
+    def touch(self, job_id: str, run: int, row_keys: Iterable[RowKey]) -> None:
+        """Mark unchanged rows as seen by `run`, so `prune` keeps them."""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE clx_ledger SET run = ? WHERE job_id = ? AND row_key = ?",
+                [(run, job_id, row_key) for row_key in row_keys],
+            )
+            conn.commit()
+
+    def record_many(
+        self,
+        job_id: str,
+        run: int,
+        items: Iterable[Tuple[RowKey, str, Optional[str], str, Optional[str]]],
+    ) -> None:
+        """Store (row_key, input_hash, output, status, error) results in one transaction."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO clx_ledger VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, row_key, digest, output, status, error, run, now)
+                    for row_key, digest, output, status, error in items
+                ],
+            )
+            conn.commit()
+
+    def prune(self, job_id: str, run: int) -> int:
+        """Delete rows of `job_id` not seen by `run` (gone from the source). Returns the count."""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "DELETE FROM clx_ledger WHERE job_id = ? AND run < ?", (job_id, run)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def results(
+        self, job_id: str, *, status: Optional[str] = None
+    ) -> List[Tuple[RowKey, Optional[str], str, Optional[str], float]]:
+        """(row_key, output, status, error, updated_at) rows of `job_id`, optionally by status."""
+        if status is not None and status not in STATUSES:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+        query = "SELECT row_key, output, status, error, updated_at FROM clx_ledger WHERE job_id = ?"
+        args: Tuple[Any, ...] = (job_id,)
+        if status is not None:
+            query += " AND status = ?"
+            args += (status,)
+        with self._lock:
+            return self._connection().execute(query, args).fetchall()
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Each job's last run number, timestamps and row counts by status."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT j.job_id, j.run, j.started_at, j.finished_at, "
+                "COUNT(l.row_key), COALESCE(SUM(l.status = 'ok'), 0), "
+                "COALESCE(SUM(l.status = 'error'), 0) "
+                "FROM clx_jobs j LEFT JOIN clx_ledger l ON l.job_id = j.job_id "
+                "GROUP BY j.job_id ORDER BY j.job_id"
+            ).fetchall()
+        return [
+            {
+                "job_id": job_id,
+                "run": run,
+                "started_at": started_at,
+                "finished_at": finished_at,
+                "rows": count,
+                "ok": ok,
+                "error": errors,
+            }
+            for job_id, run, started_at, finished_at, count, ok, errors in rows
+        ]
+
+    def delete_job(self, job_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM clx_ledger WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM clx_jobs WHERE job_id = ?", (job_id,))
+            conn.commit()
+
+    def export(self, connection: Any, job_id: str, table: str = "clx_job_results") -> int:
+        """
+        Replace `table` in a SQLite or DuckDB `connection` with the results of
+        `job_id`: (row_key, output, status, error, updated_at). `row_key` is a
+        BIGINT column when every key is an int, VARCHAR otherwise, so it joins
+        against the source table's key column. Returns the number of rows.
+        """
+        # Lazily import to keep the SQL helpers out of plain ledger use
+        from .adapters._batch import quote_identifier
+
+        rows = self.results(job_id)
+        integer_keys = all(isinstance(row[0], int) for row in rows)
+        if not integer_keys:
+            rows = [(str(row[0]), *row[1:]) for row in rows]
+        target = quote_identifier(table)
+        connection.execute(f"DROP TABLE IF EXISTS {target}")
+        connection.execute(
+            f"CREATE TABLE {target} (row_key {'BIGINT' if integer_keys else 'VARCHAR'}, "
+            "output VARCHAR, status VARCHAR NOT NULL, error VARCHAR, "
+            "updated_at DOUBLE NOT NULL)"
+        )
+        if rows:
+            connection.executemany(f"INSERT INTO {target} VALUES (?, ?, ?, ?, ?)", rows)
+        if isinstance(connection, sqlite3.Connection):
+            connection.commit()
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self) -> "Ledger":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+
+@dataclass
+class JobStats:
+    run: int = 0
+    rows: int = 0
+    unchanged: int = 0
+    sent: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+
+def run_job(
+    ledger: Ledger,
+    job_id: str,
+    rows: Iterable[JobRow],
+    *,
+    expect_json: bool = False,
+    max_concurrency: int = 8,
+    chunk_size: int = 256,
+    retry_failed: bool = True,
+    prune: bool = False,
+    **query_kwargs: Any,
+) -> JobStats:
+    """
+    Bring the ledger of `job_id` up to date with `rows`, sending only the delta.
+
+    Rows whose input hash matches the ledger are left alone. New and changed
+    rows (and, with `retry_failed`, rows that failed before) are resolved
+    through `clx_query_many`'s engine, one chunk at a time, and each chunk's
+    results are committed before the next chunk starts. Failures are recorded
+    per row rather than raised. Rows with a NULL model or prompt are skipped.
+
+    Args:
+        ledger: Where results are recorded.
+        job_id: Stable name of the job; reruns must reuse it.
+        rows: (row_key, model, prompt, params) tuples with unique str or int keys.
+        expect_json: Parse outputs as JSON. They are stored as JSON text.
+        max_concurrency: Maximum number of in-flight backend requests.
+        chunk_size: Rows resolved and committed together; at most one chunk
+            of work is lost in a crash (none with a cache).
+        retry_failed: Resend rows whose last attempt failed.
+        prune: Delete ledger rows whose keys are no longer in `rows`. Only
+            use it when `rows` is the complete source.
+
+    Other keyword arguments (`backend_url`, `cache`, `client`, `timeout`, ...)
+    are passed to every query.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    stats = JobStats(run=ledger.begin_run(job_id))
+    chunk: List[JobRow] = []
+
+    def _flush() -> None:
+        # Later duplicates of a key within a chunk win.
+        todo: Dict[RowKey, Tuple[str, str, Dict[str, Any], str]] = {}
+        for row_key, model, prompt, params in chunk:
+            if model is None or prompt is None:
+                stats.skipped += 1
+                continue
+            digest = input_hash(model, prompt, params, expect_json)
+            todo[_check_key(row_key)] = (model, prompt, params or {}, digest)
+        chunk.clear()
+        known = ledger.lookup(job_id, list(todo))
+        unchanged = [
+            row_key
+            for row_key, (_, _, _, digest) in todo.items()
+            if row_key in known
+            and known[row_key][0] == digest
+            and (known[row_key][1] == "ok" or not retry_failed)
+        ]
+        for row_key in unchanged:
+            del todo[row_key]
+        ledger.touch(job_id, stats.run, unchanged)
+        stats.rows += len(unchanged) + len(todo)
+        stats.unchanged += len(unchanged)
+        if not todo:
+            return
+
+        outputs = _query_many(
+            [(model, prompt, params) for model, prompt, params, _ in todo.values()],
+            expect_json=expect_json,
+            max_concurrency=max_concurrency,
+            return_exceptions=True,
+            **query_kwargs,
+        )
+        records = []
+        for (row_key, (_, _, _, digest)), output in zip(todo.items(), outputs):
+            if isinstance(output, Exception):
+                error = f"{type(output).__name__}: {output}"
+                records.append((row_key, digest, None, "error", error))
+                stats.failed += 1
+            else:
+                text = json.dumps(output) if expect_json else str(output)
+                records.append((row_key, digest, text, "ok", None))
+                stats.succeeded += 1
+        ledger.record_many(job_id, stats.run, records)
+        stats.sent += len(todo)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _flush()
+    _flush()
+
+    cache = query_kwargs.get("cache")
+    if cache is not None:
+        cache.flush()
+    if prune:
+        stats.removed = ledger.prune(job_id, stats.run)
+    ledger.finish_run(job_id, stats.run)
+    return stats
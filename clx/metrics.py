@@ -0,0 +1,395 @@
+"""
+Opt-in instrumentation for the query hot path.
+
+Nothing is recorded until `enable_metrics()` installs a `Metrics` registry;
+while disabled, the hot path only reads one module attribute per call.
+Once enabled, every `clx_query` records stage timings (cache lookup,
+payload build, connect, time-to-first-byte, JSON decode, total), the cache
+outcome, retries, bytes on the wire and in-flight requests, labelled by
+model and backend path. Read them with `Metrics.snapshot()`, render them
+with `Metrics.to_prometheus()`, or subscribe with `Metrics.add_hook()`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+STAGES = ("cache_lookup", "payload_build", "connect", "ttfb", "decode", "total")
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+_COUNTERS = (
+    "requests",
+    "errors",
+    "cache_hits",
+    "cache_misses",
+    "retries",
+    "bytes_sent",
+    "bytes_received",
+)
+
+
+@dataclass
+class QueryTrace:
+    """
+    One `clx_query` call, passed to hooks when it finishes.
+
+    Args:
+        model: Model name.
+        path: Backend path the query was routed to.
+        cache: "hit", "stale", "miss", or None when no cache was used.
+        timings: Seconds spent per stage (see `STAGES`).
+        retries: Retried backend attempts.
+        bytes_sent: Request body bytes, summed over attempts.
+        bytes_received: Response body bytes.
+        error: "ExceptionType: message" if the call raised.
+    """
+
+    model: str
+    path: str
+    cache: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    error: Optional[str] = None
+    _started: float = field(default=0.0, repr=False)
+    _previous: Optional["QueryTrace"] = field(default=None, repr=False)
+
+    def time(self, stage: str) -> "_StageTimer":
+        return _StageTimer(self, stage)
+
+
+class _StageTimer:
+    __slots__ = ("trace", "stage", "started")
+
+    def __init__(self, trace: QueryTrace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        timings = self.trace.timings
+        timings[self.stage] = timings.get(self.stage, 0.0) + time.perf_counter() - self.started
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "total", "count", "max")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+
+class _Series:
+    def __init__(self, bounds: Sequence[float]):
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+        self.in_flight = 0
+        self.histograms = {stage: _Histogram(bounds) for stage in STAGES}
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency histograms keyed by (model, path).
+
+    Args:
+        buckets: Histogram bucket upper bounds, in seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._hooks: List[Callable[[QueryTrace], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[QueryTrace], None]) -> None:
+        """Call `hook(trace)` after every query. Hooks run on the querying thread."""
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: Callable[[QueryTrace], None]) -> None:
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series = {}
+
+    def _get_series(self, model: str, path: str) -> _Series:
+        # Caller holds the lock.
+        series = self._series.get((model, path))
+        if series is None:
+            series = self._series[(model, path)] = _Series(self.buckets)
+        return series
+
+    def start(self, model: str, path: str) -> QueryTrace:
+        """Begin tracing a query on this thread; pair with `finish`."""
+        trace = QueryTrace(model=model, path=_path_label(path))
+        trace._previous = getattr(_local, "trace", None)
+        trace._started = time.perf_counter()
+        _local.trace = trace
+        return trace
+
+    def finish(self, trace: QueryTrace, error: Optional[BaseException] = None) -> None:
+        trace.timings["total"] = time.perf_counter() - trace._started
+        if error is not None:
+            trace.error = f"{type(error).__name__}: {error}"
+        _local.trace = trace._previous
+        trace._previous = None
+
+        with self._lock:
+            series = self._get_series(trace.model, trace.path)
+            counters = series.counters
+            counters["requests"] += 1
+            if trace.error is not None:
+                counters["errors"] += 1
+            if trace.cache == "miss":
+                counters["cache_misses"] += 1
+            elif trace.cache is not None:
+                counters["cache_hits"] += 1
+            for stage in ("cache_lookup", "payload_build", "decode", "total"):
+                if stage in trace.timings:
+                    series.histograms[stage].observe(trace.timings[stage])
+            hooks = self._hooks
+
+        for hook in hooks:
+            hook(trace)
+
+    def record_http(
+        self,
+        model: Optional[str],
+        endpoint: str,
+        *,
+        connect: Optional[float],
+        ttfb: Optional[float],
+        retries: int,
+        bytes_sent: int,
+        bytes_received: int,
+    ) -> None:
+        """Record one backend exchange (all attempts) made by a `Client`."""
+        label = model or ""
+        path = _path_label(endpoint)
+        with self._lock:
+            series = self._get_series(label, path)
+            counters = series.counters
+            counters["retries"] += retries
+            counters["bytes_sent"] += bytes_sent
+            counters["bytes_received"] += bytes_received
+            if connect is not None:
+                series.histograms["connect"].observe(connect)
+            if ttfb is not None:
+                series.histograms["ttfb"].observe(ttfb)
+
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.retries += retries
+            trace.bytes_sent += bytes_sent
+            trace.bytes_received += bytes_received
+            if connect is not None:
+                trace.timings["connect"] = trace.timings.get("connect", 0.0) + connect
+            if ttfb is not None:
+                trace.timings["ttfb"] = ttfb
+
+    def count(self, model: str, path: str, **increments: int) -> None:
+        """Add to counters directly, e.g. `count(model, path, requests=3, cache_hits=3)`."""
+        with self._lock:
+            counters = self._get_series(model, _path_label(path)).counters
+            for name, value in increments.items():
+                counters[name] += value
+
+    def add_in_flight(self, model: Optional[str], endpoint: str, delta: int) -> None:
+        with self._lock:
+            self._get_series(model or "", _path_label(endpoint)).in_flight += delta
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return one dict per (model, path) with counters, hit rate and stage timings."""
+        with self._lock:
+            rows = []
+            for (model, path), series in sorted(self._series.items()):
+                counters = dict(series.counters)
+                lookups = counters["cache_hits"] + counters["cache_misses"]
+                timings = {
+                    stage: {
+                        "count": hist.count,
+                        "sum": hist.total,
+                        "mean": hist.total / hist.count,
+                        "p50": hist.quantile(0.5),
+                        "p99": hist.quantile(0.99),
+                        "max": hist.max,
+                    }
+                    for stage, hist in series.histograms.items()
+                    if hist.count
+                }
+                rows.append(
+                    {
+                        "model": model,
+                        "path": path,
+                        **counters,
+                        "cache_hit_rate": counters["cache_hits"] / lookups if lookups else None,
+                        "in_flight": series.in_flight,
+                        "timings": timings,
+                    }
+                )
+            return rows
+
+    def to_prometheus(self, prefix: str = "clx") -> str:
+        """Render all series in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._series.items())
+            for name in _COUNTERS:
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (model, path), series in items:
+                    labels = _labels(model=model, path=path)
+                    lines.append(f"{metric}{{{labels}}} {series.counters[name]}")
+
+            metric = f"{prefix}_in_flight"
+            lines.append(f"# TYPE {metric} gauge")
+            for (model, path), series in items:
+                lines.append(f"{metric}{{{_labels(model=model, path=path)}}} {series.in_flight}")
+
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (model, path), series in items:
+                for stage, hist in series.histograms.items():
+                    if not hist.count:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(hist.bounds, hist.counts):
+                        cumulative += bucket_count
+                        labels = _labels(model=model, path=path, stage=stage, le=repr(bound))
+                        lines.append(f"{metric}_bucket{{{labels}}} {cumulative}")
+                    labels = _labels(model=model, path=path, stage=stage, le="+Inf")
+                    lines.append(f"{metric}_bucket{{{labels}}} {hist.count}")
+                    labels = _labels(model=model, path=path, stage=stage)
+                    lines.append(f"{metric}_sum{{{labels}}} {hist.total!r}")
+                    lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _path_label(path: str) -> str:
+    if path.startswith("http://") or path.startswith("https://"):
+        return urlsplit(path).path or "/"
+    return "/" + path.lstrip("/")
+
+
+_local = threading.local()
+_active: Optional[Metrics] = None
+
+
+def enable_metrics(metrics: Optional[Metrics] = None) -> Metrics:
+    """Start recording into `metrics` (a fresh registry by default) and return it."""
+    global _active
+    _active = metrics or Metrics()
+    return _active
+
+
+def disable_metrics() -> None:
+    global _active
+    _active = None
+
+
+def get_metrics() -> Optional[Metrics]:
+    """Return the active registry, or None while metrics are disabled."""
+    return _active
+
+
+def take_connect_time() -> Optional[float]:
+    """Pop the time spent opening a connection on this thread since the last call."""
+    seconds = getattr(_local, "connect", None)
+    _local.connect = None
+    return seconds
+
+
+def note_connect_time(seconds: float) -> None:
+    if _active is not None:
+        _local.connect = (getattr(_local, "connect", None) or 0.0) + seconds
+
+
+def serve_prometheus(
+    port: int = 9464, host: str = "127.0.0.1", metrics: Optional[Metrics] = None
+) -> Any:
+    """
+    Serve `/metrics` from a daemon thread and return the `HTTPServer`.
+
+    Args:
+        port: Port to listen on (0 picks a free one).
+        host: Interface to bind.
+        metrics: Registry to expose. Defaults to whichever is active per scrape.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server API
+            registry = metrics or _active
+            if self.path.split("?")[0] != "/metrics" or registry is None:
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="clx-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,432 @@
+"""
+Client-side rate limiting and backpressure toward the backend.
+
+A `RateLimiter` attached to a `Client` (or an `AsyncClient`) paces requests per backend (and,
+optionally, per model) with token buckets for requests/sec and tokens/sec,
+and adapts the number of in-flight requests with AIMD: every success grows
+the limit additively, every 429/503 or over-target latency halves it. A
+`Retry-After` answer pauses every caller of that backend until it expires,
+so a saturated backend is not stampeded by retries.
+"""
+
+from __future__ import annotations
+
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+CONGESTION_STATUSES = (429, 503)
+_CHARS_PER_TOKEN = 4
+_MAX_TOKENS_PARAMS = ("max_tokens", "max_new_tokens", "max_output_tokens")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds from a `Retry-After` header (seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def estimate_cost(payload: Any) -> Tuple[Optional[str], int]:
+    """
+    Return `(model, tokens)` for a query or batch payload.
+
+    Tokens are estimated from the prompt length (about four characters per
+    token) plus any `max_tokens`-style param. A batch mixing models reports
+    no model, so only the backend-wide limits apply to it.
+    """
+    if not isinstance(payload, dict):
+        return None, 0
+    items = payload.get("items")
+    if isinstance(items, list):
+        models = {item.get("model") for item in items if isinstance(item, dict)}
+        tokens = sum(estimate_cost(item)[1] for item in items)
+        return (models.pop() if len(models) == 1 else None), tokens
+
+    text = payload.get("prompt")
+    if text is None:
+        messages = payload.get("messages") or []
+        text = "".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+    tokens = len(str(text or "")) // _CHARS_PER_TOKEN + 1
+    params = payload.get("params")
+    if isinstance(params, dict):
+        for name in _MAX_TOKENS_PARAMS:
+            if isinstance(params.get(name), (int, float)):
+                tokens += int(params[name])
+                break
+    model = payload.get("model")
+    return (model if isinstance(model, str) else None), tokens
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` per second, holding at most `capacity`.
+
+    `acquire` reserves tokens up front and sleeps off any debt, so a request
+    larger than the bucket still goes through once its share of time passes.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens and return how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, amount: float = 1.0) -> None:
+        delay = self.reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit adjusted by additive increase / multiplicative decrease.
+
+    Args:
+        max_concurrency: Upper bound for the limit.
+        min_concurrency: Lower bound for the limit.
+        initial_concurrency: Starting limit (defaults to `max_concurrency`).
+        decrease_factor: Multiplier applied on congestion.
+        increase: Amount the limit grows per limit's worth of successes.
+        latency_target: Responses slower than this many seconds count as congestion.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        *,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[int] = None,
+        decrease_factor: float = 0.5,
+        increase: float = 1.0,
+        latency_target: Optional[float] = None,
+    ):
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("need 1 <= min_concurrency <= max_concurrency")
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.increase = increase
+        self.latency_target = latency_target
+        start = initial_concurrency if initial_concurrency is not None else max_concurrency
+        self._limit = float(min(max(start, min_concurrency), max_concurrency))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> float:
+        """Block until a slot is free; return the start time to pass to `release`."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def try_acquire(self) -> Optional[float]:
+        """Take a slot if one is free; return the start time, or None without waiting."""
+        with self._cond:
+            if self._in_flight >= int(self._limit):
+                return None
+            self._in_flight += 1
+        return time.monotonic()
+
+    async def acquire_async(self) -> float:
+        """`acquire` for asyncio callers: polls with `asyncio.sleep` instead of blocking."""
+        import asyncio
+
+        delay = 0.005
+        while True:
+            started = self.try_acquire()
+            if started is not None:
+                return started
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def cancel(self) -> None:
+        """Give back a slot whose request was never sent or was abandoned; the limit stays."""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, started: float, *, congested: bool = False) -> None:
+        now = time.monotonic()
+        if self.latency_target is not None and now - started > self.latency_target:
+            congested = True
+        with self._cond:
+            self._in_flight -= 1
+            if congested:
+                # Requests already in flight when the limit dropped report the same
+                # congestion episode; only cut once per episode.
+                if started >= self._last_decrease:
+                    self._limit = max(self.min_concurrency, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self._limit = min(self.max_concurrency, self._limit + self.increase / self._limit)
+            self._cond.notify_all()
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Limits applied to one backend or model. Unset fields are not enforced.
+
+    Args:
+        requests_per_second: Sustained request rate.
+        tokens_per_second: Sustained rate of estimated prompt + completion tokens.
+        burst_seconds: Bucket capacity, in seconds' worth of the sustained rate.
+        max_concurrency: Enables AIMD concurrency control with this ceiling.
+        min_concurrency: Floor for the AIMD limit.
+        initial_concurrency: Starting AIMD limit (defaults to `max_concurrency`).
+        latency_target: Seconds; slower responses shrink the concurrency limit.
+    """
+
+    requests_per_second: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    burst_seconds: float = 1.0
+    max_concurrency: Optional[int] = None
+    min_concurrency: int = 1
+    initial_concurrency: Optional[int] = None
+    latency_target: Optional[float] = None
+
+
+class _Gate:
+    def __init__(self, limit: RateLimit):
+        self.requests = (
+            TokenBucket(
+                limit.requests_per_second,
+                max(1.0, limit.requests_per_second * limit.burst_seconds),
+            )
+            if limit.requests_per_second
+            else None
+        )
+        self.tokens = (
+            TokenBucket(limit.tokens_per_second, limit.tokens_per_second * limit.burst_seconds)
+            if limit.tokens_per_second
+            else None
+        )
+        self.concurrency = (
+            AIMDLimiter(
+                limit.max_concurrency,
+                min_concurrency=min(limit.min_concurrency, limit.max_concurrency),
+                initial_concurrency=limit.initial_concurrency,
+                latency_target=limit.latency_target,
+            )
+            if limit.max_concurrency
+            else None
+        )
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_unpaused(self) -> None:
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    async def wait_unpaused_async(self) -> None:
+        import asyncio
+
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+class Permit:
+    """A granted request slot. Call `release` with the outcome once the response arrives."""
+
+    def __init__(self, gates: List[_Gate], starts: List[Optional[float]]):
+        self._gates = gates
+        self._starts = starts
+        self._released = False
+
+    def release(
+        self,
+        status: Optional[int] = None,
+        *,
+        retry_after: Optional[float] = None,
+        failed: bool = False,
+        cancelled: bool = False,
+    ) -> None:
+        """
+        Args:
+            status: HTTP status of the response, if one was received.
+            retry_after: Seconds from a `Retry-After` header; pauses the gates.
+            failed: The request raised (timeout, connection reset) before a response.
+            cancelled: The request was never sent or was abandoned (task
+                cancellation, interrupt). Frees the slots without counting the
+                outcome as a success or as congestion.
+        """
+        if self._released:
+            return
+        self._released = True
+        congested = failed or status in CONGESTION_STATUSES
+        for gate, started in zip(self._gates, self._starts):
+            if gate.concurrency is None or started is None:
+                continue
+            if cancelled:
+                gate.concurrency.cancel()
+                continue
+            if congested and retry_after:
+                gate.pause(retry_after)
+            gate.concurrency.release(started, congested=congested)
+
+
+class RateLimiter:
+    """
+    Per-backend and per-model limits shared by every request a `Client` sends.
+
+    Pass the same limiter to an `AsyncClient` to pace `aclx_query` and the
+    async task helpers; its waits use `asyncio.sleep` and do not block the loop.
+
+    Args:
+        default: Limits for any backend not listed in `backends`.
+        backends: Limits keyed by backend base URL (e.g. "https://api.example.com").
+        models: Limits keyed by model name, applied per backend in addition to
+            the backend's own limits.
+
+    Example:
+        limiter = RateLimiter(
+            RateLimit(requests_per_second=50, max_concurrency=64),
+            models={"meta-llama3": RateLimit(tokens_per_second=20_000)},
+        )
+        set_default_client(Client(rate_limiter=limiter))
+    """
+
+    def __init__(
+        self,
+        default: Optional[RateLimit] = None,
+        *,
+        backends: Optional[Mapping[str, RateLimit]] = None,
+        models: Optional[Mapping[str, RateLimit]] = None,
+    ):
+        self.default = default
+        self.backends = {_base_url(url): limit for url, limit in (backends or {}).items()}
+        self.models = dict(models or {})
+        self._gates: Dict[Tuple[str, Optional[str]], Optional[_Gate]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Limits are enforced per process; gates and locks are rebuilt after unpickling.
+        return {"default": self.default, "backends": self.backends, "models": self.models}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    def _gate(self, base: str, model: Optional[str]) -> Optional[_Gate]:
+        key = (base, model)
+        try:
+            return self._gates[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._gates:
+                if model is None:
+                    limit = self.backends.get(base, self.default)
+                else:
+                    limit = self.models.get(model)
+                self._gates[key] = _Gate(limit) if limit is not None else None
+            return self._gates[key]
+
+    def _gates_for(self, endpoint: str, model: Optional[str]) -> List[_Gate]:
+        base = _base_url(endpoint)
+        candidates = [self._gate(base, None)]
+        if model is not None:
+            candidates.append(self._gate(base, model))
+        return [gate for gate in candidates if gate is not None]
+
+    def acquire(self, endpoint: str, *, model: Optional[str] = None, tokens: int = 0) -> Permit:
+        """Block until `endpoint` (and `model`, if limited) may take another request."""
+        gates = self._gates_for(endpoint, model)
+        starts: List[Optional[float]] = []
+        try:
+            for gate in gates:
+                gate.wait_unpaused()
+                starts.append(gate.concurrency.acquire() if gate.concurrency else None)
+            for gate in gates:
+                if gate.requests is not None:
+                    gate.requests.acquire(1)
+                if gate.tokens is not None and tokens:
+                    gate.tokens.acquire(tokens)
+        except BaseException:
+            Permit(gates[: len(starts)], starts).release(cancelled=True)
+            raise
+        return Permit(gates, starts)
+
+    async def acquire_async(
+        self, endpoint: str, *, model: Optional[str] = None, tokens: int = 0
+    ) -> Permit:
+        """`acquire` for asyncio callers: waits without blocking the event loop."""
+        import asyncio
+
+        gates = self._gates_for(endpoint, model)
+        starts: List[Optional[float]] = []
+        try:
+            for gate in gates:
+                await gate.wait_unpaused_async()
+                starts.append(await gate.concurrency.acquire_async() if gate.concurrency else None)
+            for gate in gates:
+                if gate.requests is not None:
+                    await asyncio.sleep(gate.requests.reserve(1))
+                if gate.tokens is not None and tokens:
+                    await asyncio.sleep(gate.tokens.reserve(tokens))
+        except BaseException:
+            Permit(gates[: len(starts)], starts).release(cancelled=True)
+            raise
+        return Permit(gates, starts)
+
+    def concurrency(self, endpoint: str, *, model: Optional[str] = None) -> Optional[int]:
+        """Current AIMD limit for `endpoint` (or its `model` gate), if one is configured."""
+        gate = self._gate(_base_url(endpoint), model)
+        return gate.concurrency.limit if gate and gate.concurrency else None
+
+
+def _base_url(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
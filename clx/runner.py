@@ -0,0 +1,291 @@
+"""
+Streaming batch runner behind `python -m clx run`.
+
+Prompts are read lazily from JSONL, CSV, Parquet or plain-text input, sent
+through a bounded worker pool, and written to JSONL as they finish. Only a
+fixed window of rows is held in memory, and the output file doubles as the
+checkpoint: re-running with `resume=True` skips rows already written and
+retries the rows that failed.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Deque, Dict, Iterator, Optional, Set, Tuple, Union
+
+from .cache import CacheBackend
+from .core import clx_query
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .client import Client
+
+FORMATS = ("jsonl", "csv", "parquet", "text")
+_EXTENSIONS = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "jsonl",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".txt": "text",
+}
+
+
+def detect_format(path: Optional[str]) -> str:
+    if not path or path == "-":
+        return "jsonl"
+    return _EXTENSIONS.get(Path(path).suffix.lower(), "jsonl")
+
+
+def _open_text(path: Optional[str]) -> IO[str]:
+    if not path or path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_records(
+    path: Optional[str], fmt: str, *, batch_size: int = 1024
+) -> Iterator[Dict[str, Any]]:
+    """Yield input rows one at a time as dicts. `path` of None or "-" reads stdin."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+    if fmt == "parquet":
+        # Lazily import to avoid hard dependency
+        import pyarrow.parquet as pq  # type: ignore
+
+        source: Any = sys.stdin.buffer if not path or path == "-" else path
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+
+    with _open_text(path) as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+        elif fmt == "text":
+            for line in handle:
+                line = line.rstrip("\r\n")
+                if line:
+                    yield {"prompt": line}
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"Invalid JSON on input line {line_number}") from exc
+                yield record if isinstance(record, dict) else {"prompt": record}
+
+
+@dataclass
+class Checkpoint:
+    """Rows already present in an output file: a contiguous prefix plus stragglers."""
+
+    watermark: int = 0
+    done: Set[int] = field(default_factory=set)
+
+    def add(self, index: int) -> None:
+        if index < self.watermark:
+            return
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.discard(self.watermark)
+            self.watermark += 1
+
+    def contains(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+
+def load_checkpoint(path: Union[str, Path]) -> Checkpoint:
+    """
+    Scan an existing output file and return the rows it already holds.
+
+    A trailing partial line (from a crash mid-write) is truncated away. Rows
+    that failed are not counted as done, so a resumed run retries them; their
+    error lines are removed from the file so each row ends up once. The
+    straggler set stays small because rows complete at most one in-flight
+    window out of order.
+    """
+    checkpoint = Checkpoint()
+    output_path = Path(path)
+    if not output_path.exists():
+        return checkpoint
+
+    good_offset = 0
+    failed = 0
+    with output_path.open("r+b") as handle:
+        for raw in handle:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            index = record.get("index") if isinstance(record, dict) else None
+            if isinstance(index, int):
+                if "error" in record:
+                    failed += 1
+                else:
+                    checkpoint.add(index)
+            good_offset += len(raw)
+        handle.truncate(good_offset)
+    if failed:
+        _drop_failed_rows(output_path)
+    return checkpoint
+
+
+def _drop_failed_rows(path: Path) -> None:
+    # Rewrite next to the original and swap it in, so a crash leaves one intact copy.
+    temp_path = path.with_name(path.name + ".resume")
+    with path.open("rb") as source, temp_path.open("wb") as target:
+        for raw in source:
+            record = json.loads(raw)
+            if not (isinstance(record, dict) and "error" in record):
+                target.write(raw)
+    os.replace(temp_path, path)
+
+
+@dataclass
+class RunStats:
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+def _row_request(
+    record: Dict[str, Any],
+    *,
+    model: Optional[str],
+    params: Dict[str, Any],
+    prompt_field: str,
+    model_field: str,
+    params_field: str,
+) -> Tuple[str, str, Dict[str, Any]]:
+    prompt = record.get(prompt_field)
+    if prompt is None:
+        raise ValueError(f"Row has no '{prompt_field}' field")
+    row_model = record.get(model_field) or model
+    if not row_model:
+        raise ValueError(f"Row has no '{model_field}' field and no default model was given")
+    row_params = dict(params)
+    raw_params = record.get(params_field)
+    if isinstance(raw_params, str) and raw_params.strip():
+        raw_params = json.loads(raw_params)
+    if isinstance(raw_params, dict):
+        row_params.update(raw_params)
+    return str(row_model), str(prompt), row_params
+
+
+def run_batch(
+    records: Iterator[Dict[str, Any]],
+    output: IO[str],
+    *,
+    model: Optional[str] = None,
+    params: Optional[Dict[str, Any]] = None,
+    prompt_field: str = "prompt",
+    model_field: str = "model",
+    params_field: str = "params",
+    id_field: Optional[str] = None,
+    concurrency: int = 8,
+    ordered: bool = True,
+    checkpoint: Optional[Checkpoint] = None,
+    cache: Optional[CacheBackend] = None,
+    client: Optional[Client] = None,
+    **query_kwargs: Any,
+) -> RunStats:
+    """
+    Run every record through `clx_query` and write one JSON line per row.
+
+    Each output line is `{"index": n, "output": ...}` or `{"index": n,
+    "error": "..."}`, plus `"id"` when `id_field` is given. With
+    `ordered=True` lines follow input order. Otherwise they are written as
+    they complete. At most `concurrency * 4` rows are held in memory at once.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    base_params = params or {}
+    stats = RunStats()
+    window = concurrency * 4
+    inflight: Deque[Tuple[Future, int, Any]] = deque()
+
+    def _query(record: Dict[str, Any]) -> Any:
+        row_model, prompt, row_params = _row_request(
+            record,
+            model=model,
+            params=base_params,
+            prompt_field=prompt_field,
+            model_field=model_field,
+            params_field=params_field,
+        )
+        return clx_query(row_model, prompt, row_params, cache=cache, client=client, **query_kwargs)
+
+    def _write(future: Future, index: int, row_id: Any) -> None:
+        line: Dict[str, Any] = {"index": index}
+        if id_field is not None:
+            line["id"] = row_id
+        try:
+            line["output"] = future.result()
+            stats.succeeded += 1
+        except Exception as exc:  # noqa: BLE001 - recorded per row
+            line["error"] = f"{type(exc).__name__}: {exc}"
+            stats.failed += 1
+        output.write(json.dumps(line, ensure_ascii=False) + "\n")
+        output.flush()
+
+    def _drain(block_until: int) -> None:
+        while len(inflight) > block_until:
+            if ordered:
+                _write(*inflight.popleft())
+                continue
+            finished, _ = wait([item[0] for item in inflight], return_when=FIRST_COMPLETED)
+            for item in [item for item in inflight if item[0] in finished]:
+                inflight.remove(item)
+                _write(*item)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="clx-run") as pool:
+        for index, record in enumerate(records):
+            if checkpoint is not None and checkpoint.contains(index):
+                stats.skipped += 1
+                continue
+            row_id = record.get(id_field) if id_field is not None else None
+            inflight.append((pool.submit(_query, record), index, row_id))
+            stats.submitted += 1
+            _drain(window - 1)
+        _drain(0)
+
+    if cache is not None:
+        cache.flush()
+    return stats
+
+
+def run_file(
+    input_path: Optional[str],
+    output_path: Optional[str],
+    *,
+    fmt: Optional[str] = None,
+    resume: bool = False,
+    **kwargs: Any,
+) -> RunStats:
+    """Open input/output (stdin/stdout for None or "-") and call `run_batch`."""
+    records = read_records(input_path, fmt or detect_format(input_path))
+    if not output_path or output_path == "-":
+        return run_batch(records, sys.stdout, **kwargs)
+
+    checkpoint = load_checkpoint(output_path) if resume else None
+    mode = "a" if resume else "w"
+    parent = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(parent, exist_ok=True)
+    with open(output_path, mode, encoding="utf-8") as output:
+        return run_batch(records, output, checkpoint=checkpoint, **kwargs)
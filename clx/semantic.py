@@ -0,0 +1,330 @@
+"""
+Semantic (near-duplicate) result cache for idempotent task helpers.
+
+`Cache` only matches byte-identical requests. A `SemanticCache` embeds the
+variable text of a task (the text to classify, the pair to compare, ...) and
+answers a query with a cached result whose text is similar enough, measured
+by cosine similarity in a NumPy nearest-neighbour index. Entries are grouped
+by scope (model, backend, params and task template), so a match never crosses
+label sets, schemas or models.
+
+    from clx import SemanticCache, clx_classify
+
+    semantic = SemanticCache(threshold=0.95, path="~/.clx_semantic.db")
+    clx_classify("meta-llama3", text, ["news", "sports"], semantic=semantic)
+
+Only use it where near-identical inputs must give the same answer.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# An embedder maps a batch of texts to a (len(texts), dim) array-like of floats.
+Embedder = Callable[[Sequence[str]], Any]
+
+_WHITESPACE = re.compile(r"\s+")
+_LOOKUP_CHUNK = 256
+
+
+def _numpy() -> Any:
+    # Lazily import to avoid hard dependency
+    try:
+        import numpy  # type: ignore
+    except ModuleNotFoundError as exc:  # pragma: no cover
+        raise ImportError(
+            "clx semantic caching requires numpy: pip install clx-cli[semantic]"
+        ) from exc
+    return numpy
+
+
+class HashingEmbedder:
+    """
+    Local embedder: signed feature hashing of character n-grams.
+
+    Text is lower-cased and whitespace-collapsed first, so formatting changes
+    embed identically; reordered fields or small edits keep most n-grams and
+    stay close. Deterministic across processes, so vectors can be persisted.
+
+    Args:
+        dim: Vector size.
+        ngram: Characters per n-gram.
+        lowercase: Fold case before hashing.
+    """
+
+    def __init__(self, dim: int = 1024, ngram: int = 3, lowercase: bool = True):
+        if dim < 1 or ngram < 1:
+            raise ValueError("dim and ngram must be at least 1")
+        self.dim = dim
+        self.ngram = ngram
+        self.lowercase = lowercase
+        self.name = f"hashing-{dim}-{ngram}{'-lower' if lowercase else ''}"
+
+    def __call__(self, texts: Sequence[str]) -> Any:
+        np = _numpy()
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = _WHITESPACE.sub(" ", text).strip()
+            if self.lowercase:
+                text = text.lower()
+            data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+            if data.size < self.ngram:
+                data = np.pad(data, (0, self.ngram - data.size))
+            count = data.size - self.ngram + 1
+            hashes = np.zeros(count, dtype=np.uint64)
+            for offset in range(self.ngram):
+                hashes = hashes * np.uint64(1000003) + data[offset : offset + count]
+            # splitmix64 finalizer spreads the polynomial hash over all bits.
+            hashes ^= hashes >> np.uint64(31)
+            hashes *= np.uint64(0xBF58476D1CE4E5B9)
+            hashes ^= hashes >> np.uint64(29)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            buckets = (hashes % np.uint64(self.dim)).astype(np.intp)
+            vectors[row] = np.bincount(buckets, weights=signs, minlength=self.dim)
+        return vectors
+
+
+@dataclass(frozen=True)
+class SemanticMatch:
+    """A cached result found by similarity: the value, its score and the matched text."""
+
+    value: Any
+    score: float
+    text: str
+
+
+class _Index:
+    """Vectors of one scope in a ring buffer of at most `capacity` rows."""
+
+    def __init__(self, dim: int, capacity: int):
+        np = _numpy()
+        self.vectors = np.zeros((min(capacity, 64), dim), dtype=np.float32)
+        self.created = np.zeros(self.vectors.shape[0], dtype=np.float64)
+        self.texts: List[str] = []
+        self.values: List[Any] = []
+        self.capacity = capacity
+        self.next = 0
+        self.replaced = 0
+
+    def add(self, vector: Any, text: str, value: Any, created_at: float) -> None:
+        np = _numpy()
+        size = len(self.texts)
+        if size < self.capacity:
+            if size == self.vectors.shape[0]:
+                grown = min(self.capacity, size * 2)
+                self.vectors = np.resize(self.vectors, (grown, self.vectors.shape[1]))
+                self.created = np.resize(self.created, grown)
+            slot = size
+            self.texts.append(text)
+            self.values.append(value)
+        else:
+            slot = self.next
+            self.next = (self.next + 1) % self.capacity
+            self.replaced += 1
+            self.texts[slot] = text
+            self.values[slot] = value
+        self.vectors[slot] = vector
+        self.created[slot] = created_at
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour result cache keyed by embedded text within a scope.
+
+    Args:
+        embedder: Callable mapping a list of texts to a (n, dim) array, e.g.
+            a wrapper around the backend's embedding model. Defaults to a
+            local `HashingEmbedder`. Set a `name` attribute on custom
+            embedders so persisted vectors are only reused by the same one.
+        threshold: Minimum cosine similarity for a match (0-1).
+        max_entries: Entries kept per scope; the oldest are replaced first.
+        ttl: Optional seconds after which entries no longer match.
+        path: Optional SQLite file; entries are persisted there and loaded
+            per scope on first use.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        *,
+        threshold: float = 0.95,
+        max_entries: int = 10_000,
+        ttl: Optional[float] = None,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.embedder: Embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path).expanduser() if path else None
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[str, _Index] = {}
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_entries ("
+                "scope TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS semantic_entries_scope "
+                "ON semantic_entries (scope, created_at)"
+            )
+            self._conn.commit()
+
+    @property
+    def embedder_name(self) -> str:
+        name = getattr(self.embedder, "name", None)
+        if name:
+            return str(name)
+        target = self.embedder if hasattr(self.embedder, "__qualname__") else type(self.embedder)
+        return f"{target.__module__}.{target.__qualname__}"
+
+    def scope(self, *parts: Any) -> str:
+        """Scope key for JSON-serializable `parts` (model, params, template, ...)."""
+        canonical = json.dumps([self.embedder_name, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: Sequence[str]) -> Any:
+        """Embed `texts` as L2-normalized float32 rows."""
+        np = _numpy()
+        vectors = np.asarray(self.embedder(list(texts)), dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+            raise ValueError("embedder must return one vector per text")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def lookup(self, scope: str, text: str) -> Optional[SemanticMatch]:
+        """Closest cached result for `text` in `scope`, or None below the threshold."""
+        return self.lookup_many(scope, [text])[0]
+
+    def lookup_many(self, scope: str, texts: Sequence[str]) -> List[Optional[SemanticMatch]]:
+        """`lookup` for several texts with one embedding call and matrix product."""
+        matches: List[Optional[SemanticMatch]] = [None] * len(texts)
+        with self._lock:
+            index = self._index(scope)
+        # Embed outside the lock: a remote embedder may take a while.
+        queries = self.embed(texts) if index is not None and texts else None
+        with self._lock:
+            size = len(index.texts) if index is not None else 0
+            if size and queries is not None:
+                vectors = index.vectors[:size]
+                live = None
+                if self.ttl is not None:
+                    live = index.created[:size] >= time.time() - self.ttl
+                for start in range(0, len(texts), _LOOKUP_CHUNK):
+                    scores = queries[start : start + _LOOKUP_CHUNK] @ vectors.T
+                    if live is not None:
+                        scores[:, ~live] = -1.0
+                    best = scores.argmax(axis=1)
+                    for row, column in enumerate(best):
+                        score = float(scores[row, column])
+                        if score >= self.threshold:
+                            matches[start + row] = SemanticMatch(
+                                index.values[column], score, index.texts[column]
+                            )
+            found = sum(match is not None for match in matches)
+            self.hits += found
+            self.misses += len(texts) - found
+        return matches
+
+    def add(self, scope: str, text: str, value: Any) -> None:
+        """Cache `value` (JSON-serializable) as the result for `text` in `scope`."""
+        self.add_many(scope, [(text, value)])
+
+    def add_many(self, scope: str, items: Iterable[Tuple[str, Any]]) -> None:
+        """Cache several (text, value) results in one embedding call and transaction."""
+        items = list(items)
+        if not items:
+            return
+        vectors = self.embed([text for text, _ in items])
+        now = time.time()
+        with self._lock:
+            index = self._index(scope) or self._new_index(scope, vectors.shape[1])
+            for (text, value), vector in zip(items, vectors):
+                index.add(vector, text, value, now)
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT INTO semantic_entries VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (scope, text, vector.tobytes(), json.dumps(value), now)
+                        for (text, value), vector in zip(items, vectors)
+                    ],
+                )
+                if index.replaced > self.max_entries // 10:
+                    index.replaced = 0
+                    self._prune(scope)
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts, hit rate and entries held in memory."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "scopes": len(self._indexes),
+                "entries": sum(len(index.texts) for index in self._indexes.values()),
+            }
+
+    def clear(self) -> None:
+        """Remove all entries, in memory and on disk."""
+        with self._lock:
+            self._indexes.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM semantic_entries")
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _new_index(self, scope: str, dim: int) -> _Index:
+        index = self._indexes[scope] = _Index(dim, self.max_entries)
+        return index
+
+    def _index(self, scope: str) -> Optional[_Index]:
+        index = self._indexes.get(scope)
+        if index is not None or self._conn is None:
+            return index
+        rows = self._conn.execute(
+            "SELECT text, vector, value, created_at FROM semantic_entries "
+            "WHERE scope = ? ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (scope, self.max_entries),
+        ).fetchall()
+        if not rows:
+            return None
+        np = _numpy()
+        index = self._new_index(scope, len(rows[0][1]) // 4)
+        for text, vector, value, created_at in reversed(rows):
+            index.add(np.frombuffer(vector, dtype=np.float32), text, json.loads(value), created_at)
+        return index
+
+    def _prune(self, scope: str) -> None:
+        assert self._conn is not None
+        self._conn.execute(
+            "DELETE FROM semantic_entries WHERE scope = ? AND rowid NOT IN ("
+            "SELECT rowid FROM semantic_entries WHERE scope = ? "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ?)",
+            (scope, scope, self.max_entries),
+        )
@@ -0,0 +1,48 @@
+"""
+Request coalescing: concurrent callers asking for the same key share one call.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Run at most one `fn` per key at a time within this process.
+
+    The first caller for a key (the leader) runs `fn`; callers arriving while
+    it is in flight block and receive the same result or exception.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Any, "Future[Any]"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            existing = self._calls.get(key)
+            if existing is None:
+                future: "Future[Any]" = Future()
+                self._calls[key] = future
+
+        if existing is not None:
+            return existing.result()
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
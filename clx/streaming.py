@@ -0,0 +1,247 @@
+"""
+Streaming responses: `clx_stream` yields output chunks as the backend sends them.
+
+The request is the usual `/v1/query` (or pod/actor) payload with
+`"stream": true` added. The backend may answer with:
+
+- `text/event-stream` (SSE): `data:` events carrying text or JSON objects with a
+  `delta`, `output`, `response` or `text` field; `data: [DONE]` ends the stream.
+- `application/x-ndjson`: one such JSON object per line.
+- `application/json`: a regular, non-streamed response (yielded as one chunk).
+- anything else: the raw body, yielded as it arrives (chunked transfer).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from .client import Client, get_default_client
+from .core import (
+    CacheBackend,
+    _build_endpoint,
+    _build_payload,
+    _extract_output,
+    resolve_backend_path,
+    resolve_backend_url,
+)
+
+STREAM_ACCEPT = "text/event-stream, application/x-ndjson;q=0.9, application/json;q=0.5"
+_CHUNK_FIELDS = ("delta", "output", "response", "text")
+
+
+def _chunk_from_event(data: str) -> Optional[str]:
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, dict):
+        if "error" in event:
+            raise RuntimeError(f"Backend stream failed: {event['error']}")
+        for field in _CHUNK_FIELDS:
+            if field in event:
+                value = event[field]
+                if value is None:
+                    return None
+                return value if isinstance(value, str) else json.dumps(value)
+        return None
+    return event if isinstance(event, str) else json.dumps(event)
+
+
+class StreamDecoder:
+    """Incrementally turn response text into output chunks for one content type."""
+
+    def __init__(self, content_type: str):
+        media_type = content_type.split(";")[0].strip().lower()
+        if media_type == "text/event-stream":
+            self.mode = "sse"
+        elif media_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+            self.mode = "ndjson"
+        elif media_type == "application/json":
+            self.mode = "json"
+        else:
+            self.mode = "text"
+        self.done = False
+        self._buffer = ""
+        self._event_data: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        if self.done or not text:
+            return []
+        if self.mode == "text":
+            return [text]
+        self._buffer += text
+        if self.mode == "json":
+            return []
+        lines = self._buffer.split("\n")
+        self._buffer = lines.pop()
+        chunks: List[str] = []
+        for line in lines:
+            chunks.extend(self._line(line.rstrip("\r")))
+            if self.done:
+                break
+        return chunks
+
+    def finish(self) -> List[str]:
+        if self.done:
+            return []
+        if self.mode == "json":
+            self.done = True
+            if not self._buffer.strip():
+                return []
+            try:
+                data = json.loads(self._buffer)
+            except ValueError as exc:
+                raise ValueError("Backend response was not valid JSON") from exc
+            output = _extract_output(data)
+            return [output if isinstance(output, str) else json.dumps(output)]
+        chunks = self._line(self._buffer) if self._buffer else []
+        self._buffer = ""
+        if self.mode == "sse":
+            chunks.extend(self._line(""))
+        self.done = True
+        return chunks
+
+    def _line(self, line: str) -> List[str]:
+        if self.mode == "ndjson":
+            if not line.strip():
+                return []
+            chunk = _chunk_from_event(line)
+            return [chunk] if chunk else []
+
+        # SSE: accumulate data lines until a blank line dispatches the event.
+        if line:
+            if line.startswith(":"):
+                return []
+            field, _, value = line.partition(":")
+            if field == "data":
+                self._event_data.append(value[1:] if value.startswith(" ") else value)
+            return []
+        if not self._event_data:
+            return []
+        data = "\n".join(self._event_data)
+        self._event_data = []
+        if data.strip() == "[DONE]":
+            self.done = True
+            return []
+        chunk = _chunk_from_event(data)
+        return [chunk] if chunk else []
+
+
+def _stream_request(
+    model: str,
+    prompt: str,
+    params: Optional[Dict[str, Any]],
+    backend_url: Optional[str],
+    backend_path: Optional[str],
+    pod_name: Optional[str],
+    actor_id: Optional[str],
+    cache: Optional[CacheBackend],
+    metadata: Optional[Dict[str, Any]],
+    use_messages_payload: bool,
+) -> Tuple[str, Dict[str, Any], Optional[str]]:
+    resolved_backend = resolve_backend_url(backend_url)
+    resolved_path = resolve_backend_path(backend_path, pod_name=pod_name, actor_id=actor_id)
+    params = params or {}
+    meta = metadata or {}
+    cache_key = None
+    if cache:
+        cache_key = cache.build_key(
+            resolved_backend,
+            resolved_path,
+            model,
+            prompt,
+            params,
+            meta,
+            use_messages_payload,
+        )
+    payload = _build_payload(model, prompt, params, meta, use_messages_payload)
+    payload["stream"] = True
+    return _build_endpoint(resolved_backend, resolved_path), payload, cache_key
+
+
+def clx_stream(
+    model: str,
+    prompt: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    backend_url: Optional[str] = None,
+    backend_path: Optional[str] = None,
+    pod_name: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    use_messages_payload: bool = False,
+    timeout: Tuple[int, int] = (5, 300),
+    client: Optional[Client] = None,
+) -> Iterator[str]:
+    """
+    Stream a query's output as text chunks.
+
+    Arguments match `clx_query`. A cache hit yields the cached output as a
+    single chunk. Otherwise the chunks are joined once the stream completes
+    and the full text is written to the cache, under the same key
+    `clx_query` uses. A stream abandoned part-way is not cached.
+    `timeout` applies per read, not to the whole stream.
+
+    Example:
+        for chunk in clx_stream("meta-llama", "Summarize: " + text):
+            print(chunk, end="", flush=True)
+    """
+    endpoint, payload, cache_key = _stream_request(
+        model,
+        prompt,
+        params,
+        backend_url,
+        backend_path,
+        pod_name,
+        actor_id,
+        cache,
+        metadata,
+        use_messages_payload,
+    )
+    if cache and cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached if isinstance(cached, str) else json.dumps(cached)
+            return
+
+    http = client or get_default_client()
+    try:
+        response = http.post(
+            endpoint,
+            payload,
+            timeout=timeout,
+            stream=True,
+            headers={"Accept": STREAM_ACCEPT},
+        )
+    except requests.RequestException as exc:
+        raise RuntimeError(f"Failed to reach backend at {endpoint}") from exc
+
+    parts: List[str] = []
+    with response:
+        if response.status_code >= 400:
+            raise RuntimeError(f"Backend returned {response.status_code}: {response.text}")
+
+        content_type = response.headers.get("Content-Type", "")
+        decoder = StreamDecoder(content_type)
+        if "charset" not in content_type.lower():
+            # requests assumes ISO-8859-1 for text/* without a charset.
+            response.encoding = "utf-8"
+        try:
+            for text in response.iter_content(chunk_size=None, decode_unicode=True):
+                for chunk in decoder.feed(text):
+                    parts.append(chunk)
+                    yield chunk
+                if decoder.done:
+                    break
+            for chunk in decoder.finish():
+                parts.append(chunk)
+                yield chunk
+        except requests.RequestException as exc:
+            raise RuntimeError(f"Backend stream from {endpoint} was interrupted") from exc
+
+    if cache and cache_key:
+        cache.set(cache_key, "".join(parts), namespace=model)
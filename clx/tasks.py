@@ -1,13 +1,90 @@
 """
-Thin task-style helpers that wrap `clx_query`.
+Thin task-style helpers that wrap `clx_query` (and `aclx_query` for the
+`aclx_*` async variants).
+
+The `*_many` variants pack several inputs into one numbered prompt and parse
+the per-item answers back out; see `clx_classify_many`.
 """
 
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Iterable, Optional, Tuple
+import re
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .core import (
+    CacheBackend,
+    _ensure_json_payload,
+    clx_query,
+    clx_query_many,
+    resolve_backend_path,
+    resolve_backend_url,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .aio import AsyncClient
+    from .client import Client
+    from .semantic import SemanticCache
+
+
+def _summarize_prompt(text: str) -> str:
+    return f"Summarize this:\n{text}"
+
+
+def _translate_prompt(text: str, target_lang: str) -> str:
+    return f"Translate the following text to {target_lang}:\n{text}"
+
+
+def _classify_prefix(labels: Iterable[str]) -> str:
+    label_list = ", ".join(labels)
+    return (
+        "Classify the following text into one of the provided labels. "
+        "Return only the label.\n"
+        f"Labels: {label_list}\n"
+        "Text: "
+    )
+
+
+def _schema_repr(schema: Any) -> str:
+    return json.dumps(schema, indent=2, ensure_ascii=False)
+
+
+def _extract_prefix(schema: Any) -> str:
+    return (
+        "Extract structured data from the following text according to the provided JSON schema. "
+        "Respond with valid JSON only.\n"
+        f"Schema:\n{_schema_repr(schema)}\n\n"
+        "Text:\n"
+    )
+
+
+_SIMILARITY_PREFIX = (
+    "Compare the following two inputs and return a similarity score between 0 and 1 "
+    "along with a short justification as JSON.\n"
+)
 
-from .core import Cache, clx_query
+
+def _similarity_pair(a: str, b: str) -> str:
+    return f"Input A:\n{a}\n\nInput B:\n{b}"
+
+
+def _fix_grammar_prompt(text: str) -> str:
+    return f"Fix grammar and spelling in the following text while preserving meaning:\n{text}"
+
+
+def _semantic_scope(
+    semantic: Optional[SemanticCache],
+    model: str,
+    prefix: str,
+    params: Optional[Dict[str, Any]],
+    expect_json: bool,
+    kwargs: Dict[str, Any],
+) -> Optional[str]:
+    """Scope of a task in `semantic`: same model, backend, params and prompt template."""
+    if semantic is None:
+        return None
+    backend = resolve_backend_url(kwargs.get("backend_url"))
+    return semantic.scope(model, backend, prefix, params or {}, expect_json)
 
 
 def clx_gen(
@@ -16,9 +93,10 @@ def clx_gen(
     *,
     params: Optional[Dict[str, Any]] = None,
     backend_url: Optional[str] = None,
-    cache: Optional[Cache] = None,
+    cache: Optional[CacheBackend] = None,
     expect_json: bool = False,
     timeout: Optional[Tuple[int, int]] = None,
+    client: Optional[Client] = None,
 ) -> Any:
     return clx_query(
         model=model,
@@ -28,6 +106,7 @@ def clx_gen(
         cache=cache,
         expect_json=expect_json,
         timeout=timeout or (5, 30),
+        client=client,
     )
 
 
@@ -38,8 +117,7 @@ def clx_summarize(
     params: Optional[Dict[str, Any]] = None,
     **kwargs: Any,
 ) -> Any:
-    prompt = f"Summarize this:\n{text}"
-    return clx_gen(model, prompt, params=params, **kwargs)
+    return clx_gen(model, _summarize_prompt(text), params=params, **kwargs)
 
 
 def clx_translate(
@@ -50,8 +128,7 @@ def clx_translate(
     params: Optional[Dict[str, Any]] = None,
     **kwargs: Any,
 ) -> Any:
-    prompt = f"Translate the following text to {target_lang}:\n{text}"
-    return clx_gen(model, prompt, params=params, **kwargs)
+    return clx_gen(model, _translate_prompt(text, target_lang), params=params, **kwargs)
 
 
 def clx_classify(
@@ -61,60 +138,496 @@ def clx_classify(
     *,
     params: Optional[Dict[str, Any]] = None,
     expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
     **kwargs: Any,
 ) -> Any:
+    """
+    Classify `text` into one of `labels`.
+
+    With `semantic`, a near-duplicate text classified before returns the
+    cached label without a backend request (see `SemanticCache`).
+    """
+    prefix = _classify_prefix(labels)
+    scope = _semantic_scope(semantic, model, prefix, params, expect_json, kwargs)
+    match = semantic.lookup(scope, text) if semantic and scope else None
+    if match is not None:
+        return match.value
+    output = clx_gen(model, prefix + text, params=params, expect_json=expect_json, **kwargs)
+    if semantic and scope:
+        semantic.add(scope, text, output)
+    return output
+
+
+def clx_extract(
+    model: str,
+    text: str,
+    schema: Any,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
+    **kwargs: Any,
+) -> Any:
+    """Extract data matching `schema` from `text`; `semantic` as for `clx_classify`."""
+    prefix = _extract_prefix(schema)
+    scope = _semantic_scope(semantic, model, prefix, params, expect_json, kwargs)
+    match = semantic.lookup(scope, text) if semantic and scope else None
+    if match is not None:
+        return match.value
+    output = clx_gen(model, prefix + text, params=params, expect_json=expect_json, **kwargs)
+    if semantic and scope:
+        semantic.add(scope, text, output)
+    return output
+
+
+def clx_similarity(
+    model: str,
+    a: str,
+    b: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
+    **kwargs: Any,
+) -> Any:
+    """Score the similarity of `a` and `b`; `semantic` as for `clx_classify`."""
+    pair = _similarity_pair(a, b)
+    scope = _semantic_scope(semantic, model, _SIMILARITY_PREFIX, params, expect_json, kwargs)
+    match = semantic.lookup(scope, pair) if semantic and scope else None
+    if match is not None:
+        return match.value
+    output = clx_gen(
+        model, _SIMILARITY_PREFIX + pair, params=params, expect_json=expect_json, **kwargs
+    )
+    if semantic and scope:
+        semantic.add(scope, pair, output)
+    return output
+
+
+def clx_fix_grammar(
+    model: str,
+    text: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Any:
+    return clx_gen(model, _fix_grammar_prompt(text), params=params, **kwargs)
+
+
+# Packed prompts: one request answers several numbered items as a JSON object keyed
+# by item number. Malformed or incomplete answers are retried in smaller packs.
+
+_PACK_ITEM = "\nItem {number}:\n{text}\n"
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+def _classify_pack_prefix(labels: Iterable[str]) -> str:
     label_list = ", ".join(labels)
-    prompt = (
-        "Classify the following text into one of the provided labels. "
-        "Return only the label.\n"
+    return (
+        "Classify each of the following numbered texts into one of the provided labels.\n"
         f"Labels: {label_list}\n"
-        f"Text: {text}"
+        "Respond with JSON only: an object mapping each item number to its label, "
+        'e.g. {"1": "<label>", "2": "<label>"}.\n'
     )
-    return clx_gen(model, prompt, params=params, expect_json=expect_json, **kwargs)
 
 
-def clx_extract(
+def _extract_pack_prefix(schema: Any) -> str:
+    return (
+        "Extract structured data from each of the following numbered texts according to "
+        "the provided JSON schema.\n"
+        f"Schema:\n{_schema_repr(schema)}\n\n"
+        "Respond with JSON only: an object mapping each item number to the extracted data, "
+        'e.g. {"1": {...}, "2": {...}}.\n'
+    )
+
+
+_SIMILARITY_PACK_PREFIX = (
+    "Compare each of the following numbered pairs of inputs and return a similarity score "
+    "between 0 and 1 along with a short justification.\n"
+    "Respond with JSON only: an object mapping each item number to "
+    '{"score": <number>, "justification": "<text>"}.\n'
+)
+
+
+def _pack_prompt(prefix: str, texts: Sequence[str]) -> str:
+    items = "".join(
+        _PACK_ITEM.format(number=number, text=text) for number, text in enumerate(texts, 1)
+    )
+    return prefix + items
+
+
+def _parse_pack(output: Any, count: int) -> Dict[int, Any]:
+    """Map 0-based item positions to answers; anything unparseable yields {}."""
+    data = output
+    if isinstance(data, str):
+        try:
+            data = json.loads(_FENCE.sub("", data.strip()))
+        except ValueError:
+            return {}
+    if isinstance(data, dict) and len(data) == 1:
+        key, value = next(iter(data.items()))
+        if not str(key).strip().isdigit() and isinstance(value, (dict, list)):
+            data = value  # e.g. {"results": {...}}
+    if isinstance(data, list):
+        return dict(enumerate(data)) if len(data) == count else {}
+    if not isinstance(data, dict):
+        return {}
+    answers: Dict[int, Any] = {}
+    for key, value in data.items():
+        number = str(key).strip().lower()
+        if number.startswith("item"):
+            number = number[4:]
+        number = number.strip(" #")
+        if number.isdigit() and 1 <= int(number) <= count:
+            answers[int(number) - 1] = value
+    return answers
+
+
+def _run_packed(
+    model: str,
+    texts: Sequence[str],
+    prefix: str,
+    pack_prefix: str,
+    accept: Callable[[Any], bool],
+    *,
+    pack_size: int,
+    params: Optional[Dict[str, Any]] = None,
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    semantic: Optional[SemanticCache] = None,
+    timeout: Optional[Tuple[int, int]] = None,
+    client: Optional[Client] = None,
+    max_concurrency: int = 8,
+    return_exceptions: bool = True,
+) -> List[Any]:
+    """
+    Resolve `texts` with packed prompts, in rounds of concurrent requests.
+
+    Items are deduplicated and cached under their single-item prompt
+    (`prefix + text`), so entries are shared with the one-at-a-time helpers.
+    A pack whose answer is unusable is split in half; a partially answered
+    pack retries only the missing items; a lone item is sent with the
+    single-item prompt.
+    """
+    if pack_size < 1:
+        raise ValueError("pack_size must be at least 1")
+
+    resolved_backend = resolve_backend_url(backend_url)
+    slots: Dict[str, List[int]] = {}
+    for index, text in enumerate(texts):
+        slots.setdefault(text, []).append(index)
+    unique = list(slots)
+
+    done: Dict[int, Any] = {}
+    keys: List[str] = []
+    if cache:
+        resolved_path = resolve_backend_path(None)
+        keys = [
+            cache.build_key(
+                resolved_backend, resolved_path, model, prefix + text, params or {}, {}, False
+            )
+            for text in unique
+        ]
+        cached = cache.get_many(set(keys))
+        for position, cache_key in enumerate(keys):
+            if cache_key in cached:
+                try:
+                    done[position] = _ensure_json_payload(cached[cache_key])
+                except ValueError:
+                    pass  # not a JSON answer (e.g. cached with expect_json=False); re-query
+
+    scope = _semantic_scope(semantic, model, prefix, params, True, {"backend_url": backend_url})
+    todo = [position for position in range(len(unique)) if position not in done]
+    if semantic and scope and todo:
+        matches = semantic.lookup_many(scope, [unique[position] for position in todo])
+        done.update((p, m.value) for p, m in zip(todo, matches) if m is not None)
+        todo = [position for position in todo if position not in done]
+
+    packs = [todo[start : start + pack_size] for start in range(0, len(todo), pack_size)]
+    fresh: Dict[int, str] = {}  # position -> raw JSON answer
+    while packs:
+        outputs = clx_query_many(
+            model,
+            [
+                prefix + unique[pack[0]]
+                if len(pack) == 1
+                else _pack_prompt(pack_prefix, [unique[position] for position in pack])
+                for pack in packs
+            ],
+            params,
+            backend_url=resolved_backend,
+            timeout=timeout or (5, 30),
+            client=client,
+            max_concurrency=max_concurrency,
+        )
+        retry: List[List[int]] = []
+        for pack, output in zip(packs, outputs):
+            if isinstance(output, BaseException):
+                done.update((position, output) for position in pack)
+            elif len(pack) == 1:
+                try:
+                    done[pack[0]] = _ensure_json_payload(output)
+                except ValueError as exc:
+                    done[pack[0]] = exc
+                else:
+                    fresh[pack[0]] = output
+            else:
+                answers = _parse_pack(output, len(pack))
+                missing = []
+                for offset, position in enumerate(pack):
+                    if offset in answers and accept(answers[offset]):
+                        done[position] = answers[offset]
+                        fresh[position] = json.dumps(answers[offset])
+                    else:
+                        missing.append(position)
+                if len(missing) == len(pack):
+                    half = (len(pack) + 1) // 2
+                    retry.extend((pack[:half], pack[half:]))
+                elif missing:
+                    retry.append(missing)
+        packs = retry
+
+    if cache and fresh:
+        cache.set_many({keys[position]: raw for position, raw in fresh.items()}, namespace=model)
+    if semantic and scope and fresh:
+        semantic.add_many(scope, [(unique[position], done[position]) for position in fresh])
+
+    results: List[Any] = [None] * len(texts)
+    for position, text in enumerate(unique):
+        value = done[position]
+        if isinstance(value, BaseException) and not return_exceptions:
+            raise value
+        for index in slots[text]:
+            results[index] = value
+    return results
+
+
+def clx_classify_many(
+    model: str,
+    texts: Iterable[str],
+    labels: Iterable[str],
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    pack_size: int = 20,
+    **kwargs: Any,
+) -> List[Any]:
+    """
+    Classify many texts, `pack_size` texts per backend request.
+
+    Results are returned in input order and match `clx_classify` per text;
+    with `return_exceptions=True` (the default) a failed item yields its
+    exception. Cached results are shared with `clx_classify`.
+
+    Args:
+        pack_size: Maximum number of texts per request. 1 sends every text
+            with the single-item prompt.
+        **kwargs: `backend_url`, `cache`, `timeout`, `client`,
+            `max_concurrency` and `return_exceptions`, as for `clx_query_many`,
+            and `semantic`, as for `clx_classify`.
+    """
+    labels = list(labels)
+    return _run_packed(
+        model,
+        list(texts),
+        _classify_prefix(labels),
+        _classify_pack_prefix(labels),
+        lambda answer: isinstance(answer, str),
+        pack_size=pack_size,
+        params=params,
+        **kwargs,
+    )
+
+
+def clx_extract_many(
+    model: str,
+    texts: Iterable[str],
+    schema: Any,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    pack_size: int = 8,
+    **kwargs: Any,
+) -> List[Any]:
+    """
+    Extract structured data from many texts, `pack_size` texts per request.
+
+    The schema is serialized once and sent once per pack. Arguments and
+    results otherwise follow `clx_classify_many` and `clx_extract`.
+    """
+    return _run_packed(
+        model,
+        list(texts),
+        _extract_prefix(schema),
+        _extract_pack_prefix(schema),
+        lambda answer: answer is not None,
+        pack_size=pack_size,
+        params=params,
+        **kwargs,
+    )
+
+
+def clx_similarity_many(
+    model: str,
+    pairs: Iterable[Tuple[str, str]],
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    pack_size: int = 10,
+    **kwargs: Any,
+) -> List[Any]:
+    """
+    Score many (a, b) pairs, `pack_size` pairs per request.
+
+    Arguments and results otherwise follow `clx_classify_many` and
+    `clx_similarity`.
+    """
+    return _run_packed(
+        model,
+        [_similarity_pair(a, b) for a, b in pairs],
+        _SIMILARITY_PREFIX,
+        _SIMILARITY_PACK_PREFIX,
+        lambda answer: isinstance(answer, dict) and "score" in answer,
+        pack_size=pack_size,
+        params=params,
+        **kwargs,
+    )
+
+
+async def aclx_gen(
+    model: str,
+    prompt: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    backend_url: Optional[str] = None,
+    cache: Optional[CacheBackend] = None,
+    expect_json: bool = False,
+    timeout: Optional[Tuple[int, int]] = None,
+    client: Optional["AsyncClient"] = None,
+) -> Any:
+    from .aio import aclx_query
+
+    return await aclx_query(
+        model=model,
+        prompt=prompt,
+        params=params,
+        backend_url=backend_url,
+        cache=cache,
+        expect_json=expect_json,
+        timeout=timeout or (5, 30),
+        client=client,
+    )
+
+
+async def aclx_summarize(
+    model: str,
+    text: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Any:
+    return await aclx_gen(model, _summarize_prompt(text), params=params, **kwargs)
+
+
+async def aclx_translate(
+    model: str,
+    text: str,
+    target_lang: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Any:
+    return await aclx_gen(model, _translate_prompt(text, target_lang), params=params, **kwargs)
+
+
+async def _asemantic_lookup(
+    semantic: Optional[SemanticCache], scope: Optional[str], text: str
+) -> Any:
+    if not semantic or not scope:
+        return None
+    from .aio import _offload
+
+    # Embedding and the SQLite store may block; keep them off the event loop.
+    return await _offload(semantic.lookup, scope, text)
+
+
+async def _asemantic_add(
+    semantic: Optional[SemanticCache], scope: Optional[str], text: str, output: Any
+) -> None:
+    if semantic and scope:
+        from .aio import _offload
+
+        await _offload(semantic.add, scope, text, output)
+
+
+async def aclx_classify(
+    model: str,
+    text: str,
+    labels: Iterable[str],
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
+    **kwargs: Any,
+) -> Any:
+    prefix = _classify_prefix(labels)
+    scope = _semantic_scope(semantic, model, prefix, params, expect_json, kwargs)
+    match = await _asemantic_lookup(semantic, scope, text)
+    if match is not None:
+        return match.value
+    output = await aclx_gen(
+        model, prefix + text, params=params, expect_json=expect_json, **kwargs
+    )
+    await _asemantic_add(semantic, scope, text, output)
+    return output
+
+
+async def aclx_extract(
     model: str,
     text: str,
     schema: Any,
     *,
     params: Optional[Dict[str, Any]] = None,
     expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
     **kwargs: Any,
 ) -> Any:
-    schema_repr = json.dumps(schema, indent=2, ensure_ascii=False)
-    prompt = (
-        "Extract structured data from the following text according to the provided JSON schema. "
-        "Respond with valid JSON only.\n"
-        f"Schema:\n{schema_repr}\n\n"
-        f"Text:\n{text}"
+    prefix = _extract_prefix(schema)
+    scope = _semantic_scope(semantic, model, prefix, params, expect_json, kwargs)
+    match = await _asemantic_lookup(semantic, scope, text)
+    if match is not None:
+        return match.value
+    output = await aclx_gen(
+        model, prefix + text, params=params, expect_json=expect_json, **kwargs
     )
-    return clx_gen(model, prompt, params=params, expect_json=expect_json, **kwargs)
+    await _asemantic_add(semantic, scope, text, output)
+    return output
 
 
-def clx_similarity(
+async def aclx_similarity(
     model: str,
     a: str,
     b: str,
     *,
     params: Optional[Dict[str, Any]] = None,
     expect_json: bool = True,
+    semantic: Optional[SemanticCache] = None,
     **kwargs: Any,
 ) -> Any:
-    prompt = (
-        "Compare the following two inputs and return a similarity score between 0 and 1 "
-        "along with a short justification as JSON.\n"
-        f"Input A:\n{a}\n\nInput B:\n{b}"
+    pair = _similarity_pair(a, b)
+    scope = _semantic_scope(semantic, model, _SIMILARITY_PREFIX, params, expect_json, kwargs)
+    match = await _asemantic_lookup(semantic, scope, pair)
+    if match is not None:
+        return match.value
+    output = await aclx_gen(
+        model, _SIMILARITY_PREFIX + pair, params=params, expect_json=expect_json, **kwargs
     )
-    return clx_gen(model, prompt, params=params, expect_json=expect_json, **kwargs)
+    await _asemantic_add(semantic, scope, pair, output)
+    return output
 
 
-def clx_fix_grammar(
+async def aclx_fix_grammar(
     model: str,
     text: str,
     *,
     params: Optional[Dict[str, Any]] = None,
     **kwargs: Any,
 ) -> Any:
-    prompt = f"Fix grammar and spelling in the following text while preserving meaning:\n{text}"
-    return clx_gen(model, prompt, params=params, **kwargs)
+    return await aclx_gen(model, _fix_grammar_prompt(text), params=params, **kwargs)
@@ -8,4 +8,9 @@ setup(
         "requests>=2.28.0",
         'tomli>=2.0.1; python_version < "3.11"',
     ],
+    extras_require={
+        "async": ["httpx>=0.24"],
+        "fast": ["orjson>=3.6", "zstandard>=0.18"],
+        "semantic": ["numpy>=1.21"],
+    },
 )